@@ -0,0 +1,6 @@
+"""Load benchmarks for URY, run against a test site:
+
+    bench --site <site> execute ury.benchmarks.run
+"""
+
+from ury.benchmarks.rush import compare, run  # noqa: F401
@@ -0,0 +1,262 @@
+"""Drive a dinner rush through the order, table and KOT endpoints.
+
+Every waiter is a thread with its own site connection, working the tables
+of its room: it opens the board and the menu, places and confirms an
+order, checks the KOT status, prints the bill and has the cashier settle
+it. Each call is timed and its SQL statements counted, and the run is
+summarised per endpoint as JSON that later runs can be compared with.
+
+KOTs go to a stub backend through the `ury_integrations` site config, so
+the rush needs no kitchen app. The previous value is put back afterwards.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+import frappe
+from frappe import _
+from frappe.installer import update_site_config
+from frappe.utils import now
+
+from ury import __version__
+from ury.benchmarks.seed import MODE_OF_PAYMENT, seed_branch
+from ury.instrumentation import start_measurement, stop_measurement
+from ury.integrations import clear_integrations
+
+
+STUB_KOT_BACKEND = "ury.ury.doctype.ury_kot_intent.ury_kot_intent.stub_kot_backend"
+PRINT_FORMAT = "POS Invoice"
+
+
+def run(waiters=8, covers=20, items_per_order=5, company=None, output=None):
+    """seed the benchmark branch, run the rush and return the report
+
+    bench --site <site> execute ury.benchmarks.run --kwargs "{'waiters': 16, 'output': '/tmp/rush.json'}"
+    """
+    if not (frappe.conf.get("allow_tests") or frappe.conf.get("developer_mode")):
+        frappe.throw(_("Benchmarks write test data, run them on a site with allow_tests enabled"))
+
+    frappe.set_user("Administrator")
+    fixture = seed_branch(company=company, waiters=max(int(waiters), 1))
+
+    previous_integrations = frappe.conf.get("ury_integrations")
+    use_stub_kot_backend(dict(previous_integrations or {}, kot_execute=STUB_KOT_BACKEND))
+    try:
+        report = run_rush(fixture, int(waiters), int(covers), int(items_per_order))
+    finally:
+        use_stub_kot_backend(previous_integrations)
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=1, sort_keys=True, default=str)
+
+    return report
+
+
+def use_stub_kot_backend(integrations):
+    # the site config reaches the background workers that process KOT intents
+    update_site_config("ury_integrations", integrations if integrations else "None")
+    frappe.local.conf.ury_integrations = integrations
+    clear_integrations()
+
+
+def run_rush(fixture, waiters, covers, items_per_order):
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    # a waiter that fails to connect breaks the barrier instead of hanging the run
+    start_together = threading.Barrier(waiters + 1, timeout=5 * 60)
+
+    threads = []
+    for i, waiter in enumerate(fixture.waiters[:waiters]):
+        room = fixture.rooms[i % len(fixture.rooms)]
+        # waiters of the same room split its tables between them
+        room_tables = [table.name for table in fixture.tables if table.restaurant_room == room]
+        room_waiters = len([w for w in range(waiters) if w % len(fixture.rooms) == i % len(fixture.rooms)])
+        tables = room_tables[(i // len(fixture.rooms)) :: room_waiters] or room_tables
+
+        threads.append(
+            threading.Thread(
+                target=work_tables,
+                name="ury-bench-{0}".format(i),
+                args=(frappe.local.site, fixture, waiter, room, tables, covers, items_per_order),
+                kwargs={"samples": samples, "errors": errors, "lock": lock, "start_together": start_together},
+            )
+        )
+
+    for thread in threads:
+        thread.start()
+
+    started_at = now()
+    start_together.wait()
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+    duration = time.monotonic() - started
+
+    return build_report(fixture, waiters, covers, started_at, duration, samples, errors)
+
+
+def work_tables(site, fixture, waiter, room, tables, covers, items_per_order, samples, errors, lock, start_together):
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        rng = random.Random(waiter)
+        kot_status = frappe.db.table_exists("URY KOT")
+        menu_items = fixture["items"]
+        frappe.set_user(waiter)
+        start_together.wait()
+
+        def call(endpoint, fn, *args, **kwargs):
+            result, stats, failed = timed_call(fn, *args, **kwargs)
+            with lock:
+                samples[endpoint].append((stats.wall_us / 1000, stats.sql_count))
+                if failed:
+                    errors[endpoint] += 1
+            return None if failed else result
+
+        from ury.ury.api.ury_print import print_pos_page
+        from ury.ury.doctype.ury_order.ury_order import confirm_order, make_invoice, sync_order
+        from ury.ury_pos.api import get_order_status, getRestaurantMenu, getTable
+
+        for cover in range(covers):
+            table = tables[cover % len(tables)]
+
+            call("getTable", getTable, room)
+            call("getRestaurantMenu", getRestaurantMenu, fixture.pos_profile, table)
+
+            order = [
+                {"item": item, "item_name": item, "qty": rng.randint(1, 3), "comment": ""}
+                for item in rng.sample(menu_items, items_per_order)
+            ]
+            invoice = call(
+                "sync_order",
+                sync_order,
+                items=order,
+                cashier=fixture.cashier,
+                mode_of_payment=MODE_OF_PAYMENT,
+                customer=fixture.customer,
+                no_of_pax=rng.randint(1, 6),
+                last_invoice=None,
+                waiter=waiter,
+                pos_profile=fixture.pos_profile,
+                table=table,
+                order_type="Dine In",
+                room=room,
+            )
+            if not invoice:
+                continue
+
+            call("confirm_order", confirm_order, invoice["name"])
+            if kot_status:
+                call("get_order_status", get_order_status, table, invoice["name"])
+            call("print_pos_page", print_pos_page, "POS Invoice", invoice["name"], PRINT_FORMAT)
+
+            # the cashier settles the bill
+            frappe.set_user(fixture.cashier)
+            call(
+                "make_invoice",
+                make_invoice,
+                fixture.customer,
+                [{"mode_of_payment": MODE_OF_PAYMENT, "amount": invoice.get("rounded_total") or invoice.get("grand_total")}],
+                fixture.cashier,
+                fixture.pos_profile,
+                table=table,
+                invoice=invoice["name"],
+            )
+            frappe.set_user(waiter)
+    finally:
+        frappe.destroy()
+
+
+def timed_call(fn, *args, **kwargs):
+    """run an endpoint as a request would, committing on success"""
+    frappe.local.message_log = []
+    started = start_measurement()
+    failed = False
+    result = None
+    try:
+        result = fn(*args, **kwargs)
+        # the order endpoints report some failures in their return value
+        if isinstance(result, Exception):
+            raise result
+        if isinstance(result, dict) and str(result.get("status", "")).lower() in ("failure", "error"):
+            raise Exception(result.get("error") or result["status"])
+        frappe.db.commit()
+    except Exception:
+        failed = True
+        frappe.db.rollback()
+    finally:
+        stats = stop_measurement(started)
+
+    return result, stats, failed
+
+
+def build_report(fixture, waiters, covers, started_at, duration, samples, errors):
+    endpoints = {}
+    total_calls = 0
+    for endpoint, endpoint_samples in sorted(samples.items()):
+        latencies = sorted(latency for latency, queries in endpoint_samples)
+        queries = [queries for latency, queries in endpoint_samples]
+        total_calls += len(endpoint_samples)
+
+        endpoints[endpoint] = {
+            "calls": len(endpoint_samples),
+            "errors": errors.get(endpoint, 0),
+            "throughput_per_s": round(len(endpoint_samples) / duration, 2) if duration else 0,
+            "mean_ms": round(sum(latencies) / len(latencies), 2),
+            "p50_ms": round(percentile(latencies, 0.5), 2),
+            "p95_ms": round(percentile(latencies, 0.95), 2),
+            "p99_ms": round(percentile(latencies, 0.99), 2),
+            "max_ms": round(latencies[-1], 2),
+            "queries_per_call": round(sum(queries) / len(queries), 2),
+        }
+
+    return {
+        "meta": {
+            "site": frappe.local.site,
+            "ury_version": __version__,
+            "started": started_at,
+            "waiters": waiters,
+            "covers_per_waiter": covers,
+            "tables": len(fixture.tables),
+            "menu_items": len(fixture["items"]),
+        },
+        "duration_s": round(duration, 3),
+        "calls": total_calls,
+        "throughput_per_s": round(total_calls / duration, 2) if duration else 0,
+        "endpoints": endpoints,
+    }
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def compare(baseline, current, threshold=0.1):
+    """returns the endpoints whose p95 latency or queries per call grew by more than
+    `threshold` between two saved reports"""
+    with open(baseline) as f:
+        baseline = json.load(f)
+    with open(current) as f:
+        current = json.load(f)
+
+    regressions = {}
+    for endpoint, latest in current["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if not before:
+            continue
+
+        for metric in ("p95_ms", "queries_per_call"):
+            if before[metric] and latest[metric] > before[metric] * (1 + threshold):
+                regressions.setdefault(endpoint, {})[metric] = {
+                    "baseline": before[metric],
+                    "current": latest[metric],
+                }
+
+    return regressions
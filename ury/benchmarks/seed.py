@@ -0,0 +1,330 @@
+"""A realistic branch for the benchmarks, created once and reused.
+
+Everything seeded is named with the `URY Bench` prefix so it is easy to
+spot and to remove from a test site.
+"""
+
+import random
+
+import frappe
+from frappe import _
+from frappe.utils import flt, now_datetime, nowdate
+
+
+BENCH_PREFIX = "URY Bench"
+WAITER_EMAIL = "ury-bench-waiter-{0}@example.com"
+CASHIER_EMAIL = "ury-bench-cashier@example.com"
+MODE_OF_PAYMENT = "Cash"
+
+
+def seed_branch(company=None, rooms=4, tables=80, items=600, waiters=8, aggregators=2):
+    """returns the names the benchmark needs, creating whatever is missing"""
+    company = company or frappe.defaults.get_global_default("company")
+    if not company:
+        frappe.throw(_("Pass a company or set a default company to seed the benchmark branch"))
+
+    # the same menu and rates on every run keep results comparable
+    random.seed(42)
+
+    item_codes = seed_items(items)
+    waiter_users = [seed_user(WAITER_EMAIL.format(i + 1), ["URY Captain"]) for i in range(waiters)]
+    cashier = seed_user(CASHIER_EMAIL, ["URY Cashier", "URY Captain"])
+
+    branch = seed_branch_doc()
+    room_names = [seed_room("{0} Room {1}".format(BENCH_PREFIX, i + 1), branch) for i in range(rooms)]
+    assign_users(branch, waiter_users, cashier, room_names)
+
+    menu = seed_menu(branch, item_codes)
+    restaurant = seed_restaurant(company, branch, menu, room_names[0])
+    table_names = seed_tables(restaurant, branch, room_names, tables)
+    seed_order_type()
+
+    customer = seed_customer("{0} Guest".format(BENCH_PREFIX))
+    seed_aggregators(company, branch, menu, aggregators)
+
+    pos_profile = seed_pos_profile(company, branch, restaurant, waiter_users + [cashier])
+    seed_opening_entry(company, pos_profile, branch, restaurant, room_names[0], cashier)
+
+    frappe.db.commit()
+
+    return frappe._dict(
+        company=company,
+        branch=branch,
+        restaurant=restaurant,
+        menu=menu,
+        pos_profile=pos_profile,
+        customer=customer,
+        cashier=cashier,
+        waiters=waiter_users,
+        rooms=room_names,
+        tables=table_names,
+        items=item_codes,
+    )
+
+
+def seed_items(count):
+    item_group = "{0} Items".format(BENCH_PREFIX)
+    if not frappe.db.exists("Item Group", item_group):
+        frappe.get_doc(
+            {
+                "doctype": "Item Group",
+                "item_group_name": item_group,
+                "parent_item_group": "All Item Groups",
+            }
+        ).insert(ignore_permissions=True)
+
+    item_codes = ["URYB-ITEM-{0:04d}".format(i + 1) for i in range(count)]
+    existing = set(frappe.get_all("Item", filters={"item_group": item_group}, pluck="name"))
+
+    for i, item_code in enumerate(item_codes):
+        if item_code in existing:
+            continue
+        frappe.get_doc(
+            {
+                "doctype": "Item",
+                "item_code": item_code,
+                "item_name": "{0} Dish {1}".format(BENCH_PREFIX, i + 1),
+                "item_group": item_group,
+                "stock_uom": "Nos",
+                "is_stock_item": 0,
+                "include_item_in_manufacturing": 0,
+                "standard_rate": random.choice((4, 6, 8, 12, 15, 18, 22, 30)),
+            }
+        ).insert(ignore_permissions=True)
+
+    return item_codes
+
+
+def seed_user(email, roles):
+    if not frappe.db.exists("User", email):
+        user = frappe.get_doc(
+            {
+                "doctype": "User",
+                "email": email,
+                "first_name": email.split("@")[0],
+                "send_welcome_email": 0,
+                "user_type": "System User",
+            }
+        )
+        user.flags.no_welcome_mail = True
+        user.insert(ignore_permissions=True)
+        user.add_roles(*roles)
+
+    return email
+
+
+def seed_branch_doc():
+    branch = "{0} Branch".format(BENCH_PREFIX)
+    if not frappe.db.exists("Branch", branch):
+        # the URY User rows need the rooms, which need the branch
+        doc = frappe.get_doc({"doctype": "Branch", "branch": branch})
+        doc.flags.ignore_mandatory = True
+        doc.insert(ignore_permissions=True)
+
+    return branch
+
+
+def seed_room(name, branch):
+    if not frappe.db.exists("URY Room", name):
+        frappe.get_doc({"doctype": "URY Room", "name": name, "branch": branch}).insert(
+            ignore_permissions=True
+        )
+    return name
+
+
+def assign_users(branch, waiters, cashier, rooms):
+    doc = frappe.get_doc("Branch", branch)
+    assigned = {row.user for row in doc.get("user")}
+
+    for i, waiter in enumerate(waiters):
+        if waiter not in assigned:
+            doc.append("user", {"user": waiter, "room": rooms[i % len(rooms)]})
+    if cashier not in assigned:
+        doc.append("user", {"user": cashier, "room": rooms[0]})
+
+    doc.save(ignore_permissions=True)
+
+
+def seed_menu(branch, item_codes):
+    menu = "{0} Menu".format(BENCH_PREFIX)
+    if not frappe.db.exists("URY Menu", menu):
+        standard_rates = dict(
+            frappe.db.sql(
+                "SELECT name, standard_rate FROM `tabItem` WHERE name IN %s", [tuple(item_codes)]
+            )
+        )
+        doc = frappe.get_doc(
+            {
+                "doctype": "URY Menu",
+                "name": menu,
+                "branch": branch,
+                "enabled": 1,
+                "items": [
+                    {
+                        "item": item_code,
+                        "rate": flt(standard_rates.get(item_code)),
+                        "special_dish": 1 if i % 25 == 0 else 0,
+                    }
+                    for i, item_code in enumerate(item_codes)
+                ],
+            }
+        ).insert(ignore_permissions=True)
+        # a menu this size syncs its prices in the background, the benchmark needs them now
+        from ury.ury.doctype.ury_menu.ury_menu import sync_item_prices
+
+        sync_item_prices(doc.name, doc.price_list)
+
+    return menu
+
+
+def seed_restaurant(company, branch, menu, default_room):
+    restaurant = "{0} Restaurant".format(BENCH_PREFIX)
+    if not frappe.db.exists("URY Restaurant", restaurant):
+        frappe.get_doc(
+            {
+                "doctype": "URY Restaurant",
+                "name": restaurant,
+                "company": company,
+                "branch": branch,
+                "active_menu": menu,
+                "default_room": default_room,
+                "invoice_series_prefix": "URYB-.YY.-",
+                "aggregator_series_prefix": "URYB-AGG-.YY.-",
+            }
+        ).insert(ignore_permissions=True)
+
+    return restaurant
+
+
+def seed_tables(restaurant, branch, rooms, count):
+    tables = frappe.get_all(
+        "URY Table", filters={"restaurant": restaurant}, fields=["name", "restaurant_room"], order_by="name"
+    )
+
+    for i in range(len(tables), count):
+        room = rooms[i % len(rooms)]
+        # tables are named by prompt, the controller naming is not used
+        table = frappe.get_doc(
+            {
+                "doctype": "URY Table",
+                "name": "{0} Table {1:02d}".format(BENCH_PREFIX, i + 1),
+                "restaurant": restaurant,
+                "restaurant_room": room,
+                "branch": branch,
+                "no_of_seats": random.choice((2, 4, 4, 6, 8)),
+            }
+        ).insert(ignore_permissions=True)
+        tables.append(frappe._dict(name=table.name, restaurant_room=room))
+
+    return tables
+
+
+def seed_order_type():
+    if not frappe.db.exists("URY Order Type", "Dine In"):
+        frappe.get_doc(
+            {"doctype": "URY Order Type", "order_type": "Dine In", "require_a_table": 1}
+        ).insert(ignore_permissions=True)
+
+
+def seed_customer(name, mobile_number=None):
+    if not frappe.db.exists("Customer", name):
+        frappe.get_doc(
+            {
+                "doctype": "Customer",
+                "customer_name": name,
+                "customer_type": "Individual",
+                "customer_group": frappe.db.get_single_value("Selling Settings", "customer_group")
+                or "All Customer Groups",
+                "territory": frappe.db.get_single_value("Selling Settings", "territory") or "All Territories",
+                "mobile_number": mobile_number,
+            }
+        ).insert(ignore_permissions=True)
+    return name
+
+
+def seed_aggregators(company, branch, menu, count):
+    """aggregator customers with their own marked up price list of the menu"""
+    from ury.ury.doctype.ury_menu.ury_menu import clear_price_list_rates, sync_item_prices
+
+    branch_doc = frappe.get_doc("Branch", branch)
+    configured = {row.customer for row in branch_doc.get("custom_aggregator_settings")}
+
+    for i in range(count):
+        customer = seed_customer("{0} Aggregator {1}".format(BENCH_PREFIX, i + 1))
+        if customer in configured:
+            continue
+
+        price_list = frappe.get_doc(
+            {
+                "doctype": "Price List",
+                "price_list_name": customer,
+                "selling": 1,
+                "currency": frappe.get_cached_value("Company", company, "default_currency"),
+                "restaurant_menu": menu,
+            }
+        ).insert(ignore_permissions=True)
+
+        sync_item_prices(menu, price_list.name)
+        frappe.db.sql(
+            "UPDATE `tabItem Price` SET price_list_rate = ROUND(price_list_rate * %s, 2) WHERE price_list = %s",
+            (1.1 + 0.05 * i, price_list.name),
+        )
+        clear_price_list_rates(price_list.name)
+
+        branch_doc.append(
+            "custom_aggregator_settings",
+            {"customer": customer, "price_list": price_list.name, "mode_of_payments": MODE_OF_PAYMENT},
+        )
+
+    branch_doc.save(ignore_permissions=True)
+
+
+def seed_pos_profile(company, branch, restaurant, users):
+    pos_profile = "{0} POS".format(BENCH_PREFIX)
+    if frappe.db.exists("POS Profile", pos_profile):
+        return pos_profile
+
+    company_doc = frappe.get_cached_doc("Company", company)
+    warehouse = frappe.db.get_value("Warehouse", {"company": company, "is_group": 0}, "name")
+
+    frappe.get_doc(
+        {
+            "doctype": "POS Profile",
+            "name": pos_profile,
+            "company": company,
+            "branch": branch,
+            "restaurant": restaurant,
+            "warehouse": warehouse,
+            "currency": company_doc.default_currency,
+            "cost_center": company_doc.cost_center,
+            "write_off_account": company_doc.write_off_account or company_doc.round_off_account,
+            "write_off_cost_center": company_doc.cost_center,
+            "custom_kot_naming_series": "URYB-KOT-",
+            "payments": [{"mode_of_payment": MODE_OF_PAYMENT, "default": 1}],
+            "applicable_for_users": [{"user": user} for user in users],
+        }
+    ).insert(ignore_permissions=True)
+
+    return pos_profile
+
+
+def seed_opening_entry(company, pos_profile, branch, restaurant, room, cashier):
+    if frappe.db.exists(
+        "POS Opening Entry", {"pos_profile": pos_profile, "status": "Open", "docstatus": 1}
+    ):
+        return
+
+    frappe.get_doc(
+        {
+            "doctype": "POS Opening Entry",
+            "company": company,
+            "pos_profile": pos_profile,
+            "user": cashier,
+            "branch": branch,
+            "restaurant": restaurant,
+            "custom_room": room,
+            "period_start_date": now_datetime(),
+            "posting_date": nowdate(),
+            "balance_details": [{"mode_of_payment": MODE_OF_PAYMENT, "opening_amount": 0}],
+        }
+    ).submit()
@@ -76,6 +76,13 @@ website_context = {"splash_image": "/assets/ury/Images/ury-logo.jpg"}
 # before_install = "ury.install.before_install"
 # after_install = "ury.install.after_install"
 
+# Optional backends from other apps are resolved again whenever an app comes or goes
+after_app_install = "ury.integrations.clear_integrations"
+after_app_uninstall = "ury.integrations.clear_integrations"
+
+# patches are marked as done on a fresh install, so the indexes are also ensured on every migrate
+after_migrate = "ury.setup.create_indexes"
+
 # Uninstallation
 # ------------
 
@@ -117,39 +124,50 @@ doc_events = {
         "before_insert": "ury.ury.hooks.ury_pos_invoice.before_insert",
         "validate": "ury.ury.hooks.ury_pos_invoice.validate",
         "before_submit": "ury.ury.hooks.ury_pos_invoice.before_submit",
-        "on_cancel": "ury.ury.hooks.ury_pos_invoice.on_trash",
+        "on_submit": "ury.ury.hooks.ury_pos_invoice.on_submit",
+        "on_cancel": "ury.ury.hooks.ury_pos_invoice.on_cancel",
         "on_trash": "ury.ury.hooks.ury_pos_invoice.on_trash",
     },
-    "POS Profile": {"validate": "ury.ury.hooks.ury_pos_profile.validate"},
+    "POS Profile": {
+        "validate": "ury.ury.hooks.ury_pos_profile.validate",
+        "on_update": "ury.ury.hooks.ury_pos_profile.on_update",
+        "on_trash": "ury.ury.hooks.ury_pos_profile.on_trash",
+    },
+    "Branch": {
+        "on_update": "ury.ury.hooks.ury_branch.on_update",
+        "on_trash": "ury.ury.hooks.ury_branch.on_trash",
+    },
     "Sales Invoice": {
         "before_insert": "ury.ury.hooks.ury_sales_invoice.before_insert",
         "on_update":"ury.ury.hooks.ury_sales_invoice.on_update",
         },
     "Customer": {"before_save": "ury.ury.hooks.ury_customer.before_insert"},
     "Item": {"validate": "ury.ury.hooks.ury_item.validate"},
+    "Item Price": {
+        "on_update": "ury.ury.hooks.ury_item_price.on_update",
+        "on_trash": "ury.ury.hooks.ury_item_price.on_trash",
+    },
+    "Price List": {
+        "on_update": "ury.ury.hooks.ury_price_list.on_update",
+        "on_trash": "ury.ury.hooks.ury_price_list.on_trash",
+    },
     "POS Opening Entry": {"validate":"ury.ury.hooks.ury_pos_opening_entry.set_cashier_room"}
 }
 
 # Scheduled Tasks
 # ---------------
 
-# scheduler_events = {
-# 	"all": [
-# 		"ury.tasks.all"
-# 	],
-# 	"daily": [
-# 		"ury.tasks.daily"
-# 	],
-# 	"hourly": [
-# 		"ury.tasks.hourly"
-# 	],
-# 	"weekly": [
-# 		"ury.tasks.weekly"
-# 	],
-# 	"monthly": [
-# 		"ury.tasks.monthly"
-# 	],
-# }
+scheduler_events = {
+	"cron": {
+		"* * * * *": [
+			"ury.ury.doctype.ury_kot_intent.ury_kot_intent.retry_kot_intents",
+			"ury.ury.doctype.ury_print_job.ury_print_job.redeliver_print_jobs",
+		],
+	},
+	"daily": [
+		"ury.ury.doctype.ury_profile_record.ury_profile_record.delete_old_profile_records",
+	],
+}
 
 # Testing
 # -------
@@ -181,8 +199,9 @@ doc_events = {
 
 # Request Events
 # ----------------
-# before_request = ["ury.utils.before_request"]
-# after_request = ["ury.utils.after_request"]
+before_request = ["ury.instrumentation.before_request", "ury.profiler.before_request"]
+# unwound in reverse, both wrap frappe.db.sql
+after_request = ["ury.profiler.after_request", "ury.instrumentation.after_request"]
 
 # Job Events
 # ----------
@@ -277,6 +296,9 @@ fixtures = [
                     "POS Profile-printer_settings",
                     "POS Profile-qz_print",
                     "POS Profile-qz_host",
+                    "POS Profile-custom_receipt_renderer",
+                    "POS Profile-custom_receipt_width",
+                    "POS Profile-custom_receipt_logo",
                     "POS Profile-section_break_tjhrm",
                     "POS Profile-transfer_role_permissions",
                     "POS Profile-role_allowed_for_billing",
@@ -0,0 +1,332 @@
+"""Per-method latency, SQL and cache counters for URY endpoints.
+
+Off unless the `ury_instrumentation` site config is set. When on, every
+call to a whitelisted method under `INSTRUMENTED_PREFIXES` and every POS
+Invoice hook is timed, and the SQL statements and cache reads it makes
+are counted. Calls are aggregated per method and branch into fixed-bucket
+histograms in Redis, which `get_metrics` serves in the Prometheus text
+format and the URY Endpoint Performance report turns into percentiles.
+"""
+
+import time
+from functools import wraps
+
+import frappe
+from frappe.utils import cint
+
+
+INSTRUMENTATION_CACHE_KEY = "ury_instrumentation"
+
+INSTRUMENTED_PREFIXES = (
+    "ury.ury_pos.api.",
+    "ury.ury.doctype.ury_order.ury_order.",
+    "ury.ury.api.",
+)
+
+# upper bounds of the wall time histogram in milliseconds
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# upper bounds of the SQL statements per call histogram
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+COUNTERS = ("calls", "wall_us", "sql_count", "sql_us", "cache_calls", "cache_misses")
+
+
+def is_enabled():
+    return cint(frappe.conf.get("ury_instrumentation"))
+
+
+def before_request():
+    if not is_enabled():
+        return
+
+    method = get_request_method()
+    if method and method.startswith(INSTRUMENTED_PREFIXES):
+        frappe.local.ury_request_measurement = (method, start_measurement())
+
+
+def after_request():
+    measurement = getattr(frappe.local, "ury_request_measurement", None)
+    if not measurement:
+        return
+
+    frappe.local.ury_request_measurement = None
+    method, started = measurement
+    stats = stop_measurement(started)
+    record(method, get_request_branch(), stats)
+
+
+def get_request_method():
+    path = frappe.request.path if getattr(frappe.local, "request", None) else ""
+    if path.startswith("/api/method/"):
+        return path[len("/api/method/") :].strip("/")
+    return frappe.form_dict.get("cmd")
+
+
+def get_request_branch():
+    from ury.ury_pos.api import get_user_context
+
+    try:
+        return get_user_context().branch or ""
+    except Exception:
+        return ""
+
+
+def instrumented(fn):
+    """measure a doc event hook as its own method, under the branch of the document"""
+    method = "{0}.{1}".format(fn.__module__, fn.__name__)
+
+    @wraps(fn)
+    def call(doc, *args, **kwargs):
+        if not is_enabled():
+            return fn(doc, *args, **kwargs)
+
+        started = start_measurement()
+        try:
+            return fn(doc, *args, **kwargs)
+        finally:
+            record(method, doc.get("branch") or "", stop_measurement(started))
+
+    return call
+
+
+def start_measurement():
+    counters = install_counters()
+    counters.depth += 1
+    return frappe._dict(
+        start=time.monotonic(),
+        sql_count=counters.sql_count,
+        sql_us=counters.sql_us,
+        cache_calls=counters.cache_calls,
+        cache_misses=counters.cache_misses,
+    )
+
+
+def stop_measurement(started):
+    counters = frappe.local.ury_counters
+    stats = frappe._dict(
+        wall_us=int((time.monotonic() - started.start) * 1000000),
+        sql_count=counters.sql_count - started.sql_count,
+        sql_us=counters.sql_us - started.sql_us,
+        cache_calls=counters.cache_calls - started.cache_calls,
+        cache_misses=counters.cache_misses - started.cache_misses,
+    )
+
+    counters.depth -= 1
+    if not counters.depth:
+        uninstall_counters()
+
+    return stats
+
+
+def install_counters():
+    """count the SQL of this request's connection and the cache reads of this thread"""
+    counters = getattr(frappe.local, "ury_counters", None)
+    if counters:
+        return counters
+
+    counters = frappe.local.ury_counters = frappe._dict(
+        depth=0, sql_count=0, sql_us=0, cache_calls=0, cache_misses=0
+    )
+
+    db = frappe.db
+    sql = db.sql
+
+    @wraps(sql)
+    def counted_sql(*args, **kwargs):
+        start = time.monotonic()
+        try:
+            return sql(*args, **kwargs)
+        finally:
+            counters.sql_count += 1
+            counters.sql_us += int((time.monotonic() - start) * 1000000)
+
+    db.sql = counted_sql
+    counters.db = db
+    counters.sql = sql
+
+    patch_cache()
+    return counters
+
+
+def uninstall_counters():
+    counters = frappe.local.ury_counters
+    counters.db.sql = counters.sql
+    frappe.local.ury_counters = None
+
+
+def patch_cache():
+    """wrap the cached reads URY uses once per process, they only count while a
+    measurement is running on the current thread"""
+    cache = frappe.cache()
+    if getattr(cache, "ury_counted", False):
+        return
+
+    def counted(read, generator_index):
+        @wraps(read)
+        def call(*args, **kwargs):
+            counters = getattr(frappe.local, "ury_counters", None)
+            if not counters:
+                return read(*args, **kwargs)
+
+            args = list(args)
+            positional = len(args) > generator_index
+            generator = args[generator_index] if positional else kwargs.get("generator")
+            missed = []
+
+            if generator:
+                def counted_generator():
+                    missed.append(True)
+                    return generator()
+
+                if positional:
+                    args[generator_index] = counted_generator
+                else:
+                    kwargs["generator"] = counted_generator
+
+            value = read(*args, **kwargs)
+            counters.cache_calls += 1
+            if missed or value is None:
+                counters.cache_misses += 1
+            return value
+
+        return call
+
+    # hget(name, key, generator) and get_value(key, generator)
+    cache.hget = counted(cache.hget, 2)
+    cache.get_value = counted(cache.get_value, 1)
+    cache.ury_counted = True
+
+
+def record(method, branch, stats):
+    try:
+        cache = frappe.cache()
+        series = "{0}|{1}".format(method, branch)
+        cache.sadd(INSTRUMENTATION_CACHE_KEY, series)
+
+        pipeline = cache.pipeline()
+        pipeline.incr(stat_key(series, "calls"))
+        for counter in COUNTERS[1:]:
+            pipeline.incrby(stat_key(series, counter), stats[counter])
+        pipeline.incr(stat_key(series, "wall_bucket", get_bucket(stats.wall_us / 1000, DURATION_BUCKETS_MS)))
+        pipeline.incr(stat_key(series, "sql_bucket", get_bucket(stats.sql_count, QUERY_BUCKETS)))
+        pipeline.execute()
+    except Exception:
+        # metrics must never break an order
+        pass
+
+
+def get_bucket(value, buckets):
+    for bound in buckets:
+        if value <= bound:
+            return bound
+    return "inf"
+
+
+def stat_key(series, stat, bucket=None):
+    key = "{0}:{1}:{2}".format(INSTRUMENTATION_CACHE_KEY, series, stat)
+    if bucket is not None:
+        key = "{0}:{1}".format(key, bucket)
+    return frappe.cache().make_key(key)
+
+
+def get_series_stats():
+    """returns the counters and histogram buckets of every method and branch"""
+    cache = frappe.cache()
+    series_list = sorted(frappe.safe_decode(series) for series in cache.smembers(INSTRUMENTATION_CACHE_KEY))
+
+    keys = []
+    for series in series_list:
+        keys += [stat_key(series, counter) for counter in COUNTERS]
+        keys += [stat_key(series, "wall_bucket", bound) for bound in DURATION_BUCKETS_MS + ("inf",)]
+        keys += [stat_key(series, "sql_bucket", bound) for bound in QUERY_BUCKETS + ("inf",)]
+
+    values = iter(int(value or 0) for value in (cache.mget(keys) if keys else []))
+
+    stats = []
+    for series in series_list:
+        method, branch = series.rsplit("|", 1)
+        row = frappe._dict(method=method, branch=branch)
+        for counter in COUNTERS:
+            row[counter] = next(values)
+        row.wall_buckets = [next(values) for bound in DURATION_BUCKETS_MS + ("inf",)]
+        row.sql_buckets = [next(values) for bound in QUERY_BUCKETS + ("inf",)]
+        stats.append(row)
+
+    return stats
+
+
+def get_percentile(buckets, bounds, q):
+    """estimate a percentile from histogram counts, interpolating inside the bucket"""
+    total = sum(buckets)
+    if not total:
+        return 0
+
+    rank = q * total
+    seen = 0
+    lower = 0
+    for count, upper in zip(buckets, bounds):
+        if count and seen + count >= rank:
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+        lower = upper
+
+    # past the last bound there is nothing to interpolate against
+    return bounds[-1]
+
+
+@frappe.whitelist()
+def get_metrics():
+    """all URY method metrics in the Prometheus text exposition format"""
+    from werkzeug.wrappers import Response
+
+    frappe.only_for("System Manager")
+
+    lines = [
+        "# HELP ury_method_duration_seconds Wall time of URY methods and POS Invoice hooks.",
+        "# TYPE ury_method_duration_seconds histogram",
+    ]
+    stats = get_series_stats()
+    for row in stats:
+        labels = 'method="{0}",branch="{1}"'.format(escape_label(row.method), escape_label(row.branch))
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS_MS + ("+Inf",), row.wall_buckets):
+            cumulative += count
+            le = bound if bound == "+Inf" else bound / 1000
+            lines.append('ury_method_duration_seconds_bucket{{{0},le="{1}"}} {2}'.format(labels, le, cumulative))
+        lines.append("ury_method_duration_seconds_sum{{{0}}} {1}".format(labels, row.wall_us / 1000000))
+        lines.append("ury_method_duration_seconds_count{{{0}}} {1}".format(labels, row.calls))
+
+    for name, counter, help_text, scale in (
+        ("ury_method_sql_queries_total", "sql_count", "SQL statements run by URY methods.", 1),
+        ("ury_method_sql_seconds_total", "sql_us", "Time spent in SQL by URY methods.", 1000000),
+        ("ury_method_cache_reads_total", "cache_calls", "Cached reads made by URY methods.", 1),
+        ("ury_method_cache_misses_total", "cache_misses", "Cached reads that had to be built.", 1),
+    ):
+        lines += ["# HELP {0} {1}".format(name, help_text), "# TYPE {0} counter".format(name)]
+        for row in stats:
+            lines.append(
+                '{0}{{method="{1}",branch="{2}"}} {3}'.format(
+                    name, escape_label(row.method), escape_label(row.branch), row[counter] / scale
+                )
+            )
+
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@frappe.whitelist()
+def reset_metrics():
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    for series in cache.smembers(INSTRUMENTATION_CACHE_KEY):
+        series = frappe.safe_decode(series)
+        keys = [stat_key(series, counter) for counter in COUNTERS]
+        keys += [stat_key(series, "wall_bucket", bound) for bound in DURATION_BUCKETS_MS + ("inf",)]
+        keys += [stat_key(series, "sql_bucket", bound) for bound in QUERY_BUCKETS + ("inf",)]
+        cache.delete(*keys)
+
+    cache.delete_value(INSTRUMENTATION_CACHE_KEY)
@@ -0,0 +1,138 @@
+"""Optional backends that other apps provide to URY.
+
+Each hook is resolved once per worker and site, from the apps installed on
+the site or from the `ury_integrations` site config, and is resolved again
+after an app is installed or removed. The order path only pays a cached
+Redis read to find out whether a feature is there.
+"""
+
+import time
+
+import frappe
+
+
+REGISTRY_VERSION_CACHE_KEY = "ury_integrations_version"
+INTEGRATION_STATS_CACHE_KEY = "ury_integration_stats"
+
+# hook -> (app that must be installed, dotted path of the function)
+INTEGRATIONS = {
+    # kot_execute(invoice, customer, table, items, past_item, comments)
+    # runs in the KOT intent's transaction and must not commit, URY commits it
+    "kot_execute": (
+        "ury_mosaic",
+        "ury_mosaic.ury_mosaic.api.ury_kot_generate.kot_execute",
+    ),
+    # cancel_kot(invoice, customer, table, items, comments, pos_profile,
+    #            naming_series, kot_type, cancelled_items)
+    "cancel_kot": (
+        "ury_mosaic",
+        "ury_mosaic.ury_mosaic.api.ury_kot_generate.process_items_for_cancel_kot",
+    ),
+    # change_table(invoice, new_table, branch)
+    "change_table": (
+        "ury_mosaic",
+        "ury.ury.doctype.ury_order.ury_order.change_table_in_kot",
+    ),
+}
+
+# site -> (registry version, {hook: function or None})
+_registries = {}
+
+
+def get_integration(hook):
+    """returns the function behind `hook`, or None when no app provides it"""
+    return get_registry().get(hook)
+
+
+def has_integration(hook):
+    return get_integration(hook) is not None
+
+
+def get_registry():
+    version = frappe.cache().get_value(REGISTRY_VERSION_CACHE_KEY) or 0
+    site_registry = _registries.get(frappe.local.site)
+
+    if not site_registry or site_registry[0] != version:
+        site_registry = (version, build_registry())
+        _registries[frappe.local.site] = site_registry
+
+    return site_registry[1]
+
+
+def build_registry():
+    installed_apps = set(frappe.get_installed_apps())
+    overrides = frappe.conf.get("ury_integrations") or {}
+
+    registry = {}
+    for hook, (app, path) in INTEGRATIONS.items():
+        if hook in overrides:
+            path = overrides[hook]
+        elif app not in installed_apps:
+            registry[hook] = None
+            continue
+
+        try:
+            registry[hook] = timed(hook, frappe.get_attr(path))
+        except Exception:
+            frappe.log_error(title="URY integration {0} could not be loaded".format(hook))
+            registry[hook] = None
+
+    return registry
+
+
+def clear_integrations(app_name=None):
+    """make every worker resolve its integrations again"""
+    frappe.cache().set_value(REGISTRY_VERSION_CACHE_KEY, frappe.generate_hash(length=10))
+
+
+def timed(hook, fn):
+    def call(*args, **kwargs):
+        start = time.monotonic()
+        failed = True
+        try:
+            result = fn(*args, **kwargs)
+            failed = False
+            return result
+        finally:
+            record_call(hook, (time.monotonic() - start) * 1000, failed)
+
+    call.__name__ = fn.__name__
+    call.__wrapped__ = fn
+    return call
+
+
+def record_call(hook, duration_ms, failed):
+    try:
+        cache = frappe.cache()
+        cache.incr(stats_key(hook, "calls"))
+        cache.incrby(stats_key(hook, "us"), int(duration_ms * 1000))
+        if failed:
+            cache.incr(stats_key(hook, "errors"))
+    except Exception:
+        # metrics must never break an order
+        pass
+
+
+def stats_key(hook, stat):
+    return frappe.cache().make_key("{0}:{1}:{2}".format(INTEGRATION_STATS_CACHE_KEY, hook, stat))
+
+
+@frappe.whitelist()
+def get_integration_stats():
+    """returns calls, errors and average duration of each integration hook"""
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    registry = get_registry()
+
+    stats = {}
+    for hook in INTEGRATIONS:
+        calls, total_us, errors = (int(cache.get(stats_key(hook, stat)) or 0) for stat in ("calls", "us", "errors"))
+        stats[hook] = {
+            "available": registry.get(hook) is not None,
+            "calls": calls,
+            "errors": errors,
+            "avg_ms": round(total_us / calls / 1000, 3) if calls else 0,
+        }
+
+    return stats
@@ -0,0 +1,16 @@
+import frappe
+
+
+def execute():
+    """Record the holding invoice on tables that are occupied today."""
+    frappe.db.sql(
+        """
+        UPDATE `tabURY Table` AS t
+        INNER JOIN `tabPOS Invoice` AS inv
+            ON inv.restaurant_table = t.name
+            AND inv.docstatus = 0
+            AND inv.invoice_printed = 0
+        SET t.current_invoice = inv.name
+        WHERE t.occupied = 1 AND IFNULL(t.current_invoice, '') = ''
+        """
+    )
@@ -0,0 +1,203 @@
+"""Sampling profiler for live calls to URY methods.
+
+Switched on from URY Profiler Settings for a bounded window. A sampled
+share of calls to the configured methods, or every call from one user,
+runs with a background thread that reads the request thread's stack every
+few milliseconds and a wrapper that times each SQL statement. The result
+is stored as a URY Profile Record in a background job: collapsed stacks
+for a flame graph, and the SQL trace.
+
+Requests that are not sampled pay one cached settings read, and only
+when they call a URY method. Records per hour are capped.
+"""
+
+import random
+import sys
+import threading
+import time
+from functools import wraps
+
+import frappe
+from frappe.utils import cint, flt, get_datetime, now_datetime
+
+
+PROFILER_RECORDS_CACHE_KEY = "ury_profiler_records"
+# statements kept per record, the rest are only counted
+MAX_SQL_TRACE = 500
+MAX_QUERY_LENGTH = 1000
+
+
+class StackSampler(threading.Thread):
+    """counts the stacks a thread is seen in, in the collapsed format"""
+
+    def __init__(self, thread_id, interval_ms):
+        super().__init__(name="ury-profiler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.stacks = {}
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+
+            stack = []
+            while frame:
+                stack.append(
+                    "{0}.{1}".format(frame.f_globals.get("__name__", "?"), frame.f_code.co_name)
+                )
+                frame = frame.f_back
+
+            stack = ";".join(reversed(stack))
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join(1)
+
+    def get_collapsed(self):
+        return "\n".join(
+            "{0} {1}".format(stack, count)
+            for stack, count in sorted(self.stacks.items(), key=lambda item: -item[1])
+        )
+
+
+def before_request():
+    method = get_request_method()
+    if not method or not method.startswith("ury."):
+        return
+
+    settings = get_active_settings()
+    if not settings or not should_profile(settings, method):
+        return
+
+    if not take_record_slot(settings):
+        return
+
+    frappe.local.ury_profile = start_profile(method, cint(settings.sample_interval_ms) or 5)
+
+
+def after_request():
+    profile = getattr(frappe.local, "ury_profile", None)
+    if not profile:
+        return
+
+    frappe.local.ury_profile = None
+    record = stop_profile(profile)
+
+    frappe.enqueue(
+        "ury.ury.doctype.ury_profile_record.ury_profile_record.save_profile_record",
+        queue="short",
+        record=record,
+    )
+
+
+def get_request_method():
+    from ury.instrumentation import get_request_method
+
+    return get_request_method()
+
+
+def get_active_settings():
+    settings = frappe.get_cached_doc("URY Profiler Settings")
+    if not settings.enabled or not settings.enabled_until:
+        return None
+    if get_datetime(settings.enabled_until) < now_datetime():
+        return None
+    return settings
+
+
+def should_profile(settings, method):
+    if settings.user and settings.user == frappe.session.user:
+        return True
+
+    if not matches_method(settings.methods, method):
+        return False
+
+    return random.random() * 100 < flt(settings.sample_rate)
+
+
+def matches_method(methods, method):
+    for line in (methods or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if method == line or (line.endswith(".") and method.startswith(line)):
+            return True
+    return False
+
+
+def take_record_slot(settings):
+    """keep a busy site from writing more than the hourly limit of records"""
+    limit = cint(settings.max_records_per_hour)
+    if limit <= 0:
+        return False
+
+    cache = frappe.cache()
+    key = cache.make_key("{0}:{1}".format(PROFILER_RECORDS_CACHE_KEY, now_datetime().strftime("%Y%m%d%H")))
+    taken = cache.incr(key)
+    if taken == 1:
+        cache.expire(key, 60 * 60)
+    return taken <= limit
+
+
+def start_profile(method, interval_ms):
+    profile = frappe._dict(
+        method=method,
+        user=frappe.session.user,
+        start=time.monotonic(),
+        interval_ms=interval_ms,
+        sql_trace=[],
+        sql_count=0,
+        sql_us=0,
+    )
+
+    db = frappe.db
+    sql = db.sql
+
+    @wraps(sql)
+    def traced_sql(*args, **kwargs):
+        start = time.monotonic()
+        try:
+            return sql(*args, **kwargs)
+        finally:
+            duration_us = int((time.monotonic() - start) * 1000000)
+            profile.sql_count += 1
+            profile.sql_us += duration_us
+            if len(profile.sql_trace) < MAX_SQL_TRACE:
+                query = getattr(db, "last_query", None) or (args[0] if args else "")
+                profile.sql_trace.append(
+                    {
+                        "query": frappe.safe_decode(query)[:MAX_QUERY_LENGTH],
+                        "ms": round(duration_us / 1000, 3),
+                    }
+                )
+
+    db.sql = traced_sql
+    profile.db = db
+    profile.sql = sql
+
+    profile.sampler = StackSampler(threading.get_ident(), interval_ms)
+    profile.sampler.start()
+    return profile
+
+
+def stop_profile(profile):
+    profile.sampler.stop()
+    profile.db.sql = profile.sql
+
+    return {
+        "method": profile.method,
+        "user": profile.user,
+        "duration_ms": round((time.monotonic() - profile.start) * 1000, 1),
+        "sql_count": profile.sql_count,
+        "sql_time_ms": round(profile.sql_us / 1000, 1),
+        "samples": profile.sampler.samples,
+        "sample_interval_ms": profile.interval_ms,
+        "collapsed_stacks": profile.sampler.get_collapsed(),
+        "sql_trace": frappe.as_json(profile.sql_trace),
+    }
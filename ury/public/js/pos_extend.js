@@ -46,23 +46,31 @@ frappe.pages['point-of-sale'].on_page_load = function (wrapper) {
                 this.status_field.set_value('Draft');
             }
             refresh_list() {
-                frappe.dom.freeze();
                 this.events.reset_summary();
+                this.$invoices_container.html('');
+                return this.load_orders();
+            }
+            load_orders(cursor) {
+                frappe.dom.freeze();
                 const search_term = this.search_field.get_value();
                 const status = this.status_field.get_value();
 
-                this.$invoices_container.html('');
-
                 return frappe.call({
                     method: "ury.ury.api.pos_extend.overrided_past_order_list",
                     freeze: true,
-                    args: { search_term, status },
+                    args: { search_term, status, cursor, with_cursor: 1 },
                     callback: (response) => {
                         frappe.dom.unfreeze();
-                        response.message.forEach(invoice => {
+                        this.$invoices_container.find('.ury-load-more').remove();
+                        response.message.orders.forEach(invoice => {
                             const invoice_html = this.get_invoice_html(invoice);
                             this.$invoices_container.append(invoice_html);
                         });
+                        if (response.message.next_cursor) {
+                            $(`<button class="btn btn-default btn-sm ury-load-more">${__('Load More')}</button>`)
+                                .appendTo(this.$invoices_container)
+                                .on('click', () => this.load_orders(JSON.stringify(response.message.next_cursor)));
+                        }
                     }
                 });
             }
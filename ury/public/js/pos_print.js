@@ -4,6 +4,23 @@ frappe.require([
     '/assets/ury/js/sign-message.js'
 ]);
 
+// the spooler prints in the background, the bill only counts as printed once the
+// printer has taken the job
+let wait_for_network_print = function (invoice, on_printed) {
+    const handler = (job) => {
+        if (job.doctype !== 'POS Invoice' || job.name !== invoice) return;
+        if (job.status === 'Printed') {
+            frappe.realtime.off('ury_print_job', handler);
+            on_printed();
+        }
+        else if (job.status === 'Failed') {
+            frappe.realtime.off('ury_print_job', handler);
+            frappe.msgprint({ title: __('Printing Failed'), message: job.error, indicator: 'red' });
+        }
+    };
+    frappe.realtime.on('ury_print_job', handler);
+};
+
 frappe.ui.form.on('POS Invoice', {
 
     before_save: function (frm) {
@@ -44,9 +61,11 @@ frappe.ui.form.on('POS Invoice', {
                         }
                     });
 
+                    // ESC/POS profiles send the receipt as raw printer commands instead of HTML
+                    const escpos = profile.custom_receipt_renderer == "ESC/POS";
                     frappe.call({
-                        method: "frappe.www.printview.get_html_and_style",
-                        args: {
+                        method: escpos ? "ury.ury.api.escpos.get_qz_receipt" : "frappe.www.printview.get_html_and_style",
+                        args: escpos ? { doctype: "POS Invoice", name: invoice } : {
                             doc: "POS Invoice",
                             name: invoice,
                             print_format: profile.print_format,
@@ -76,12 +95,9 @@ frappe.ui.form.on('POS Invoice', {
                             function printWithQZTray() {
                                 qz.printers.getDefault()
                                     .then((printer) => {
-                                        var htmlcontent = r.message.html;
-                                        var data = [{
-                                            type: 'html',
-                                            format: 'plain',
-                                            data: htmlcontent
-                                        }];
+                                        var data = escpos
+                                            ? [{ type: 'raw', format: 'base64', data: r.message.raw }]
+                                            : [{ type: 'html', format: 'plain', data: r.message.html }];
 
                                         var config = qz.configs.create(printer);
                                         qz.print(config, data)
@@ -131,11 +147,13 @@ frappe.ui.form.on('POS Invoice', {
                             },
                             callback: function (r) {
                                 if (r.message == "Success") {
-                                    $('.standard-actions').addClass('hidden-xs hidden-md');
-                                    frappe.show_alert({ message: __('Invoice Printed'), indicator: 'green' });
-                                    cur_frm.set_value('invoice_printed', 1);
+                                    frappe.show_alert({ message: __('Invoice sent to printer'), indicator: 'blue' });
                                     frappe.dom.unfreeze();
-                                    cur_frm.reload_doc();
+                                    wait_for_network_print(invoice, () => {
+                                        $('.standard-actions').addClass('hidden-xs hidden-md');
+                                        frappe.show_alert({ message: __('Invoice Printed'), indicator: 'green' });
+                                        cur_frm.reload_doc();
+                                    });
                                 }
                                 else {
                                     console.error(r.message);
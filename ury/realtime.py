@@ -0,0 +1,234 @@
+"""Realtime events buffered for the length of a transaction.
+
+Events published through `publish` are held until the transaction commits
+and dropped if it rolls back. Identical events are sent once, and events
+published with `merge=True` are folded into one payload per channel. A
+channel can also be debounced across requests: the first event of a
+window goes out at once and whatever arrives during the window is merged
+and sent once when the window closes.
+
+Events published for a `branch` only reach the sockets of that branch's
+users instead of every client on the site.
+
+Debounce windows are in milliseconds per event name prefix, from the
+`ury_realtime_debounce_ms` site config, e.g. {"table_update": 500}.
+"""
+
+from datetime import timedelta
+
+import frappe
+
+
+REALTIME_WINDOW_CACHE_KEY = "ury_realtime_window"
+REALTIME_PENDING_CACHE_KEY = "ury_realtime_pending"
+REALTIME_TRAILING_CACHE_KEY = "ury_realtime_trailing"
+
+# kitchen and table boards refresh from the latest state, so a burst can become one event
+DEFAULT_DEBOUNCE_MS = {"table_update": 500, "kot_update": 500}
+# a trailing job that never runs only holds a channel's deferred events back this long
+TRAILING_TIMEOUT_MS = 10000
+
+
+def publish(
+    event, message=None, room=None, user=None, doctype=None, docname=None, merge=False, branch=None
+):
+    """send a realtime event once the current transaction commits
+
+    with `merge`, dict payloads for the same channel are combined, lists of
+    documents are joined by their `name`, otherwise later values win; with
+    `branch`, the event goes to the users of that branch only
+    """
+    events = get_buffer()
+    channel = channel_key(event, room, user, doctype, docname, branch)
+
+    entry = events.get(channel)
+    if not entry:
+        entry = events[channel] = {
+            "event": event,
+            "room": room,
+            "user": user,
+            "doctype": doctype,
+            "docname": docname,
+            "branch": branch,
+            "merge": merge,
+            "messages": [],
+        }
+
+    add_message(entry, message)
+
+
+def get_buffer():
+    events = getattr(frappe.local, "ury_realtime_events", None)
+    if events is None:
+        events = frappe.local.ury_realtime_events = {}
+        frappe.db.after_commit.add(flush)
+        frappe.db.after_rollback.add(discard)
+
+    return events
+
+
+def add_message(entry, message):
+    if entry["merge"] and entry["messages"]:
+        entry["messages"] = [merge_messages(entry["messages"][0], message)]
+    elif message not in entry["messages"]:
+        entry["messages"].append(message)
+
+
+def merge_messages(old, new):
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+
+    merged = dict(old)
+    for key, value in new.items():
+        if isinstance(value, list) and isinstance(merged.get(key), list):
+            merged[key] = merge_lists(merged[key], value)
+        else:
+            merged[key] = value
+
+    return merged
+
+
+def merge_lists(old, new):
+    rows = {}
+    for row in old + new:
+        key = row.get("name") if isinstance(row, dict) and row.get("name") else frappe.as_json(row)
+        rows.pop(key, None)
+        rows[key] = row
+
+    return list(rows.values())
+
+
+def discard():
+    frappe.local.ury_realtime_events = None
+
+
+def flush():
+    events = getattr(frappe.local, "ury_realtime_events", None) or {}
+    discard()
+
+    for channel, entry in events.items():
+        debounce_ms = get_debounce_ms(entry["event"])
+        if debounce_ms and not open_window(channel, debounce_ms):
+            defer(channel, entry, debounce_ms)
+            continue
+
+        emit(entry)
+
+
+def emit(entry):
+    if entry.get("branch"):
+        from ury.ury_pos.api import get_branch_users
+
+        # every socket joins its user's room, so the branch needs no room of its own
+        for user in get_branch_users(entry["branch"]):
+            for message in entry["messages"]:
+                frappe.publish_realtime(entry["event"], message, user=user)
+        return
+
+    for message in entry["messages"]:
+        frappe.publish_realtime(
+            entry["event"],
+            message,
+            room=entry["room"],
+            user=entry["user"],
+            doctype=entry["doctype"],
+            docname=entry["docname"],
+        )
+
+
+def get_debounce_ms(event):
+    debounce = dict(DEFAULT_DEBOUNCE_MS)
+    debounce.update(frappe.conf.get("ury_realtime_debounce_ms") or {})
+
+    # the longest matching prefix wins, so one branch's channel can be tuned on its own
+    for prefix in sorted(debounce, key=len, reverse=True):
+        if event.startswith(prefix):
+            return int(debounce[prefix] or 0)
+
+    return 0
+
+
+def open_window(channel, debounce_ms):
+    """start a debounce window for the channel, False if one is already open"""
+    cache = frappe.cache()
+    return bool(cache.set(window_key(channel), 1, nx=True, px=debounce_ms))
+
+
+def defer(channel, entry, debounce_ms):
+    cache = frappe.cache()
+    cache.rpush(pending_key(channel), frappe.as_json(entry, indent=None))
+
+    # one trailing job per window sends everything that piled up, once the window closes
+    if cache.set(trailing_key(channel), 1, nx=True, px=debounce_ms + TRAILING_TIMEOUT_MS):
+        enqueue_in(
+            max(cache.pttl(window_key(channel)) or 0, 0),
+            "ury.realtime.flush_deferred",
+            channel=channel,
+            debounce_ms=debounce_ms,
+        )
+
+
+def enqueue_in(delay_ms, method, **kwargs):
+    """run `method` in the background after `delay_ms`, held back by the RQ scheduler
+    instead of a sleeping worker"""
+    from frappe.utils.background_jobs import execute_job, get_queue
+
+    if not delay_ms or frappe.flags.in_test:
+        frappe.enqueue(method, queue="short", now=frappe.flags.in_test, **kwargs)
+        return
+
+    get_queue("short").enqueue_in(
+        timedelta(milliseconds=delay_ms),
+        execute_job,
+        kwargs={
+            "site": frappe.local.site,
+            "user": frappe.session.user,
+            "method": method,
+            "event": None,
+            "job_name": method,
+            "is_async": True,
+            "kwargs": kwargs,
+        },
+    )
+
+
+def flush_deferred(channel, debounce_ms):
+    """send the events held back during a debounce window once it closes"""
+    cache = frappe.cache()
+
+    # let go of the trailing slot before draining: an event deferred from here on
+    # either lands in this drain or schedules the next trailing job, never neither
+    cache.delete(trailing_key(channel))
+
+    entry = None
+    while True:
+        deferred = cache.lpop(pending_key(channel))
+        if not deferred:
+            break
+
+        deferred = frappe.parse_json(frappe.safe_decode(deferred))
+        if not entry:
+            entry = dict(deferred, messages=[])
+        for message in deferred["messages"]:
+            add_message(entry, message)
+
+    if entry:
+        # the trailing event opens the next window, a burst keeps coalescing
+        cache.set(window_key(channel), 1, px=debounce_ms)
+        emit(entry)
+
+
+def channel_key(event, room=None, user=None, doctype=None, docname=None, branch=None):
+    return ":".join(str(part or "") for part in (event, room, user, doctype, docname, branch))
+
+
+def window_key(channel):
+    return frappe.cache().make_key("{0}:{1}".format(REALTIME_WINDOW_CACHE_KEY, channel))
+
+
+def trailing_key(channel):
+    return frappe.cache().make_key("{0}:{1}".format(REALTIME_TRAILING_CACHE_KEY, channel))
+
+
+def pending_key(channel):
+    return "{0}:{1}".format(REALTIME_PENDING_CACHE_KEY, channel)
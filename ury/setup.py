@@ -7,7 +7,26 @@ from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
 
 def after_install():
     create_custom_fields(get_custom_fields())
-    
+    create_indexes()
+
+
+def create_indexes():
+    """indexes URY queries rely on in ERPNext tables, safe to run on every migrate"""
+    # invoice lists page by (modified, name) within a branch and status
+    add_index_if_columns_exist(
+        "POS Invoice", ["branch", "status", "modified"], "ury_branch_status_modified"
+    )
+    # recent orders search matches these by prefix
+    for fieldname in ("customer", "customer_name", "mobile_number"):
+        add_index_if_columns_exist("POS Invoice", [fieldname], "ury_{}_index".format(fieldname))
+
+
+def add_index_if_columns_exist(doctype, fields, index_name):
+    # custom fields arrive with the fixtures, which sync after the install hooks
+    if all(frappe.db.has_column(doctype, fieldname) for fieldname in fields):
+        frappe.db.add_index(doctype, fields, index_name=index_name)
+
+
 def before_uninstall():
 	delete_custom_fields(get_custom_fields())
  
@@ -287,6 +306,31 @@ def get_custom_fields():
 				"insert_after": "qz_print",
 				"label": "QZ Host",
 				"translatable": 0,
+			},
+			{
+				"default": "PDF",
+				"description": "ESC/POS prints bills as text on thermal printers, without rendering a PDF",
+				"fieldname": "custom_receipt_renderer",
+				"fieldtype": "Select",
+				"insert_after": "qz_host",
+				"label": "Receipt Renderer",
+				"options": "PDF\nESC/POS",
+			},
+			{
+				"default": "80mm",
+				"depends_on": 'eval:doc.custom_receipt_renderer == "ESC/POS"',
+				"fieldname": "custom_receipt_width",
+				"fieldtype": "Select",
+				"insert_after": "custom_receipt_renderer",
+				"label": "Receipt Width",
+				"options": "80mm\n58mm",
+			},
+			{
+				"depends_on": 'eval:doc.custom_receipt_renderer == "ESC/POS"',
+				"fieldname": "custom_receipt_logo",
+				"fieldtype": "Attach Image",
+				"insert_after": "custom_receipt_width",
+				"label": "Receipt Logo",
 			}
 		],
   
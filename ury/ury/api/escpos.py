@@ -0,0 +1,328 @@
+"""Receipts rendered straight to ESC/POS bytes for thermal printers.
+
+This skips HTML and wkhtmltopdf: a bill is a few hundred bytes of text
+commands, plus a raster logo that is cached per image and paper width.
+Arabic text is shaped and reordered with arabic_reshaper and python-bidi
+when they are installed, and printed through the printer's PC864 code page
+or the one set in the `ury_escpos_arabic_codepage` site config.
+"""
+
+import base64
+import io
+import re
+
+import frappe
+from frappe import _
+from frappe.utils import flt, fmt_money, format_date, format_time
+
+
+RECEIPT_RENDERER_ESCPOS = "ESC/POS"
+RECEIPT_LOGO_CACHE_KEY = "ury_receipt_logo"
+
+ESC = b"\x1b"
+GS = b"\x1d"
+
+INIT = ESC + b"@"
+ALIGN_LEFT = ESC + b"a\x00"
+ALIGN_CENTER = ESC + b"a\x01"
+BOLD_ON = ESC + b"E\x01"
+BOLD_OFF = ESC + b"E\x00"
+SIZE_NORMAL = GS + b"!\x00"
+SIZE_DOUBLE = GS + b"!\x11"
+CUT = GS + b"V\x42\x00"
+
+# ESC t code pages as numbered on Epson compatible printers, by Python codec name
+CODEPAGES = {
+    "cp437": 0,
+    "cp850": 2,
+    "cp860": 3,
+    "cp863": 4,
+    "cp865": 5,
+    "cp1252": 16,
+    "cp866": 17,
+    "cp852": 18,
+    "cp858": 19,
+    "cp720": 32,
+    "cp864": 37,
+    "cp1256": 50,
+}
+DEFAULT_ARABIC_CODEPAGE = "cp864"
+
+# characters per line in font A, and raster width in dots, per paper width
+PAPER_WIDTHS = {"80mm": (48, 576), "58mm": (32, 384)}
+
+ARABIC_RE = re.compile("[\u0600-\u06ff\u0750-\u077f\ufb50-\ufdff\ufe70-\ufeff]")
+
+
+class Receipt:
+    """collects ESC/POS commands for one receipt"""
+
+    def __init__(self, width="80mm"):
+        self.columns, self.dots = PAPER_WIDTHS.get(width, PAPER_WIDTHS["80mm"])
+        self.codepage = None
+        self.buffer = bytearray(INIT)
+
+    def raw(self, data):
+        self.buffer += data
+        return self
+
+    def text(self, text="", align=None, bold=False, double=False):
+        if align == "center":
+            self.raw(ALIGN_CENTER)
+        if bold:
+            self.raw(BOLD_ON)
+        if double:
+            self.raw(SIZE_DOUBLE)
+
+        self.raw(self.encode(text) + b"\n")
+
+        if double:
+            self.raw(SIZE_NORMAL)
+        if bold:
+            self.raw(BOLD_OFF)
+        if align == "center":
+            self.raw(ALIGN_LEFT)
+        return self
+
+    def columns_line(self, left, right, bold=False):
+        """`left` and `right` on one line, the left part wraps when it is too long"""
+        left, right = str(left or ""), str(right or "")
+        space = max(self.columns - len(right) - 1, 1)
+
+        lines = wrap(left, space) or [""]
+        for line in lines[:-1]:
+            self.text(line, bold=bold)
+        return self.text(lines[-1].ljust(space) + " " + right, bold=bold)
+
+    def separator(self, char="-"):
+        return self.text(char * self.columns)
+
+    def image(self, raster):
+        if raster:
+            self.raw(ALIGN_CENTER).raw(raster).raw(ALIGN_LEFT)
+        return self
+
+    def cut(self, feed=4):
+        return self.raw(ESC + b"d" + bytes([feed])).raw(CUT)
+
+    def encode(self, text):
+        text = str(text)
+        codepage = "cp437"
+        if ARABIC_RE.search(text):
+            text = shape_arabic(text)
+            codepage = get_arabic_codepage()
+
+        if codepage != self.codepage:
+            self.raw(ESC + b"t" + bytes([CODEPAGES[codepage]]))
+            self.codepage = codepage
+
+        return text.encode(codepage, errors="replace")
+
+    def getvalue(self):
+        return bytes(self.buffer)
+
+
+def get_arabic_codepage():
+    codepage = (frappe.conf.get("ury_escpos_arabic_codepage") or DEFAULT_ARABIC_CODEPAGE).lower()
+    if codepage not in CODEPAGES:
+        frappe.throw(
+            _("ESC/POS code page {0} in ury_escpos_arabic_codepage is not supported, use one of {1}").format(
+                codepage, ", ".join(CODEPAGES)
+            )
+        )
+    return codepage
+
+
+def shape_arabic(text):
+    """join Arabic letters and put the line in visual order, as printers expect"""
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return text
+
+    return get_display(arabic_reshaper.reshape(text))
+
+
+def wrap(text, width):
+    lines, line = [], ""
+    for word in text.split():
+        while len(word) > width:
+            if line:
+                lines.append(line)
+                line = ""
+            lines.append(word[:width])
+            word = word[width:]
+
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = "{} {}".format(line, word).strip()
+
+    if line:
+        lines.append(line)
+    return lines
+
+
+def get_receipt_renderer(pos_profile):
+    if not pos_profile:
+        return None
+    return frappe.db.get_value("POS Profile", pos_profile, "custom_receipt_renderer")
+
+
+def is_escpos_receipt(doctype, name):
+    # a KOT prints the way the bills of its invoice's POS Profile do
+    if doctype == "URY KOT":
+        doctype, name = "POS Invoice", frappe.db.get_value("URY KOT", name, "invoice")
+    if doctype != "POS Invoice" or not name:
+        return False
+    pos_profile = frappe.db.get_value(doctype, name, "pos_profile")
+    return get_receipt_renderer(pos_profile) == RECEIPT_RENDERER_ESCPOS
+
+
+def render_receipt(doctype, name):
+    """returns the ESC/POS bytes of a POS Invoice bill or a KOT"""
+    doc = frappe.get_doc(doctype, name)
+    doc.check_permission("print")
+
+    if doctype == "POS Invoice":
+        return render_pos_invoice(doc)
+    if doctype == "URY KOT":
+        return render_kot(doc)
+
+    frappe.throw(_("ESC/POS receipts are not available for {0}").format(doctype))
+
+
+def render_pos_invoice(invoice):
+    profile = frappe.db.get_value(
+        "POS Profile",
+        invoice.pos_profile,
+        ["custom_receipt_width", "custom_receipt_logo", "restaurant"],
+        as_dict=True,
+    ) or frappe._dict()
+
+    receipt = Receipt(profile.custom_receipt_width or "80mm")
+    receipt.image(get_logo_raster(profile.custom_receipt_logo, receipt.dots))
+
+    if profile.restaurant:
+        receipt.text(profile.restaurant, align="center", bold=True, double=True)
+    receipt.text(invoice.company, align="center")
+    receipt.separator()
+
+    receipt.columns_line(_("Invoice"), invoice.name)
+    receipt.columns_line(
+        format_date(invoice.posting_date), format_time(invoice.posting_time)
+    )
+    if invoice.get("restaurant_table"):
+        receipt.columns_line(_("Table"), invoice.restaurant_table)
+    if invoice.get("waiter"):
+        receipt.columns_line(_("Waiter"), invoice.waiter)
+    receipt.columns_line(_("Customer"), invoice.customer_name or invoice.customer)
+    receipt.separator()
+
+    for item in invoice.items:
+        receipt.columns_line(
+            "{0} x {1}".format(flt(item.qty), item.item_name),
+            fmt_money(item.amount),
+        )
+        if item.get("comment"):
+            receipt.text("  " + item.comment)
+    receipt.separator()
+
+    receipt.columns_line(_("Net Total"), fmt_money(invoice.net_total))
+    for tax in invoice.taxes:
+        receipt.columns_line(tax.description, fmt_money(tax.tax_amount))
+    if invoice.discount_amount:
+        receipt.columns_line(
+            _("Discount"), fmt_money(-invoice.discount_amount)
+        )
+
+    grand_total = invoice.rounded_total or invoice.grand_total
+    receipt.columns_line(
+        "{0} ({1})".format(_("Grand Total"), invoice.currency), fmt_money(grand_total), bold=True
+    )
+    receipt.separator()
+    receipt.text(_("Thank You"), align="center")
+
+    return receipt.cut().getvalue()
+
+
+def render_kot(kot):
+    pos_profile = frappe.db.get_value("POS Invoice", kot.get("invoice"), "pos_profile")
+    width = frappe.db.get_value("POS Profile", pos_profile, "custom_receipt_width") if pos_profile else None
+
+    receipt = Receipt(width or "80mm")
+    receipt.text(kot.get("type") or _("KOT"), align="center", bold=True, double=True)
+    receipt.columns_line(_("KOT"), kot.name)
+    receipt.columns_line(_("Invoice"), kot.get("invoice"))
+    if kot.get("restaurant_table"):
+        receipt.text(_("Table") + ": " + kot.restaurant_table, bold=True, double=True)
+    receipt.separator()
+
+    for item in kot.get("kot_items") or kot.get("items") or []:
+        qty = item.get("quantity") or item.get("qty")
+        receipt.text("{0} x {1}".format(flt(qty), item.get("item_name")), bold=True)
+        if item.get("comments") or item.get("comment"):
+            receipt.text("  " + (item.get("comments") or item.get("comment")))
+
+    if kot.get("comments"):
+        receipt.separator()
+        receipt.text(kot.comments)
+
+    return receipt.cut().getvalue()
+
+
+def get_logo_raster(file_url, dots):
+    """returns the logo as a GS v 0 raster command, cached per image and width"""
+    if not file_url:
+        return None
+
+    return frappe.cache().hget(
+        RECEIPT_LOGO_CACHE_KEY,
+        "{0}:{1}".format(file_url, dots),
+        generator=lambda: build_logo_raster(file_url, dots),
+    )
+
+
+def build_logo_raster(file_url, dots):
+    from PIL import Image
+
+    try:
+        content = frappe.get_doc("File", {"file_url": file_url}).get_content()
+        image = Image.open(io.BytesIO(content))
+    except Exception:
+        frappe.log_error(title="Receipt logo {0} could not be loaded".format(file_url))
+        return None
+
+    # paste on white so transparent logos do not print as solid black
+    image = image.convert("RGBA")
+    background = Image.new("RGBA", image.size, "white")
+    image = Image.alpha_composite(background, image).convert("L")
+
+    max_width = dots // 2
+    if image.width > max_width:
+        image = image.resize((max_width, max(1, image.height * max_width // image.width)))
+
+    # a set bit prints a dot, so black pixels become 1
+    image = image.point(lambda p: 255 if p < 128 else 0).convert("1")
+    width_bytes = (image.width + 7) // 8
+    if image.width != width_bytes * 8:
+        padded = Image.new("1", (width_bytes * 8, image.height), 0)
+        padded.paste(image, (0, 0))
+        image = padded
+
+    header = GS + b"v0\x00" + bytes(
+        [width_bytes % 256, width_bytes // 256, image.height % 256, image.height // 256]
+    )
+    return header + image.tobytes()
+
+
+def clear_receipt_logos():
+    frappe.cache().delete_key(RECEIPT_LOGO_CACHE_KEY)
+
+
+@frappe.whitelist()
+def get_qz_receipt(doctype, name):
+    """returns the receipt as base64 for QZ Tray's raw print"""
+    return {"raw": base64.b64encode(render_receipt(doctype, name)).decode("ascii")}
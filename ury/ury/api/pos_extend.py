@@ -15,97 +15,80 @@ from erpnext.selling.page.point_of_sale.point_of_sale import (
     get_item_group_condition,
 )
 from erpnext.accounts.party import get_due_date, get_party_account
+from ury.ury_pos.api import get_user_context
 
 
 @frappe.whitelist()
-def overrided_past_order_list(search_term, status, limit=20):
+def overrided_past_order_list(search_term, status, limit=20, cursor=None, with_cursor=0):
+    """recent orders for the POS pane, filtered and paged in SQL
+
+    returns the list of orders, or `{orders, next_cursor}` with `with_cursor`;
+    `cursor` is the `next_cursor` of the previous page, the (modified, name)
+    of its last row, it is empty once there are no more orders
+    """
     user = frappe.session.user
+    conditions = []
+    values = {"limit": cint(limit) or 20}
 
     if user != "Administrator":
-        sql_query = """
-            SELECT b.branch,a.room
-            FROM `tabURY User` AS a
-            INNER JOIN `tabBranch` AS b ON a.parent = b.name
-            WHERE a.user = %s
-        """
-        branch_array = frappe.db.sql(sql_query, user, as_dict=True)
+        user_context = get_user_context(user)
 
-        if not branch_array:
+        if not user_context.branch:
             frappe.throw("User is not Associated with any Branch.Please refresh Page")
 
-        branch_name = branch_array[0].get("branch")
-        room_name = branch_array[0].get("room")
+        # users without a room see the orders that have none
+        conditions.append("branch = %(branch)s AND IFNULL(custom_restaurant_room, '') = %(room)s")
+        values.update(branch=user_context.branch, room=user_context.room or "")
 
-    fields = [
-        "name",
-        "grand_total",
-        "currency",
-        "customer",
-        "posting_time",
-        "posting_date",
-        "restaurant_table",
-        "invoice_printed",
-    ]
-    invoice_list = []
-    updated_list = []
+    if not status:
+        return {"orders": [], "next_cursor": None} if cint(with_cursor) else []
 
-    if search_term and status:
-        invoices_by_customer = frappe.db.get_all(
-            "POS Invoice",
-            filters={
-                "customer": ["like", "%{}%".format(search_term)],
-                "status": status,
-            },
-            fields=fields,
+    if status == "To Bill":
+        conditions.append(
+            "status = 'Draft' AND IFNULL(restaurant_table, '') != '' AND invoice_printed = 0"
+        )
+    else:
+        conditions.append(
+            "status = %(status)s AND (IFNULL(restaurant_table, '') = '' OR invoice_printed = 1)"
         )
-        invoices_by_name = frappe.db.get_all(
-            "POS Invoice",
-            filters={"name": ["like", "%{}%".format(search_term)], "status": status},
-            fields=fields,
+        values["status"] = status
+
+    if search_term:
+        # every column matches by prefix so each can range scan its own index,
+        # a match anywhere in the name would scan every invoice
+        conditions.append(
+            """(name LIKE %(search_term)s OR customer LIKE %(search_term)s
+            OR customer_name LIKE %(search_term)s OR mobile_number LIKE %(search_term)s)"""
         )
-        invoice_list = invoices_by_customer + invoices_by_name
+        search_term = search_term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        values.update(search_term="{}%".format(search_term))
 
-    elif status:
-        if user != "Administrator":
-            if status == "To Bill":
-                invoice_list = frappe.db.get_all(
-                    "POS Invoice",
-                    filters={"status": "Draft", "branch": branch_name,"custom_restaurant_room": room_name},
-                    fields=fields,
-                )
-                for invoice in invoice_list:
-                    if invoice.restaurant_table and invoice.invoice_printed == 0:
-                        updated_list.append(invoice)
+    cursor = frappe.parse_json(cursor) if cursor else None
+    if cursor:
+        conditions.append(
+            "(modified < %(cursor_modified)s OR (modified = %(cursor_modified)s AND name < %(cursor_name)s))"
+        )
+        values.update(cursor_modified=cursor.get("modified"), cursor_name=cursor.get("name"))
 
-            else:
-                invoice_list = frappe.db.get_all(
-                    "POS Invoice",
-                    filters={"status": status, "branch": branch_name,"custom_restaurant_room":room_name},
-                    fields=fields,
-                )
-                for invoice in invoice_list:
-                    if not invoice.restaurant_table or invoice.invoice_printed == 1:
-                        updated_list.append(invoice)
+    orders = frappe.db.sql(
+        """
+        SELECT
+            name, grand_total, currency, customer, posting_time, posting_date,
+            restaurant_table, invoice_printed, modified
+        FROM `tabPOS Invoice`
+        WHERE {conditions}
+        ORDER BY modified desc, name desc
+        LIMIT %(limit)s
+        """.format(conditions=" AND ".join(conditions)),
+        values,
+        as_dict=True,
+    )
 
-        else:
-            if status == "To Bill":
-                invoice_list = frappe.db.get_all(
-                    "POS Invoice",
-                    filters={"status": "Draft"},
-                    fields=fields,
-                )
-                for invoice in invoice_list:
-                    if invoice.restaurant_table and invoice.invoice_printed == 0:
-                        updated_list.append(invoice)
+    if not cint(with_cursor):
+        return orders
 
-            else:
-                invoice_list = frappe.db.get_all(
-                    "POS Invoice",
-                    filters={"status": status},
-                    fields=fields,
-                )
-                for invoice in invoice_list:
-                    if not invoice.restaurant_table or invoice.invoice_printed == 1:
-                        updated_list.append(invoice)
+    next_cursor = None
+    if len(orders) == values["limit"]:
+        next_cursor = {"modified": str(orders[-1].modified), "name": orders[-1].name}
 
-    return updated_list
+    return {"orders": orders, "next_cursor": next_cursor}
@@ -0,0 +1,261 @@
+import importlib.util
+import os
+import tempfile
+
+import frappe
+from frappe import _
+from frappe.utils import cint, now
+from pypdf import PdfWriter
+
+from ury.ury.api.escpos import RECEIPT_RENDERER_ESCPOS, is_escpos_receipt, render_receipt
+
+
+PRINT_JOB_CACHE_KEY = "ury_print_job"
+PRINT_QUEUE_CACHE_KEY = "ury_print_queue"
+PRINT_LOCK_CACHE_KEY = "ury_print_lock"
+# job status is kept for a day, long enough for any screen to look it up
+PRINT_JOB_TTL = 24 * 60 * 60
+PRINT_LOCK_TIMEOUT = 5 * 60
+
+# (server, port) -> open CUPS connection, kept for the life of the worker
+_connections = {}
+
+
+def spool_print_job(doctype, name, printer_setting, print_format=None, no_letterhead=0, on_printed=None):
+    """queue a document on a network printer and return the job, the PDF is rendered
+    and sent by a background worker
+
+    `on_printed` is the dotted path of a function(doctype, name) the worker calls once
+    the printer has accepted the job
+    """
+    if not importlib.util.find_spec("cups"):
+        frappe.throw(_("Failed to import cups"))
+
+    printer = get_printer_settings(printer_setting)
+
+    job = frappe._dict(
+        name=frappe.generate_hash(length=12),
+        doctype=doctype,
+        docname=name,
+        print_format=print_format,
+        no_letterhead=cint(no_letterhead),
+        printer_setting=printer_setting,
+        renderer=RECEIPT_RENDERER_ESCPOS if is_escpos_receipt(doctype, name) else "PDF",
+        printer_name=printer.printer_name,
+        server=printer.server_ip,
+        port=cint(printer.port),
+        owner=frappe.session.user,
+        on_printed=on_printed,
+        status="Queued",
+        error=None,
+        creation=now(),
+        modified=now(),
+    )
+    set_print_job(job)
+    frappe.cache().set_value(
+        last_job_key(doctype, name), job.name, expires_in_sec=PRINT_JOB_TTL
+    )
+
+    def queue_print_job():
+        # one queue per printer keeps its jobs in order, printers work in parallel
+        frappe.cache().rpush(queue_key(printer_setting), job.name)
+        frappe.enqueue(
+            "ury.ury.api.print_spooler.drain_printer_queue",
+            queue="short",
+            printer_setting=printer_setting,
+            now=frappe.flags.in_test,
+        )
+
+    # a worker must not print a document whose transaction may still roll back
+    if frappe.flags.in_test:
+        queue_print_job()
+    else:
+        frappe.db.after_commit.add(queue_print_job)
+
+    return job
+
+
+def get_printer_settings(printer_setting):
+    printer = frappe.db.get_value(
+        "Network Printer Settings",
+        printer_setting,
+        ["printer_name", "server_ip", "port"],
+        as_dict=True,
+    )
+    if not printer:
+        frappe.throw(_("Network Printer Settings {0} not found").format(printer_setting))
+
+    return printer
+
+
+def drain_printer_queue(printer_setting):
+    """print the queued jobs of a printer, one worker per printer at a time"""
+    cache = frappe.cache()
+
+    while cache.llen(queue_key(printer_setting)):
+        lock = cache.lock(
+            cache.make_key("{0}:{1}".format(PRINT_LOCK_CACHE_KEY, printer_setting)),
+            timeout=PRINT_LOCK_TIMEOUT,
+        )
+        if not lock.acquire(blocking=False):
+            # the worker holding the lock checks the queue again once it is done
+            return
+
+        try:
+            while True:
+                job = cache.lpop(queue_key(printer_setting))
+                if not job:
+                    break
+                process_print_job(frappe.safe_decode(job))
+        finally:
+            lock.release()
+
+
+def process_print_job(job):
+    job = get_print_job(job)
+    if not job or job.status != "Queued":
+        return
+
+    update_print_job(job, status="Printing")
+    file_path = None
+    user = frappe.session.user
+    try:
+        # render with the permissions of whoever asked for the print
+        frappe.set_user(job.owner)
+        file_path = render_escpos(job) if job.renderer == RECEIPT_RENDERER_ESCPOS else render_pdf(job)
+        print_file(job, file_path)
+        update_print_job(job, status="Printed")
+
+    except Exception as e:
+        frappe.log_error(title="URY print job {0} failed".format(job.name))
+        update_print_job(job, status="Failed", error=str(e))
+
+    finally:
+        frappe.set_user(user)
+        if file_path:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    if job.status == "Printed" and job.on_printed:
+        try:
+            frappe.get_attr(job.on_printed)(job.doctype, job.docname)
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(title="URY print job {0} follow up failed".format(job.name))
+
+    frappe.publish_realtime("ury_print_job", get_job_status(job), user=job.owner)
+
+
+def render_pdf(job):
+    output = frappe.get_print(
+        job.doctype,
+        job.docname,
+        job.print_format,
+        no_letterhead=job.no_letterhead,
+        as_pdf=True,
+        output=PdfWriter(),
+    )
+
+    fd, file_path = tempfile.mkstemp(prefix="ury-print-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        output.write(f)
+
+    return file_path
+
+
+def render_escpos(job):
+    fd, file_path = tempfile.mkstemp(prefix="ury-print-", suffix=".bin")
+    with os.fdopen(fd, "wb") as f:
+        f.write(render_receipt(job.doctype, job.docname))
+
+    return file_path
+
+
+def print_file(job, file_path):
+    # ESC/POS bytes must reach the printer untouched by CUPS filters
+    options = {"raw": "true"} if job.renderer == RECEIPT_RENDERER_ESCPOS else {}
+    try:
+        get_cups_connection(job.server, job.port).printFile(
+            job.printer_name, file_path, job.docname, options
+        )
+    except Exception:
+        # the server may have closed a pooled connection, retry once on a new one
+        drop_cups_connection(job.server, job.port)
+        get_cups_connection(job.server, job.port).printFile(
+            job.printer_name, file_path, job.docname, options
+        )
+
+
+def get_cups_connection(server, port):
+    key = (server, cint(port))
+    if key not in _connections:
+        _connections[key] = new_cups_connection(server, cint(port))
+
+    return _connections[key]
+
+
+def drop_cups_connection(server, port):
+    _connections.pop((server, cint(port)), None)
+
+
+def new_cups_connection(server, port):
+    import cups
+
+    return cups.Connection(host=server, port=port)
+
+
+def get_print_job(job):
+    job = frappe.cache().get_value(job_key(job))
+    return frappe._dict(job) if job else None
+
+
+def set_print_job(job):
+    frappe.cache().set_value(job_key(job.name), dict(job), expires_in_sec=PRINT_JOB_TTL)
+
+
+def update_print_job(job, **changes):
+    job.update(changes, modified=now())
+    set_print_job(job)
+
+
+@frappe.whitelist()
+def get_print_job_status(job=None, doctype=None, name=None):
+    """returns the status of a print job, or of the latest job of a document"""
+    if not job:
+        job = frappe.cache().get_value(last_job_key(doctype, name))
+
+    job = get_print_job(job) if job else None
+    if not job:
+        return None
+
+    frappe.has_permission(job.doctype, "read", job.docname, throw=True)
+
+    return get_job_status(job)
+
+
+def get_job_status(job):
+    return {
+        "job": job.name,
+        "doctype": job.doctype,
+        "name": job.docname,
+        "printer": job.printer_setting,
+        "status": job.status,
+        "error": job.error,
+        "creation": job.creation,
+        "modified": job.modified,
+    }
+
+
+def job_key(job):
+    return "{0}:{1}".format(PRINT_JOB_CACHE_KEY, job)
+
+
+def last_job_key(doctype, name):
+    return "{0}:{1}:{2}".format(PRINT_JOB_CACHE_KEY, doctype, name)
+
+
+def queue_key(printer_setting):
+    return "{0}:{1}".format(PRINT_QUEUE_CACHE_KEY, printer_setting)
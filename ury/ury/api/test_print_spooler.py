@@ -0,0 +1,116 @@
+import importlib.machinery
+import os
+import sys
+import types
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ury.ury.api import print_spooler
+
+
+class FakeCupsConnection:
+	"""stands in for a CUPS server, keeps what it was asked to print"""
+
+	instances = []
+
+	def __init__(self, host=None, port=None):
+		self.host = host
+		self.port = port
+		self.jobs = []
+		FakeCupsConnection.instances.append(self)
+
+	def printFile(self, printer, filename, title, options):
+		with open(filename, "rb") as f:
+			self.jobs.append({"printer": printer, "title": title, "data": f.read()})
+		return len(self.jobs)
+
+
+def make_fake_cups():
+	cups = types.ModuleType("cups")
+	cups.__spec__ = importlib.machinery.ModuleSpec("cups", None)
+	cups.Connection = FakeCupsConnection
+	return cups
+
+
+printed_documents = []
+
+
+def record_printed(doctype, name):
+	printed_documents.append((doctype, name))
+
+
+def fake_get_print(*args, **kwargs):
+	output = kwargs["output"]
+	output.add_blank_page(width=72, height=72)
+	return output
+
+
+class TestPrintSpooler(FrappeTestCase):
+	def setUp(self):
+		FakeCupsConnection.instances = []
+		print_spooler._connections.clear()
+
+		printer = frappe._dict(printer_name="Bill", server_ip="127.0.0.1", port=631)
+		self.patches = [
+			patch.dict(sys.modules, {"cups": make_fake_cups()}),
+			patch.object(print_spooler, "get_printer_settings", return_value=printer),
+			patch.object(print_spooler, "is_escpos_receipt", return_value=False),
+			patch.object(print_spooler.frappe, "get_print", side_effect=fake_get_print),
+			patch.object(print_spooler.frappe, "publish_realtime"),
+		]
+		for p in self.patches:
+			p.start()
+
+		self.spool_files = []
+		mkstemp = print_spooler.tempfile.mkstemp
+
+		def tracked_mkstemp(*args, **kwargs):
+			fd, path = mkstemp(*args, **kwargs)
+			self.spool_files.append(path)
+			return fd, path
+
+		self.patches.append(patch.object(print_spooler.tempfile, "mkstemp", side_effect=tracked_mkstemp))
+		self.patches[-1].start()
+
+	def tearDown(self):
+		for p in reversed(self.patches):
+			p.stop()
+
+	def test_jobs_share_one_connection_and_clean_up(self):
+		first = print_spooler.spool_print_job("POS Invoice", "_Test Invoice 1", "_Test Printer")
+		second = print_spooler.spool_print_job("POS Invoice", "_Test Invoice 2", "_Test Printer")
+
+		self.assertEqual(len(FakeCupsConnection.instances), 1)
+		connection = FakeCupsConnection.instances[0]
+		self.assertEqual([job["title"] for job in connection.jobs], ["_Test Invoice 1", "_Test Invoice 2"])
+		self.assertTrue(all(job["data"].startswith(b"%PDF") for job in connection.jobs))
+
+		for job in (first, second):
+			self.assertEqual(print_spooler.get_print_job(job.name).status, "Printed")
+
+		self.assertEqual(len(self.spool_files), 2)
+		self.assertFalse(any(os.path.exists(path) for path in self.spool_files))
+
+	def test_failed_job_reports_status(self):
+		with patch.object(FakeCupsConnection, "printFile", side_effect=RuntimeError("printer offline")):
+			job = print_spooler.spool_print_job("POS Invoice", "_Test Invoice 3", "_Test Printer")
+
+		job = print_spooler.get_print_job(job.name)
+		self.assertEqual(job.status, "Failed")
+		self.assertIn("printer offline", job.error)
+		self.assertFalse(any(os.path.exists(path) for path in self.spool_files))
+		# the broken connection is retried once on a fresh one
+		self.assertEqual(len(FakeCupsConnection.instances), 2)
+
+	def test_follow_up_runs_only_after_a_print(self):
+		printed_documents.clear()
+		on_printed = "ury.ury.api.test_print_spooler.record_printed"
+
+		with patch.object(print_spooler.frappe.db, "commit"):
+			print_spooler.spool_print_job("POS Invoice", "_Test Invoice 4", "_Test Printer", on_printed=on_printed)
+			with patch.object(FakeCupsConnection, "printFile", side_effect=RuntimeError("printer offline")):
+				print_spooler.spool_print_job("POS Invoice", "_Test Invoice 5", "_Test Printer", on_printed=on_printed)
+
+		self.assertEqual(printed_documents, [("POS Invoice", "_Test Invoice 4")])
@@ -1,16 +1,15 @@
 import frappe
 from frappe import _
 
-import os
-
-from pypdf import PdfWriter
-
 no_cache = 1
 
 base_template_path = "www/printview.html"
 standard_format = "templates/print_formats/standard.html"
 
 from frappe.www.printview import validate_print_permission
+from ury.ury.api.print_spooler import spool_print_job
+from ury.ury.doctype.ury_print_job.ury_print_job import create_print_job
+from ury.ury.doctype.ury_table.ury_table import publish_table_update, release_table
 
 
 @frappe.whitelist()
@@ -23,63 +22,34 @@ def network_printing(
     no_letterhead=0,
     file_path=None,
 ):
+    # `doc` and `file_path` are kept for old callers, the spooler renders the saved
+    # document into its own spool file
+    # the invoice only counts as printed once the printer has taken it, the page
+    # follows the job through the `ury_print_job` realtime event
     try:
-        print_settings = frappe.get_doc("Network Printer Settings", printer_setting)
-
-        try:
-            import cups
-        except ImportError:
-            return "Failed to import cups"
-
-        try:
-            cups.setServer(print_settings.server_ip)
-            cups.setPort(print_settings.port)
-            conn = cups.Connection()
-        except Exception as e:
-            return f"Failed to connect to the printer: {str(e)}"
-
-        try:
-            output = PdfWriter()
-            output = frappe.get_print(
-                doctype,
-                name,
-                print_format,
-                doc=doc,
-                no_letterhead=no_letterhead,
-                as_pdf=True,
-                output=output,
-            )
-            if not file_path:
-                file_path = os.path.join(
-                    "/", "tmp", f"frappe-pdf-{frappe.generate_hash()}.pdf"
-                )
-            output.write(open(file_path, "wb"))
-            conn.printFile(print_settings.printer_name, file_path, name, {})
-
-            restaurant_table, invoice_printed, name = frappe.db.get_value(
-                "POS Invoice", name, ["restaurant_table", "invoice_printed", "name"]
-            )
-
-            if restaurant_table and invoice_printed == 0:
-                frappe.db.set_value("POS Invoice", name, "invoice_printed", 1)
-                frappe.db.set_value(
-                    "URY Table",
-                    restaurant_table,
-                    {"occupied": 0, "latest_invoice_time": None},
-                )
-            else:
-                frappe.db.set_value("POS Invoice", name, "invoice_printed", 1)
-
-            return "Success"
-        except Exception as e:
-            return f"Failed to print: {str(e)}"
+        spool_print_job(
+            doctype,
+            name,
+            printer_setting,
+            print_format,
+            no_letterhead,
+            on_printed="ury.ury.api.ury_print.mark_invoice_printed",
+        )
+        return "Success"
     except Exception as e:
-        import traceback
-
-        traceback.print_exc()  # Print the full traceback for debugging
+        frappe.log_error(title="Error in Network Printing")
         return f"An error occurred: {str(e)}"
 
 
+def mark_invoice_printed(doctype, name):
+    """set the invoice printed and free its table, called by the spooler after the print"""
+    restaurant_table = frappe.db.get_value("POS Invoice", name, "restaurant_table")
+    frappe.db.set_value("POS Invoice", name, "invoice_printed", 1)
+    if restaurant_table:
+        release_table(restaurant_table, name)
+        publish_table_update(restaurant_table)
+
+
 @frappe.whitelist()
 def select_network_printer(pos_profile, invoice_id):
     table = frappe.db.get_value("POS Invoice", invoice_id, "restaurant_table")
@@ -127,34 +97,22 @@ def qz_print_update(invoice):
             order_type = frappe.db.get_value("POS Invoice", invoice, "order_type")
             require_a_table = frappe.db.get_value("URY Order Type", order_type, "require_a_table")
             if require_a_table:
-                frappe.db.set_value(
-                    "URY Table", table, {"occupied": 0, "latest_invoice_time": None}
-                )
+                release_table(table, invoice)
 
+            publish_table_update(table)
 
-@frappe.whitelist()
-def print_pos_page(doctype, name, print_format):
-    data = {"name": name, "doctype": doctype, "print_format": print_format}
-
-    restaurant_table, branch, name, order_type = frappe.db.get_value(
-        "POS Invoice", name, ["restaurant_table", "branch", "name", "order_type"]
-    )
-    print_channel = "{}_{}".format("print", branch)
-    frappe.publish_realtime(print_channel, {"data": data})
 
-    invoice_printed = frappe.db.get_value("POS Invoice", name, "invoice_printed")
+@frappe.whitelist()
+def print_pos_page(doctype, name, print_format, station=None):
+    branch = frappe.db.get_value("POS Invoice", name, "branch")
 
-    if invoice_printed == 0:
-        frappe.db.set_value("POS Invoice", name, "invoice_printed", 1)
+    # stations acknowledge the job, repeated clicks get the queued job back, the
+    # invoice is marked printed and its table freed once a station acknowledges it
+    job, created = create_print_job(doctype, name, print_format, branch, station)
+    if not created:
+        return {"job": job.name if job else None, "status": "Duplicate"}
 
-        if restaurant_table:
-            require_a_table = frappe.db.get_value("URY Order Type", order_type, "require_a_table")
-            if require_a_table:
-                frappe.db.set_value(
-                    "URY Table",
-                    restaurant_table,
-                    {"occupied": 0, "latest_invoice_time": None},
-                )
+    return {"job": job.name, "status": "Queued"}
 
 
 @frappe.whitelist()
@@ -1,9 +1,11 @@
 # Copyright (c) 2024, Tridz Technologies Pvt. Ltd and contributors
 # For license information, please see license.txt
 
-# import frappe
 from frappe.model.document import Document
 
+from ury.ury_pos.api import clear_terminal_bootstrap
+
 
 class RestaurantSystemSettings(Document):
-	pass
+	def on_update(self):
+		clear_terminal_bootstrap()
@@ -0,0 +1,77 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import nowdate, nowtime
+
+from ury.ury.doctype.ury_customer_favourite_item.ury_customer_favourite_item import (
+	backfill,
+	get_customer_favourites,
+	update_customer_favourites,
+)
+
+test_dependencies = ["Customer", "Item"]
+
+CUSTOMER = "_Test Customer"
+
+
+def make_invoice(quantities, docstatus=1):
+	"""an invoice of `{item_code: qty}` for the test customer, only the columns favourites read"""
+	invoice = frappe.get_doc(
+		{
+			"doctype": "POS Invoice",
+			"name": "_T-URY-FAV-{0}".format(frappe.generate_hash(length=6)),
+			"customer": CUSTOMER,
+			"docstatus": docstatus,
+			"posting_date": nowdate(),
+			"posting_time": nowtime(),
+			"items": [
+				{"item_code": item_code, "item_name": item_code, "qty": qty, "docstatus": docstatus}
+				for item_code, qty in quantities.items()
+			],
+		}
+	)
+	# the favourites only read the tables, skip the POS Invoice controller
+	invoice.db_insert()
+	for item in invoice.items:
+		item.db_insert()
+	return invoice
+
+
+class TestURYCustomerFavouriteItem(FrappeTestCase):
+	def setUp(self):
+		frappe.set_user("Administrator")
+		self.addCleanup(frappe.db.rollback)
+		frappe.db.delete("URY Customer Favourite Item", {"customer": CUSTOMER})
+
+	def get_favourites(self):
+		return {row.item_name: row.qty for row in get_customer_favourites(CUSTOMER)}
+
+	def test_submitted_invoices_add_up(self):
+		update_customer_favourites(make_invoice({"_Test Item": 2, "_Test Item 2": 1}))
+		update_customer_favourites(make_invoice({"_Test Item": 3}))
+
+		self.assertEqual(self.get_favourites(), {"_Test Item": 5, "_Test Item 2": 1})
+
+	def test_cancel_takes_quantities_back(self):
+		update_customer_favourites(make_invoice({"_Test Item": 2}))
+		invoice = make_invoice({"_Test Item": 1, "_Test Item 2": 4})
+		update_customer_favourites(invoice)
+
+		update_customer_favourites(invoice, cancel=True)
+
+		# the second item is only on the cancelled invoice, its row is removed
+		self.assertEqual(self.get_favourites(), {"_Test Item": 2})
+
+	def test_backfill_skips_drafts(self):
+		make_invoice({"_Test Item": 2})
+		make_invoice({"_Test Item": 1, "_Test Item 2": 4}, docstatus=0)
+
+		# backfill commits each batch, keep the test data inside the test transaction
+		with patch.object(frappe.db, "commit"):
+			backfill()
+
+		self.assertEqual(self.get_favourites(), {"_Test Item": 2})
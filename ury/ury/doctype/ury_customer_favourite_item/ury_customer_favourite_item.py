@@ -0,0 +1,135 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+# For license information, please see license.txt
+
+import hashlib
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint, now
+
+
+class URYCustomerFavouriteItem(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("URY Customer Favourite Item", ["customer", "qty"])
+	# the upsert adds up on this key, whatever the row is named
+	frappe.db.add_unique(
+		"URY Customer Favourite Item", ["customer", "item_code"], constraint_name="customer_item_code"
+	)
+
+
+def get_favourite_name(customer, item_code):
+	"""one row per customer and item, named the same way as the SQL backfill"""
+	return hashlib.sha1("{}::{}".format(customer, item_code).encode("utf-8")).hexdigest()
+
+
+def update_customer_favourites(invoice, cancel=False):
+	"""add the invoice quantities to the customer's favourites, or take them back on cancel"""
+	if not invoice.customer or not invoice.items:
+		return
+
+	items = {}
+	for item in invoice.items:
+		row = items.setdefault(item.item_code, {"item_name": item.item_name, "qty": 0})
+		row["qty"] += -item.qty if cancel else item.qty
+
+	timestamp = now()
+	user = frappe.session.user
+	values = []
+	for item_code, row in items.items():
+		values.extend([
+			get_favourite_name(invoice.customer, item_code),
+			invoice.customer,
+			item_code,
+			row["item_name"],
+			row["qty"],
+			timestamp,
+			timestamp,
+			timestamp,
+			user,
+			user,
+		])
+
+	frappe.db.sql(
+		"""
+		INSERT INTO `tabURY Customer Favourite Item`
+			(name, customer, item_code, item_name, qty, last_ordered,
+			creation, modified, owner, modified_by)
+		VALUES {rows}
+		ON DUPLICATE KEY UPDATE
+			qty = qty + VALUES(qty),
+			item_name = VALUES(item_name),
+			last_ordered = IF(VALUES(qty) > 0, VALUES(last_ordered), last_ordered),
+			modified = VALUES(modified),
+			modified_by = VALUES(modified_by)
+		""".format(rows=", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(items))),
+		values,
+	)
+
+	if cancel:
+		frappe.db.sql(
+			"DELETE FROM `tabURY Customer Favourite Item` WHERE customer = %s AND qty <= 0",
+			invoice.customer,
+		)
+
+
+def get_customer_favourites(customer, limit=None, min_qty=0):
+	"""returns the customer's most ordered items, highest quantity first"""
+	limit = cint(limit)
+	return frappe.db.sql(
+		"""
+		SELECT item_name, qty
+		FROM `tabURY Customer Favourite Item`
+		WHERE customer = %(customer)s AND qty > %(min_qty)s
+		ORDER BY qty DESC
+		{limit}
+		""".format(limit="LIMIT %(limit)s" if limit else ""),
+		{"customer": customer, "min_qty": min_qty, "limit": limit},
+		as_dict=True,
+	)
+
+
+def backfill(batch_size=500):
+	"""Rebuild favourites from every submitted POS Invoice, a batch of customers at a time.
+
+	bench --site <site> execute ury.ury.doctype.ury_customer_favourite_item.ury_customer_favourite_item.backfill
+	"""
+	customers = frappe.db.sql_list(
+		"SELECT DISTINCT customer FROM `tabPOS Invoice` WHERE docstatus = 1 ORDER BY customer"
+	)
+
+	for start in range(0, len(customers), batch_size):
+		batch = customers[start : start + batch_size]
+		values = {"customers": batch, "timestamp": now(), "user": frappe.session.user}
+
+		frappe.db.sql(
+			"DELETE FROM `tabURY Customer Favourite Item` WHERE customer IN %(customers)s",
+			values,
+		)
+		frappe.db.sql(
+			"""
+			INSERT INTO `tabURY Customer Favourite Item`
+				(name, customer, item_code, item_name, qty, last_ordered,
+				creation, modified, owner, modified_by)
+			SELECT
+				SHA1(CONCAT(inv.customer, '::', item.item_code)),
+				inv.customer, item.item_code, MAX(item.item_name), SUM(item.qty),
+				MAX(TIMESTAMP(inv.posting_date, inv.posting_time)),
+				%(timestamp)s, %(timestamp)s, %(user)s, %(user)s
+			FROM `tabPOS Invoice Item` AS item
+			INNER JOIN `tabPOS Invoice` AS inv ON inv.name = item.parent
+			WHERE inv.docstatus = 1 AND inv.customer IN %(customers)s
+			GROUP BY inv.customer, item.item_code
+			HAVING SUM(item.qty) > 0
+			""",
+			values,
+		)
+		frappe.db.commit()
+
+		frappe.logger("ury").info(
+			"Favourites rebuilt for {0} of {1} customers".format(
+				min(start + batch_size, len(customers)), len(customers)
+			)
+		)
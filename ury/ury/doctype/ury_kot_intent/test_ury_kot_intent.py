@@ -0,0 +1,97 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from ury.integrations import clear_integrations
+
+from ury.ury.doctype.ury_kot_intent.ury_kot_intent import (
+	STUB_KOT_CALLS_CACHE_KEY,
+	process_kot_intent,
+)
+
+
+def failing_kot_backend(invoice, customer, table, items, past_item, comments):
+	frappe.throw("Kitchen unavailable")
+
+
+class TestURYKOTIntent(FrappeTestCase):
+	def setUp(self):
+		# processing commits and rolls back between steps, keep every intent inside the
+		# test transaction and drop it once the patches are gone
+		self.addCleanup(frappe.db.rollback)
+		for method in ("commit", "rollback"):
+			patcher = patch.object(frappe.db, method)
+			patcher.start()
+			self.addCleanup(patcher.stop)
+
+		self.use_kot_backend("ury.ury.doctype.ury_kot_intent.ury_kot_intent.stub_kot_backend")
+		frappe.cache().delete_value(STUB_KOT_CALLS_CACHE_KEY)
+
+	def tearDown(self):
+		frappe.local.conf.pop("ury_integrations", None)
+		clear_integrations()
+
+	def use_kot_backend(self, path):
+		frappe.local.conf.ury_integrations = {"kot_execute": path}
+		clear_integrations()
+
+	def make_intent(self, qty=1):
+		intent = frappe.get_doc(
+			{
+				"doctype": "URY KOT Intent",
+				"invoice": "_Test KOT Invoice",
+				"customer": "_Test Customer",
+				"items": frappe.as_json([{"item": "_Test Item", "qty": qty}]),
+				"past_items": "[]",
+			}
+		)
+		intent.flags.ignore_links = True
+		return intent.insert(ignore_permissions=True)
+
+	def test_intent_is_executed_once(self):
+		intent = self.make_intent()
+
+		process_kot_intent(intent.name)
+		process_kot_intent(intent.name)
+
+		self.assertEqual(frappe.db.get_value("URY KOT Intent", intent.name, "status"), "Done")
+		self.assertEqual(len(frappe.cache().lrange(STUB_KOT_CALLS_CACHE_KEY, 0, -1)), 1)
+
+	def test_failed_intent_is_retried(self):
+		self.use_kot_backend("ury.ury.doctype.ury_kot_intent.test_ury_kot_intent.failing_kot_backend")
+		intent = self.make_intent()
+
+		process_kot_intent(intent.name)
+
+		intent.reload()
+		self.assertEqual(intent.status, "Pending")
+		self.assertEqual(intent.attempts, 1)
+		self.assertTrue(intent.error)
+
+	def test_intents_of_an_invoice_run_in_order(self):
+		first = self.make_intent(qty=1)
+		second = self.make_intent(qty=2)
+
+		# the job of the later intent still creates the earlier KOT first
+		process_kot_intent(second.name)
+
+		calls = [frappe.parse_json(call) for call in frappe.cache().lrange(STUB_KOT_CALLS_CACHE_KEY, 0, -1)]
+		self.assertEqual([call["items"][0]["qty"] for call in calls], [1, 2])
+		self.assertEqual(frappe.db.get_value("URY KOT Intent", first.name, "status"), "Done")
+		self.assertEqual(frappe.db.get_value("URY KOT Intent", second.name, "status"), "Done")
+
+	def test_intent_waits_behind_a_retrying_one(self):
+		self.use_kot_backend("ury.ury.doctype.ury_kot_intent.test_ury_kot_intent.failing_kot_backend")
+		first = self.make_intent()
+		process_kot_intent(first.name)
+
+		self.use_kot_backend("ury.ury.doctype.ury_kot_intent.ury_kot_intent.stub_kot_backend")
+		second = self.make_intent()
+		process_kot_intent(second.name)
+
+		self.assertEqual(frappe.db.get_value("URY KOT Intent", second.name, "status"), "Pending")
+		self.assertFalse(frappe.cache().lrange(STUB_KOT_CALLS_CACHE_KEY, 0, -1))
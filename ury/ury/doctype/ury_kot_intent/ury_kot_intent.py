@@ -0,0 +1,188 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+# For license information, please see license.txt
+
+import json
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, now_datetime
+
+from ury.integrations import get_integration
+
+
+MAX_KOT_ATTEMPTS = 5
+# a worker that dies mid job leaves its intent in Processing, hand it out again after this
+STALE_PROCESSING_MINUTES = 10
+STUB_KOT_CALLS_CACHE_KEY = "ury_stub_kot_calls"
+
+
+class URYKOTIntent(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("URY KOT Intent", ["status", "next_attempt_at"])
+
+
+def record_kot_intent(invoice, items, past_item, comments):
+	"""record the KOT of an order in the order's transaction, a background job creates
+	it once the order is committed"""
+	if not get_kot_backend():
+		return
+
+	intent = frappe.get_doc(
+		{
+			"doctype": "URY KOT Intent",
+			"invoice": invoice.name,
+			"customer": invoice.customer,
+			"restaurant_table": invoice.restaurant_table,
+			"items": frappe.as_json(items),
+			"past_items": frappe.as_json(past_item),
+			"comments": comments,
+		}
+	).insert(ignore_permissions=True)
+
+	enqueue_kot_intent(intent.name)
+	return intent.name
+
+
+def enqueue_kot_intent(intent):
+	frappe.enqueue(
+		"ury.ury.doctype.ury_kot_intent.ury_kot_intent.process_kot_intent",
+		queue="short",
+		intent=intent,
+		enqueue_after_commit=True,
+		now=frappe.flags.in_test,
+	)
+
+
+def process_kot_intent(intent):
+	"""create the KOTs of the intent's invoice in the order they were recorded, each at
+	most once however often the job runs"""
+	invoice = frappe.db.get_value("URY KOT Intent", intent, "invoice")
+	while invoice and process_next_kot_intent(invoice):
+		pass
+
+
+def process_next_kot_intent(invoice):
+	"""create the KOT of the oldest open intent of an invoice, returns True when the
+	next one can follow"""
+	# the kitchen must see an order's KOTs in sequence, so only the oldest open intent
+	# of the invoice may run; its row lock keeps other jobs for the invoice out
+	intent = frappe.db.sql(
+		"""
+		SELECT name, status, next_attempt_at
+		FROM `tabURY KOT Intent`
+		WHERE invoice = %s AND status IN ('Pending', 'Processing')
+		ORDER BY creation, name
+		LIMIT 1
+		FOR UPDATE
+		""",
+		invoice,
+		as_dict=True,
+	)
+	if not intent:
+		return False
+
+	intent = intent[0]
+	if intent.status != "Pending" or (intent.next_attempt_at and intent.next_attempt_at > now_datetime()):
+		# claimed by another job, or waiting for its retry; later intents wait behind it
+		return False
+
+	frappe.db.set_value("URY KOT Intent", intent.name, "status", "Processing")
+	frappe.db.commit()
+
+	intent = frappe.get_doc("URY KOT Intent", intent.name)
+	try:
+		kot_backend = get_kot_backend()
+		if kot_backend:
+			# the backend must not commit, the KOT and the Done status commit together
+			# and a failure rolls both back
+			kot_backend(
+				intent.invoice,
+				intent.customer,
+				intent.restaurant_table,
+				json.loads(intent.items or "[]"),
+				json.loads(intent.past_items or "[]"),
+				intent.comments,
+			)
+
+		intent.db_set({"status": "Done", "error": None})
+		frappe.db.commit()
+		return True
+
+	except Exception:
+		frappe.db.rollback()
+
+		attempts = intent.attempts + 1
+		failed = attempts >= MAX_KOT_ATTEMPTS
+		intent.db_set(
+			{
+				"status": "Failed" if failed else "Pending",
+				"attempts": attempts,
+				"next_attempt_at": add_to_date(now_datetime(), minutes=2**attempts),
+				"error": frappe.get_traceback(),
+			}
+		)
+		frappe.db.commit()
+		# an intent that gave up no longer holds back the ones after it
+		return failed
+
+
+def retry_kot_intents():
+	"""requeue pending intents that are due and those a dead worker left processing"""
+	frappe.db.sql(
+		"""
+		UPDATE `tabURY KOT Intent`
+		SET status = 'Pending'
+		WHERE status = 'Processing' AND modified < %s
+		""",
+		add_to_date(now_datetime(), minutes=-STALE_PROCESSING_MINUTES),
+	)
+
+	# intents without a retry time were never picked up, give their first job a minute
+	for intent in frappe.db.sql_list(
+		"""
+		SELECT name
+		FROM `tabURY KOT Intent`
+		WHERE status = 'Pending'
+			AND IFNULL(next_attempt_at, creation + INTERVAL 1 MINUTE) <= %s
+		ORDER BY creation
+		""",
+		now_datetime(),
+	):
+		enqueue_kot_intent(intent)
+
+
+@frappe.whitelist()
+def retry_kot_intent(intent):
+	"""put a failed intent back in the queue"""
+	frappe.only_for(["System Manager", "URY Manager"])
+	frappe.db.set_value(
+		"URY KOT Intent", intent, {"status": "Pending", "attempts": 0, "next_attempt_at": None}
+	)
+	enqueue_kot_intent(intent)
+
+
+def get_kot_backend():
+	"""returns the function that creates KOTs, see the `kot_execute` integration; it runs
+	inside the intent's transaction and must not commit"""
+	return get_integration("kot_execute")
+
+
+def stub_kot_backend(invoice, customer, table, items, past_item, comments):
+	"""stands in for ury_mosaic in tests and benchmarks, records the call instead of
+	creating a KOT"""
+	frappe.cache().rpush(
+		STUB_KOT_CALLS_CACHE_KEY,
+		frappe.as_json(
+			{
+				"invoice": invoice,
+				"customer": customer,
+				"table": table,
+				"items": items,
+				"past_item": past_item,
+				"comments": comments,
+			}
+		),
+	)
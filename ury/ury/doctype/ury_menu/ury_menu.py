@@ -1,52 +1,80 @@
 # Copyright (c) 2023, Tridz Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 
+import hashlib
+import time
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.utils import flt, now, nowdate
+
+
+MENU_SNAPSHOT_CACHE_KEY = "ury_menu_snapshot"
+PRICE_LIST_RATES_CACHE_KEY = "ury_price_list_rates"
+# syncs that change more Item Prices than this run in the background
+PRICE_SYNC_BACKGROUND_CHANGES = 200
 
 
 class URYMenu(Document):
     def validate(self):
-        for d in self.items:
-            if not d.rate:
-                d.rate = frappe.db.get_value("Item", d.item, "standard_rate")
+        missing = [d.item for d in self.items if not d.rate and d.item]
+        if missing:
+            standard_rates = dict(
+                frappe.db.sql(
+                    "SELECT name, standard_rate FROM `tabItem` WHERE name IN %s",
+                    [tuple(set(missing))],
+                )
+            )
+            for d in self.items:
+                if not d.rate:
+                    d.rate = standard_rates.get(d.item)
 
     def on_update(self):
         """Sync Price List"""
         self.make_price_list()
+        clear_menu_snapshot_after_commit(self.name)
 
     def on_trash(self):
         """clear prices"""
         self.clear_item_price()
+        clear_menu_snapshot_after_commit(self.name)
 
     def clear_item_price(self, price_list=None):
         """clear all item prices for this menu"""
         if not price_list:
             price_list = self.get_price_list().name
         frappe.db.sql("delete from `tabItem Price` where price_list = %s", price_list)
+        clear_price_list_rates_after_commit(price_list)
 
     def make_price_list(self):
         # create price list for menu
         price_list = self.get_price_list()
         self.db_set("price_list", price_list.name)
 
-        # delete old items
-        self.clear_item_price(price_list.name)
-
-        for d in self.items:
-            frappe.get_doc(
-                dict(
-                    doctype="Item Price",
-                    price_list=price_list.name,
-                    item_code=d.item,
-                    price_list_rate=d.rate,
-                )
-            ).insert()
+        changes = get_item_price_changes(self.name, price_list.name)
+        if changes.count > PRICE_SYNC_BACKGROUND_CHANGES:
+            frappe.enqueue(
+                "ury.ury.doctype.ury_menu.ury_menu.sync_item_prices",
+                queue="long",
+                menu=self.name,
+                price_list=price_list.name,
+                enqueue_after_commit=True,
+            )
+            frappe.msgprint(
+                _("Item Prices of {0} are being updated in the background").format(self.name),
+                alert=True,
+            )
+        else:
+            sync_item_prices(self.name, price_list.name, changes)
 
     def get_price_list(self):
         """Create price list for menu if missing"""
-        price_list_name = frappe.db.get_value(
-            "Price List", dict(restaurant_menu=self.name)
+        # prefer the list already linked, aggregator lists share the restaurant_menu
+        price_list_name = (
+            self.price_list and frappe.db.exists("Price List", self.price_list)
+        ) or frappe.db.get_value(
+            "Price List", dict(restaurant_menu=self.name, price_list_name=self.name)
         )
         if price_list_name:
             price_list = frappe.get_doc("Price List", price_list_name)
@@ -60,3 +88,221 @@ class URYMenu(Document):
         price_list.save()
 
         return price_list
+
+
+def sync_item_prices(menu, price_list, changes=None):
+    """bring the Item Prices of a price list in line with the menu rows, touching only
+    the prices that were added, changed or removed"""
+    start = time.monotonic()
+
+    if changes is None:
+        changes = get_item_price_changes(menu, price_list)
+    rates, to_insert, to_update, to_delete = (
+        changes.rates, changes.to_insert, changes.to_update, changes.to_delete
+    )
+
+    if to_insert:
+        insert_item_prices(price_list, {item: rates[item] for item in to_insert})
+
+    if to_update:
+        # one CASE update per chunk instead of a save per price
+        timestamp = now()
+        names = list(to_update)
+        for i in range(0, len(names), 500):
+            chunk = names[i : i + 500]
+            frappe.db.sql(
+                """
+                UPDATE `tabItem Price`
+                SET price_list_rate = CASE name {cases} END,
+                    modified = %s, modified_by = %s
+                WHERE name IN %s
+                """.format(cases=" ".join(["WHEN %s THEN %s"] * len(chunk))),
+                [value for name in chunk for value in (name, to_update[name])]
+                + [timestamp, frappe.session.user, tuple(chunk)],
+            )
+
+    if to_delete:
+        frappe.db.sql("DELETE FROM `tabItem Price` WHERE name IN %s", [tuple(to_delete)])
+
+    clear_price_list_rates_after_commit(price_list)
+
+    stats = {
+        "menu": menu,
+        "price_list": price_list,
+        "inserted": len(to_insert),
+        "updated": len(to_update),
+        "deleted": len(to_delete),
+        "seconds": round(time.monotonic() - start, 3),
+    }
+    frappe.logger("ury").info("Item Price sync {0}".format(frappe.as_json(stats, indent=None)))
+    return stats
+
+
+def get_item_price_changes(menu, price_list):
+    """the Item Prices a sync would insert, update and delete"""
+    rates = {}
+    for item, rate in frappe.db.sql(
+        """
+        SELECT item, rate
+        FROM `tabURY Menu Item`
+        WHERE parent = %s AND parenttype = 'URY Menu'
+        ORDER BY idx
+        """,
+        menu,
+    ):
+        rates[item] = flt(rate)
+
+    existing = {}
+    duplicates = []
+    for name, item_code, rate in frappe.db.sql(
+        """
+        SELECT name, item_code, price_list_rate
+        FROM `tabItem Price`
+        WHERE price_list = %s
+        ORDER BY modified desc
+        """,
+        price_list,
+    ):
+        if item_code in existing:
+            duplicates.append(name)
+        else:
+            existing[item_code] = (name, flt(rate))
+
+    to_insert = [item for item in rates if item not in existing]
+    to_update = {
+        name: rates[item]
+        for item, (name, rate) in existing.items()
+        if item in rates and rate != rates[item]
+    }
+    to_delete = duplicates + [name for item, (name, rate) in existing.items() if item not in rates]
+
+    return frappe._dict(
+        rates=rates,
+        to_insert=to_insert,
+        to_update=to_update,
+        to_delete=to_delete,
+        count=len(to_insert) + len(to_update) + len(to_delete),
+    )
+
+
+def insert_item_prices(price_list, rates):
+    currency = frappe.db.get_value("Price List", price_list, "currency")
+    items = {
+        item.name: item
+        for item in frappe.db.sql(
+            """
+            SELECT name, item_name, description, stock_uom, brand
+            FROM `tabItem`
+            WHERE name IN %s
+            """,
+            [tuple(rates)],
+            as_dict=True,
+        )
+    }
+
+    timestamp = now()
+    user = frappe.session.user
+    fields = [
+        "name", "creation", "modified", "owner", "modified_by", "docstatus",
+        "item_code", "item_name", "item_description", "uom", "brand",
+        "price_list", "selling", "buying", "currency", "price_list_rate", "valid_from",
+    ]
+    values = []
+    for item_code, rate in rates.items():
+        item = items.get(item_code)
+        if not item:
+            continue
+        values.append((
+            frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0,
+            item_code, item.item_name, item.description, item.stock_uom, item.brand,
+            price_list, 1, 0, currency, rate, nowdate(),
+        ))
+
+    frappe.db.bulk_insert("Item Price", fields, values)
+
+
+def get_menu_snapshot(menu):
+    """returns the compiled snapshot of a menu from the shared cache, building it if missing"""
+    return frappe.cache().hget(
+        MENU_SNAPSHOT_CACHE_KEY, menu, generator=lambda: build_menu_snapshot(menu)
+    )
+
+
+def build_menu_snapshot(menu):
+    """compile all menu rows with their item image in a single query"""
+    # `item_imgae` is the key the order page and URY POS already read
+    items = frappe.db.sql(
+        """
+        SELECT
+            mi.item, mi.item_name, mi.rate, mi.special_dish, mi.disabled,
+            i.image AS item_imgae, mi.course, mi.preparation_time,
+            mi.parallel_preparation
+        FROM `tabURY Menu Item` AS mi
+        LEFT JOIN `tabItem` AS i ON i.name = mi.item
+        WHERE mi.parent = %s AND mi.parenttype = 'URY Menu'
+        ORDER BY mi.item_name asc
+        """,
+        menu,
+        as_dict=True,
+    )
+
+    version = hashlib.md5(
+        frappe.as_json(items).encode("utf-8")
+    ).hexdigest()
+
+    return {"menu": menu, "version": version, "items": items}
+
+
+def clear_menu_snapshot(menu=None):
+    """drop the cached snapshot of a menu, or of every menu if none is given"""
+    if menu:
+        frappe.cache().hdel(MENU_SNAPSHOT_CACHE_KEY, menu)
+    else:
+        frappe.cache().delete_key(MENU_SNAPSHOT_CACHE_KEY)
+
+
+def clear_menu_snapshot_after_commit(menu):
+    """drop the snapshot once the menu change is committed, clearing earlier lets a
+    concurrent reader cache the old menu again"""
+    frappe.db.after_commit.add(lambda: clear_menu_snapshot(menu))
+
+
+def get_price_list_rates(price_list):
+    """returns {item_code: price_list_rate} for a price list from the shared cache"""
+    return frappe.cache().hget(
+        PRICE_LIST_RATES_CACHE_KEY,
+        price_list,
+        generator=lambda: build_price_list_rates(price_list),
+    )
+
+
+def build_price_list_rates(price_list):
+    rates = {}
+    for item_price in frappe.db.sql(
+        """
+        SELECT item_code, price_list_rate
+        FROM `tabItem Price`
+        WHERE price_list = %s
+        ORDER BY modified desc
+        """,
+        price_list,
+        as_dict=True,
+    ):
+        # keep the latest price when an item is listed more than once
+        rates.setdefault(item_price.item_code, item_price.price_list_rate)
+
+    return rates
+
+
+def clear_price_list_rates(price_list=None):
+    """drop the cached rates of a price list, or of every price list if none is given"""
+    if price_list:
+        frappe.cache().hdel(PRICE_LIST_RATES_CACHE_KEY, price_list)
+    else:
+        frappe.cache().delete_key(PRICE_LIST_RATES_CACHE_KEY)
+
+
+def clear_price_list_rates_after_commit(price_list):
+    """drop the cached rates once the price change is committed, clearing earlier lets
+    a concurrent reader cache the old rates again"""
+    frappe.db.after_commit.add(lambda: clear_price_list_rates(price_list))
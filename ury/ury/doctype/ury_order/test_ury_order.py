@@ -1,9 +1,140 @@
 # Copyright (c) 2023, Tridz Technologies Pvt. Ltd. and contributors
 # See license.txt
 
-# import frappe
+from unittest.mock import patch
+
+import frappe
+from erpnext.accounts.doctype.pos_invoice.test_pos_invoice import create_pos_invoice
+from erpnext.accounts.doctype.pos_profile.test_pos_profile import make_pos_profile
 from frappe.tests.utils import FrappeTestCase
 
+from ury.ury.doctype.ury_menu.ury_menu import clear_price_list_rates
+from ury.ury.doctype.ury_order.ury_order import apply_order_delta
+
+test_dependencies = ["Customer", "Item"]
+
+MENU = "_Test URY Order Menu"
+BRANCH = "_Test URY Order Branch"
+RESTAURANT = "_Test URY Order Restaurant"
+ITEMS = ["_Test Item", "_Test Item 2", "_Test Item Home Desktop 100"]
+
+
+def make_restaurant():
+	"""a restaurant pricing orders from a menu of the test items"""
+	if not frappe.db.exists("Branch", BRANCH):
+		frappe.get_doc({"doctype": "Branch", "branch": BRANCH}).insert()
+
+	# the menu picks up the price list named after it, in the company currency
+	price_list = frappe.get_doc(
+		{
+			"doctype": "Price List",
+			"price_list_name": MENU,
+			"restaurant_menu": MENU,
+			"currency": frappe.get_cached_value("Company", "_Test Company", "default_currency"),
+			"selling": 1,
+		}
+	)
+	price_list.flags.ignore_links = True
+	price_list.insert()
+
+	frappe.get_doc(
+		{
+			"doctype": "URY Menu",
+			"name": MENU,
+			"branch": BRANCH,
+			"items": [{"item": item, "item_name": item, "rate": 100} for item in ITEMS],
+		}
+	).insert()
+
+	restaurant = frappe.get_doc(
+		{
+			"doctype": "URY Restaurant",
+			"name": RESTAURANT,
+			"company": "_Test Company",
+			"branch": BRANCH,
+			"invoice_series_prefix": "_T-URY-ORD-.#####",
+			"active_menu": MENU,
+		}
+	)
+	restaurant.flags.ignore_mandatory = True
+	restaurant.insert()
+	# rates cached by an earlier, rolled back test are stale
+	clear_price_list_rates(MENU)
+
+	pos_profile = make_pos_profile()
+	pos_profile.db_set("restaurant", RESTAURANT)
+	return pos_profile
+
 
 class TestURYOrder(FrappeTestCase):
-    pass
+	def setUp(self):
+		frappe.set_user("Administrator")
+		self.addCleanup(frappe.db.rollback)
+		# KOTs are generated by the kitchen app, only the order lines are under test
+		patcher = patch("ury.ury.doctype.ury_order.ury_order.generate_kot")
+		patcher.start()
+		self.addCleanup(patcher.stop)
+
+		pos_profile = make_restaurant()
+		invoice = create_pos_invoice(
+			pos_profile=pos_profile.name,
+			restaurant=RESTAURANT,
+			branch=BRANCH,
+			item=ITEMS[0],
+			rate=100,
+			do_not_save=1,
+		)
+		second = invoice.items[0].as_dict(no_default_fields=True)
+		second.update(item_code=ITEMS[1], item_name=ITEMS[1])
+		invoice.append("items", second)
+		self.invoice = invoice.insert()
+
+	def test_add_keeps_existing_rows(self):
+		existing = [row.name for row in self.invoice.items]
+		item = ITEMS[2]
+
+		apply_order_delta(self.invoice.name, [{"op": "add", "item": item, "item_name": item, "qty": 3, "comment": ""}])
+
+		self.invoice.reload()
+		self.assertEqual(len(self.invoice.items), 3)
+		self.assertEqual([row.name for row in self.invoice.items][:2], existing)
+		self.assertEqual(self.invoice.items[2].item_code, item)
+		self.assertEqual(self.invoice.items[2].qty, 3)
+
+	def test_modify_updates_row_in_place(self):
+		row = self.invoice.items[0]
+
+		apply_order_delta(self.invoice.name, [{"op": "modify", "name": row.name, "qty": 4, "comment": "no onion"}])
+
+		self.invoice.reload()
+		modified = self.invoice.getone("items", {"name": row.name})
+		self.assertEqual(modified.qty, 4)
+		self.assertEqual(modified.comment, "no onion")
+		self.assertEqual(self.invoice.total_qty, 5)
+
+	def test_modify_rejects_non_positive_qty(self):
+		row = self.invoice.items[0]
+
+		for qty in (0, -1):
+			self.assertRaises(
+				frappe.ValidationError,
+				apply_order_delta,
+				self.invoice.name,
+				[{"op": "modify", "name": row.name, "qty": qty}],
+			)
+
+	def test_remove_drops_only_that_row(self):
+		removed, kept = self.invoice.items
+
+		apply_order_delta(self.invoice.name, [{"op": "remove", "name": removed.name}])
+
+		self.invoice.reload()
+		self.assertEqual([row.name for row in self.invoice.items], [kept.name])
+
+	def test_remove_last_row_is_rejected(self):
+		self.assertRaises(
+			frappe.ValidationError,
+			apply_order_delta,
+			self.invoice.name,
+			[{"op": "remove", "name": row.name} for row in self.invoice.items],
+		)
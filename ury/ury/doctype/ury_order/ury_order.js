@@ -27,6 +27,8 @@ let table_list_div = '';
 let branch_g = ""
 let rstnt_menu_items = '';
 let total_time = ""
+let route_listener_added = false
+let cur_order_frm = null
 
 frappe.ui.form.on('URY Order', {
 	setup: function (frm) {
@@ -44,6 +46,18 @@ frappe.ui.form.on('URY Order', {
 
 	onload: function (frm) {
 		$('.ellipsis.title-text').hide();
+
+		// leave the room of the open invoice when the tablet navigates away, the router
+		// outlives the form so the listener is only added once
+		if (!route_listener_added) {
+			route_listener_added = true;
+			frappe.router.on('change', () => {
+				if (frappe.get_route()[1] !== 'URY Order' && cur_order_frm) {
+					cur_order_frm.events.subscribe_invoice(cur_order_frm, null);
+				}
+			});
+		}
+		cur_order_frm = frm;
 		frappe.call({
 			method: 'ury.ury.doctype.ury_order.ury_order.pos_opening_check',
 			callback: function (r) {
@@ -106,6 +120,9 @@ frappe.ui.form.on('URY Order', {
 			$(this).prop('type', 'number');
 		})
 
+		// reload_ro is only sent to the room of the submitted invoice
+		frm.events.subscribe_invoice(frm, frm.doc.last_invoice);
+		frappe.realtime.off('reload_ro');
 		frappe.realtime.on('reload_ro', (data) => {
 			if (frm.doc.last_invoice && data.name === frm.doc.last_invoice) {
 				frappe.dom.freeze(__('Order Completed'));
@@ -272,6 +289,24 @@ frappe.ui.form.on('URY Order', {
 		}
 	},
 
+	last_invoice: function (frm) {
+		frm.events.subscribe_invoice(frm, frm.doc.last_invoice);
+	},
+
+	subscribe_invoice: function (frm, invoice) {
+		invoice = invoice || null;
+		if (frm.subscribed_invoice === invoice) {
+			return;
+		}
+		if (frm.subscribed_invoice) {
+			frappe.realtime.doc_unsubscribe('POS Invoice', frm.subscribed_invoice);
+		}
+		if (invoice) {
+			frappe.realtime.doc_subscribe('POS Invoice', invoice);
+		}
+		frm.subscribed_invoice = invoice;
+	},
+
 	item_search(frm) {
 		frm.trigger('get_menu');
 	},
@@ -826,9 +861,11 @@ frappe.ui.form.on('URY Order', {
 									}
 								});
 
+								// ESC/POS profiles send the receipt as raw printer commands instead of HTML
+								const escpos = profile.custom_receipt_renderer == "ESC/POS";
 								frappe.call({
-									method: "frappe.www.printview.get_html_and_style",
-									args: {
+									method: escpos ? "ury.ury.api.escpos.get_qz_receipt" : "frappe.www.printview.get_html_and_style",
+									args: escpos ? { doctype: "POS Invoice", name: invoice } : {
 										doc: "POS Invoice",
 										name: invoice,
 										print_format: profile.print_format,
@@ -857,12 +894,9 @@ frappe.ui.form.on('URY Order', {
 										function printWithQZTray() {
 											qz.printers.getDefault()
 												.then((printer) => {
-													var htmlcontent = r.message.html;
-													var data = [{
-														type: 'html',
-														format: 'plain',
-														data: htmlcontent
-													}];
+													var data = escpos
+														? [{ type: 'raw', format: 'base64', data: r.message.raw }]
+														: [{ type: 'html', format: 'plain', data: r.message.html }];
 
 													var config = qz.configs.create(printer);
 													qz.print(config, data)
@@ -914,12 +948,14 @@ frappe.ui.form.on('URY Order', {
 									},
 									callback: function (r) {
 										if (r.message == "Success") {
-											$('.standard-actions').addClass('hidden-xs hidden-md');
-											frappe.show_alert({ message: __('Invoice Printed'), indicator: 'green' });
-											setTimeout(function () {
-												frappe.dom.unfreeze();
+											frappe.show_alert({ message: __('Invoice sent to printer'), indicator: 'blue' });
+											frappe.dom.unfreeze();
+											// from pos_print.js, loaded on every desk page
+											wait_for_network_print(invoice, () => {
+												$('.standard-actions').addClass('hidden-xs hidden-md');
+												frappe.show_alert({ message: __('Invoice Printed'), indicator: 'green' });
 												frappe.ui.toolbar.clear_cache()
-											}, 1500)
+											});
 										}
 										else {
 											console.error(r.message);
@@ -7,7 +7,22 @@ from frappe import _
 from frappe.model.document import Document
 from erpnext.controllers.queries import item_query
 from ury.ury_pos.api import getBranch, getBranchRoom
+from ury.ury.doctype.ury_customer_favourite_item.ury_customer_favourite_item import (
+    get_customer_favourites,
+)
+from ury.integrations import get_integration, has_integration
+from ury.realtime import publish
+from ury.ury.doctype.ury_kot_intent.ury_kot_intent import get_kot_backend, record_kot_intent
+from ury.ury.doctype.ury_menu.ury_menu import get_menu_snapshot, get_price_list_rates
+from ury.ury.doctype.ury_table.ury_table import (
+    claim_table,
+    get_table_route,
+    publish_table_update,
+    release_table,
+    transfer_table,
+)
 from frappe import cache
+from frappe.utils import flt, get_datetime, now
 
 
 class URYOrder(Document):
@@ -48,7 +63,7 @@ def get_order_invoice(table=None, invoiceNo=None, order_type=None, is_payment=No
                         invoice_name = None
                 
         # invoice_name = frappe.get_value("POS Invoice", dict(restaurant_table=table, docstatus=0, invoice_printed=0))
-        branch, menu_name, restaurant = get_restaurant_and_menu_name(table)
+        route = get_menu_route(table)
 
         if invoice_name:
             invoice = frappe.get_doc("POS Invoice", invoice_name)
@@ -56,28 +71,21 @@ def get_order_invoice(table=None, invoiceNo=None, order_type=None, is_payment=No
         else:
             invoice = frappe.new_doc("POS Invoice")
 
-            invoice.naming_series = frappe.db.get_value(
-                "URY Restaurant", restaurant, "invoice_series_prefix"
-            )
+            invoice.naming_series = route.invoice_series_prefix
 
             invoice.is_pos = 1
             invoice.update_stock = 1
-            invoice.restaurant = restaurant
-            invoice.branch = branch
+            invoice.restaurant = route.restaurant
+            invoice.branch = route.branch
 
-            is_take_away = frappe.db.get_value("URY Table", table, "is_take_away")
-            if is_take_away == 1:
+            if route.is_take_away == 1:
                 invoice.order_type = "Take Away"
             else:
                 invoice.order_type= "Dine In"
 
-        invoice.taxes_and_charges = frappe.db.get_value(
-            "URY Restaurant", restaurant, "default_tax_template"
-        )
+        invoice.taxes_and_charges = route.tax_template
 
-        invoice.selling_price_list = frappe.db.get_value(
-            "Price List", dict(restaurant_menu=menu_name, enabled=1)
-        )
+        invoice.selling_price_list = route.price_list
 
     else:
 
@@ -217,14 +225,6 @@ def sync_order(
         invoice.custom_restaurant_room =room
         invoice.restaurant_table = table
         
-        if order_type == "Aggregators":
-            price_list = frappe.db.get_value("Aggregator Settings",{"customer": customer, "parent": invoice.branch, "parenttype": "Branch"},"price_list",)
-            
-            if not price_list:
-                frappe.throw(f"Price list for customer {customer} in branch {invoice.branch} not found in Aggregator Settings.")
-        else:
-            price_list = invoice.selling_price_list
-
         # dummy payment
         if invoice.invoice_created == 0:
             invoice.append(
@@ -252,54 +252,27 @@ def sync_order(
         invoice.items = []
         
         if order_type == "Aggregators":
-            priceList = frappe.db.get_value(
+            price_list = frappe.db.get_value(
                 "Aggregator Settings",
                 {"customer": customer, "parent": invoice.branch, "parenttype": "Branch"},
                 "price_list",
             )
 
-            if not priceList:
+            if not price_list:
                 frappe.throw(f"There is no Default Price List for aggregator {customer}, please select a default price list for aggregator.")
 
             menu = frappe.db.get_value(
-                "Price List", {"name": priceList}, "restaurant_menu"
+                "Price List", {"name": price_list}, "restaurant_menu"
             )
 
             if not menu:
-                frappe.throw(f"There is no Restaurant Menu for aggregator {customer} and price list {priceList}")
+                frappe.throw(f"There is no Restaurant Menu for aggregator {customer} and price list {price_list}")
         else:
+            price_list = invoice.selling_price_list
             menu = frappe.db.get_value("URY Menu", {"branch": invoice.branch}, "name")
     
-        for d in items:
-            
-            course = frappe.db.get_value("URY Menu Item", {"item": d.get("item"),"parent":menu}, "course")
-            
-            item_prices = frappe.db.get_list(
-                "Item Price",
-                filters={"item_code": d.get("item"), "price_list": price_list},
-                fields=["price_list_rate"],
-            )
-
-            if not item_prices:
-                frappe.throw(_("No item price found for Item: {0} in Price List: {1}. Please check the price list settings.").format(d.get("item"), price_list))
-
-            else:
-                invoice.append(
-                    "items",
-                    dict(
-                        item_code=d.get("item"),
-                        item_name=d.get("item_name"),
-                        qty=d.get("qty"),
-                        **({"custom_course": course} if course else {}),
-                        comment=d.get("comment"),
-                        rate = item_prices[0].price_list_rate,
-                        price_list_rate = item_prices[0].price_list_rate,
-                        base_price_list_rate = item_prices[0].price_list_rate,
-                        cost_center = frappe.db.get_value(
-                            "POS Profile", pos_profile, "cost_center"
-                            ),
-                    ),
-                )
+        for order_item in resolve_order_items(items, price_list, menu, posprofile.cost_center):
+            invoice.append("items", order_item)
 
         try:
             invoice.save()
@@ -308,34 +281,172 @@ def sync_order(
             
 
 
-        try:
-            apps = frappe.get_single("Installed Applications").installed_applications
-            app_array = [app.app_name for app in apps if app.app_name == "ury_mosaic"]
-
-            if app_array:
-                from ury_mosaic.ury_mosaic.api.ury_kot_generate import kot_execute
-
-                if invoice.custom_is_confirmed == 1:
-                    kot_execute(invoice.name, customer, table, items, past_item, comments)
-
-        except Exception as e:
-            # If an exception occurs (e.g., "kot" app not found), it will be caught here without affect the code execution.
-            pass
-
         # table status
         if invoice.invoice_printed == 0:
             require_a_table = frappe.db.get_value("URY Order Type", order_type, "require_a_table")
             if require_a_table:
-                frappe.db.set_value(
-                    "URY Table", table, {"occupied": 1, "latest_invoice_time": invoice.creation}
-                )
+                claim = claim_table(table, invoice.name, invoice.creation)
+                if claim.status == "Conflict":
+                    # another order took the table first, drop this one
+                    frappe.db.rollback()
+                    frappe.msgprint(
+                        title="Table occupied ",
+                        indicator="red",
+                        msg=("{0} is already occupied . Please refresh the page.").format(
+                            table
+                        ),
+                    )
+                    return {"status": "Failure"}
 
+        generate_kot(invoice, items, past_item, comments)
+
+        publish_table_update(table)
         invoice.db_set("owner", cashier)
         return invoice.as_dict()
     except Exception as ee:
         return ee
 
 
+@frappe.whitelist()
+def apply_order_delta(invoice, operations, last_modified_time=None, comments=None):
+    """Apply add / modify / remove operations to the lines of an open order.
+
+    Each operation is a dict with `op` and, for modify and remove, the `name`
+    of the POS Invoice Item row; add and modify carry `item`, `item_name`,
+    `qty` and `comment`. Only the changed lines are handed to KOT generation.
+    """
+    if isinstance(operations, str):
+        operations = json.loads(operations)
+
+    invoice = frappe.get_doc("POS Invoice", invoice)
+
+    if invoice.docstatus != 0 or invoice.invoice_printed == 1:
+        frappe.msgprint(
+            title="Invoice Already Billed",
+            indicator="red",
+            msg=("This order has already been billed. Please reload the page."),
+        )
+        return {"status": "Failure"}
+
+    if last_modified_time and get_datetime(last_modified_time) != get_datetime(invoice.modified):
+        frappe.msgprint(
+            title="Order has been modified",
+            indicator="red",
+            msg=(
+                "This order has been modified. Please reload the page to retrieve the latest edits."
+            ),
+        )
+        return {"status": "Failure"}
+
+    rows = {row.name: row for row in invoice.items}
+    added_items = []
+    past_item = []
+    items = []
+
+    for operation in operations:
+        op = operation.get("op")
+
+        if op == "add":
+            added_items.append(operation)
+            items.append(operation)
+            continue
+
+        row = rows.get(operation.get("name"))
+        if not row:
+            frappe.throw(_("Row {0} is not part of order {1}. Please reload the page.").format(operation.get("name"), invoice.name))
+
+        past_item.append({
+            "item_code": row.item_code,
+            "item_name": row.item_name,
+            "qty": row.qty,
+            "comment": "",
+        })
+
+        if op == "modify":
+            if "qty" in operation and flt(operation.get("qty")) <= 0:
+                frappe.throw(_("Quantity of {0} must be greater than zero, remove the line instead.").format(row.item_name))
+            row.qty = operation.get("qty", row.qty)
+            row.comment = operation.get("comment", row.comment)
+            items.append({
+                "item": row.item_code,
+                "item_name": row.item_name,
+                "qty": row.qty,
+                "comment": row.comment,
+            })
+        elif op == "remove":
+            invoice.remove(row)
+        else:
+            frappe.throw(_("Unknown order operation {0}").format(op))
+
+    if added_items:
+        # validate_price_list already holds the aggregator price list on the invoice
+        price_list = invoice.selling_price_list
+        if invoice.order_type == "Aggregators":
+            menu = frappe.db.get_value("Price List", price_list, "restaurant_menu")
+        else:
+            menu = frappe.db.get_value("URY Menu", {"branch": invoice.branch}, "name")
+
+        cost_center = frappe.db.get_value("POS Profile", invoice.pos_profile, "cost_center")
+        for order_item in resolve_order_items(added_items, price_list, menu, cost_center):
+            invoice.append("items", order_item)
+
+    if not invoice.items:
+        frappe.throw(_("An order needs at least one item, cancel the order instead."))
+
+    if comments is not None:
+        invoice.custom_order_comments = comments
+
+    invoice.save()
+
+    generate_kot(invoice, items, past_item, invoice.custom_order_comments)
+
+    return invoice.as_dict()
+
+
+def generate_kot(invoice, items, past_item, comments):
+    """queue a KOT for the changed lines of a confirmed order"""
+    if invoice.custom_is_confirmed == 1:
+        record_kot_intent(invoice, items, past_item, comments)
+
+
+def resolve_order_items(items, price_list, menu, cost_center):
+    """returns the invoice rows for the ordered items, priced and coursed from the
+    cached price list and menu snapshot instead of per line lookups"""
+    rates = get_price_list_rates(price_list)
+    courses = {
+        menu_item["item"]: menu_item["course"]
+        for menu_item in (get_menu_snapshot(menu)["items"] if menu else [])
+    }
+
+    missing_items = [d.get("item") for d in items if d.get("item") not in rates]
+    if missing_items:
+        frappe.throw(
+            _("No item price found for Item(s): {0} in Price List: {1}. Please check the price list settings.").format(
+                ", ".join(dict.fromkeys(missing_items)), price_list
+            )
+        )
+
+    order_items = []
+    for d in items:
+        course = courses.get(d.get("item"))
+        rate = rates[d.get("item")]
+        order_items.append(
+            dict(
+                item_code=d.get("item"),
+                item_name=d.get("item_name"),
+                qty=d.get("qty"),
+                **({"custom_course": course} if course else {}),
+                comment=d.get("comment"),
+                rate = rate,
+                price_list_rate = rate,
+                base_price_list_rate = rate,
+                cost_center = cost_center,
+            )
+        )
+
+    return order_items
+
+
 def create_order_items(items, branch, order_type, customer):
     try:
         if order_type == 'Aggregators':
@@ -399,12 +510,7 @@ def create_order_items(items, branch, order_type, customer):
 @frappe.whitelist()
 def confirm_order(invoice_name):
     try:
-        apps = frappe.get_single("Installed Applications").installed_applications
-        app_array = [app.app_name for app in apps if app.app_name == "ury_mosaic"]
-
-        if app_array:
-            from ury_mosaic.ury_mosaic.api.ury_kot_generate import kot_execute
-
+        if get_kot_backend():
             pos_invoice = frappe.get_doc("POS Invoice", invoice_name, as_dict = True)
             customer = pos_invoice.customer
             table = pos_invoice.restaurant_table
@@ -413,16 +519,17 @@ def confirm_order(invoice_name):
             # items = create_order_items(pos_invoice.items, pos_invoice.branch)
             items = create_order_items(pos_invoice.items, pos_invoice.branch, pos_invoice.order_type, customer)
 
-            kot_execute(invoice_name, customer, table, items, [], comments)
-
             require_a_table = frappe.db.get_value("URY Order Type", pos_invoice.order_type, "require_a_table")
             if not require_a_table:
                 pos_invoice.invoice_printed = 1
 
             pos_invoice.custom_is_confirmed = 1
             pos_invoice.save()
-            frappe.db.commit()
-            
+
+            # the KOT is created by a background job once the confirmation commits
+            record_kot_intent(pos_invoice, items, [], comments)
+            publish_table_update(table)
+
             return {"status": "success"}
 
     except Exception as e:
@@ -442,7 +549,7 @@ def item_query_restaurant(
     as_dict=False,
 ):
     """Return items that are selected in active menu of the restaurant"""
-    restaurant, menu = get_restaurant_and_menu_name(filters["table"])
+    menu = get_menu_route(filters["table"]).menu
     items = frappe.db.get_all("URY Menu Item", ["item"], dict(parent=menu, disabled=0))
     del filters["table"]
     filters["name"] = ("in", [d.item for d in items])
@@ -452,35 +559,25 @@ def item_query_restaurant(
 
 @frappe.whitelist()
 def get_restaurant_and_menu_name(table):
+    route = get_menu_route(table)
+    return route.branch, route.menu, route.restaurant
+
+
+def get_menu_route(table):
+    """returns the cached route of a table, making sure it has a menu"""
     if not table:
         frappe.throw(_("Please select a table"))
 
-    restaurant, branch, room = frappe.get_value(
-        "URY Table",
-        table,
-        ["restaurant", "branch", "restaurant_room"],
-    )
-    room_wise_menu = frappe.db.get_value(
-        "URY Restaurant",
-        restaurant,
-        "room_wise_menu",
-    )
-
-    if not room_wise_menu:
-        menu = frappe.db.get_value("URY Restaurant", restaurant, "active_menu")
-    else:
-        menu = frappe.db.get_value(
-            "Menu for Room",
-            {"parent": restaurant, "room": room},
-            "menu",
-        )
+    route = get_table_route(table)
+    if not route:
+        frappe.throw(_("Table {0} not found").format(table))
 
-    if not menu:
+    if not route.menu:
         frappe.throw(
-            _("Please set an active menu for Restaurant {0}").format(restaurant)
+            _("Please set an active menu for Restaurant {0}").format(route.restaurant)
         )
 
-    return branch, menu, restaurant
+    return route
 
 
 @frappe.whitelist()
@@ -530,33 +627,24 @@ def table_transfer(table, newTable, invoice):
             frappe.throw(f"Table {new_table.name} is already occupied")
 
         # Update table status
-        frappe.db.set_value(
-            "URY Table",
-            new_table.name,
-            {"occupied": 1, "latest_invoice_time": pos_invoice.creation},
-        )
-        frappe.db.set_value(
-            "URY Table",
-            current_table.name,
-            {"occupied": 0, "latest_invoice_time": None},
+        transfer = transfer_table(
+            current_table.name, new_table.name, pos_invoice.name, pos_invoice.creation
         )
+        if transfer.status == "Conflict":
+            frappe.throw(f"Table {new_table.name} is already occupied")
 
         # Update POS Invoice
         pos_invoice.restaurant_table = new_table.name
         pos_invoice.save()
+        publish_table_update(current_table.name, new_table.name)
 
-        try:
-            apps = frappe.get_single("Installed Applications").installed_applications
-            app_array = [app.app_name for app in apps if app.app_name == "ury_mosaic"]
-
-            if app_array:
-                change_table_in_kot(
-                    pos_invoice.name, new_table.name, pos_invoice.branch
-                )
-
-        except Exception as e:
-            # If an exception occurs (e.g., "kot" app not found), it will be caught here without effecting execution
-            pass
+        change_table = get_integration("change_table")
+        if change_table:
+            try:
+                change_table(pos_invoice.name, new_table.name, pos_invoice.branch)
+            except Exception:
+                # the transfer stands even if the kitchen display could not follow
+                frappe.log_error(title="Error in KOT Table Change")
 
     else:
         frappe.throw(_("Table transfer between different rooms is restricted."))
@@ -575,26 +663,7 @@ def captain_transfer(currentCaptain, newCaptain, invoice):
 
 @frappe.whitelist()
 def customer_favourite_item(customer_name):
-    pos = frappe.db.get_list(
-        "POS Invoice", filters={"customer": customer_name}, fields=["name"]
-    )
-
-    item_qty = {}
-
-    for invoice in pos:
-        pos_invoice = frappe.get_doc("POS Invoice", invoice)
-        for item in pos_invoice.items:
-            item_name = item.item_name
-            item_qty[item_name] = item_qty.get(item_name, 0) + item.qty
-
-    result = [
-        {"item_name": item_name, "qty": qty}
-        for item_name, qty in item_qty.items()
-        if qty > 1
-    ]
-    result = sorted(result, key=lambda x: x["qty"], reverse=True)[:3]
-
-    return result
+    return get_customer_favourites(customer_name, limit=3, min_qty=1)
 
 
 @frappe.whitelist()
@@ -604,23 +673,14 @@ def cancel_order(invoice_id, reason):
     # Update table status
     require_a_table = frappe.db.get_value("URY Order Type", pos_invoice.order_type, "require_a_table")
     if require_a_table:
-        frappe.db.set_value(
-            "URY Table",
-            pos_invoice.restaurant_table,
-            {"occupied": 0, "latest_invoice_time": None},
-        )
-
-    try:
-        if pos_invoice.custom_is_confirmed:
-            apps = frappe.get_single("Installed Applications").installed_applications
-            app_array = [app.app_name for app in apps if app.app_name == "ury_mosaic"]
-
-            if app_array:
-                cancel_kot(invoice_id)
+        release_table(pos_invoice.restaurant_table, pos_invoice.name)
 
-    except Exception as e:
-        # If an exception occurs (e.g., "kot" app not found), it will be caught here without effecting execution
-        pass
+    if pos_invoice.custom_is_confirmed and has_integration("cancel_kot"):
+        try:
+            cancel_kot(invoice_id)
+        except Exception:
+            # the order is cancelled even if the kitchen could not be told
+            frappe.log_error(title="Error in KOT Cancel")
 
     # Update invoice status
     # frappe.db.set_value(
@@ -634,6 +694,7 @@ def cancel_order(invoice_id, reason):
         pos_invoice.name,
         {"docstatus": 2, "status": "Cancelled", "cancel_reason": reason},
     )
+    publish_table_update(pos_invoice.restaurant_table)
    
 
 # Method for URY POS
@@ -645,8 +706,7 @@ def make_invoice(customer, payments, cashier, pos_profile, table=None, invoice=N
     invoice = get_order_invoice(table, invoice, order_type, "Payments")
 
     if table:
-        restaurant = get_restaurant_and_menu_name(table)
-        invoice.restaurant = restaurant
+        invoice.restaurant = get_menu_route(table).restaurant
 
     invoice.customer = customer
     invoice.pos_profile = pos_profile
@@ -667,12 +727,11 @@ def make_invoice(customer, payments, cashier, pos_profile, table=None, invoice=N
 
 # Cancel KOT Doc Creation
 def cancel_kot(invoice_id):
-    from ury_mosaic.ury_mosaic.api.ury_kot_generate import process_items_for_cancel_kot
+    process_items_for_cancel_kot = get_integration("cancel_kot")
 
     pos_invoice = frappe.get_doc("POS Invoice", invoice_id)
     pos_profile_id = pos_invoice.pos_profile
-    pos_profile = frappe.get_doc("POS Profile", pos_profile_id)
-    kot_naming_series = pos_profile.custom_kot_naming_series
+    kot_naming_series = frappe.db.get_value("POS Profile", pos_profile_id, "custom_kot_naming_series")
     cancel_kot_naming_series = "CNCL-" + kot_naming_series
 
     items = []
@@ -703,45 +762,82 @@ def cancel_kot(invoice_id):
         items,
     )
 
-    # Set the KOTs associated with the invoice as canceled
-    kot_list = frappe.db.get_list(
-        "URY KOT",
-        filters={
-            "invoice": invoice_id,
-            "type": ("in", ("New Order", "Order Modified")),
-            "docstatus": 1,
-        },
-        fields=("*"),
+    # Set the KOTs associated with the invoice as canceled; the row locks keep a kitchen
+    # update from slipping in. Unlike change_table_in_kot this is not one UPDATE: URY KOT
+    # comes from the kitchen app, whose on_cancel and doc_events a raw docstatus = 2
+    # would skip, so each KOT is cancelled as a document and records its own version
+    kots = frappe.db.sql_list(
+        """
+        SELECT name
+        FROM `tabURY KOT`
+        WHERE invoice = %s AND type IN ('New Order', 'Order Modified') AND docstatus = 1
+        FOR UPDATE
+        """,
+        invoice_id,
     )
+    for kot in kots:
+        frappe.get_doc("URY KOT", kot).cancel()
 
-    for item in kot_list:
-        kot_doc = frappe.get_doc("URY KOT", item.name)
-        kot_doc.docstatus = 2
-        kot_doc.save()
+    if kots:
+        publish_kot_update(pos_invoice.branch)
 
 
 def change_table_in_kot(invoice, new_table, branch):
-    # Get a list of KOTs associated with the POS Invoice
-    kot_list = frappe.get_all(
-        "URY KOT",
-        filters={
-            "invoice": invoice,
-            "docstatus": 1,
-            "order_status": "Ready For Prepare",
-            "verified": 0,
+    # KOTs of the invoice the kitchen has not started on yet
+    kots = frappe.db.sql(
+        """
+        SELECT name, restaurant_table
+        FROM `tabURY KOT`
+        WHERE invoice = %s AND docstatus = 1 AND order_status = 'Ready For Prepare'
+            AND verified = 0 AND IFNULL(restaurant_table, '') != %s
+        FOR UPDATE
+        """,
+        (invoice, new_table),
+    )
+    if not kots:
+        return
+
+    frappe.db.sql(
+        """
+        UPDATE `tabURY KOT`
+        SET restaurant_table = %s, modified = %s, modified_by = %s
+        WHERE name IN %s
+        """,
+        (new_table, now(), frappe.session.user, tuple(kot for kot, old_table in kots)),
+    )
+    add_kot_comments(
+        "Info",
+        {
+            kot: _("Table changed from {0} to {1}").format(old_table or "-", new_table)
+            for kot, old_table in kots
         },
     )
+    publish_kot_update(branch)
 
-    # Update each KOT's restaurant_table and send a real-time update
-    for kot in kot_list:
-        frappe.db.set_value("URY KOT", kot.name, "restaurant_table", new_table)
 
-        custom_branch_in_english = frappe.db.get_value("Branch", branch, "custom_branch_in_english")
-        
-        production = frappe.db.get_value("URY KOT", kot.name, "production")
-        production_in_english = frappe.db.get_value("URY KOT", production, "production_in_english")
+def add_kot_comments(comment_type, contents):
+    """leave the audit comment of a bulk KOT change on each KOT, {kot: content}"""
+    timestamp = now()
+    user = frappe.session.user
+    frappe.db.bulk_insert(
+        "Comment",
+        [
+            "name", "creation", "modified", "owner", "modified_by", "docstatus",
+            "comment_type", "reference_doctype", "reference_name",
+            "comment_email", "comment_by", "content",
+        ],
+        [
+            (
+                frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0,
+                comment_type, "URY KOT", kot, user, frappe.utils.get_fullname(user), content,
+            )
+            for kot, content in contents.items()
+        ],
+    )
+
 
-        # kot_channel = "{}_{}_{}".format("kot_update", branch, production)
-        # kot_channel = "{}_{}_{}".format("kot_update", custom_branch_in_english, production_in_english)
-        kot_channel = "{}_{}".format("kot_update", custom_branch_in_english)
-        frappe.publish_realtime(kot_channel)
+def publish_kot_update(branch):
+    """one refresh for the kitchen screens of a branch, however many KOTs changed"""
+    custom_branch_in_english = frappe.db.get_value("Branch", branch, "custom_branch_in_english")
+    kot_channel = "{}_{}".format("kot_update", custom_branch_in_english)
+    publish(kot_channel, branch=branch)
@@ -1,9 +1,14 @@
 # Copyright (c) 2025, Tridz Technologies Pvt. Ltd and contributors
 # For license information, please see license.txt
 
-# import frappe
 from frappe.model.document import Document
 
+from ury.ury_pos.api import clear_terminal_bootstrap
+
 
 class URYOrderType(Document):
-	pass
+	def on_update(self):
+		clear_terminal_bootstrap()
+
+	def on_trash(self):
+		clear_terminal_bootstrap()
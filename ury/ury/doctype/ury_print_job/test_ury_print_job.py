@@ -0,0 +1,145 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+
+from ury.ury.doctype.ury_print_job.ury_print_job import (
+	CLAIM_TIMEOUT_MINUTES,
+	MAX_PRINT_ATTEMPTS,
+	PRINT_JOB_DEDUPE_CACHE_KEY,
+	QUEUED_TIMEOUT_MINUTES,
+	acknowledge_print_job,
+	claim_print_job,
+	create_print_job,
+	redeliver_print_jobs,
+)
+
+TEST_BRANCH = "_Test URY Print Branch"
+
+
+class TestURYPrintJob(FrappeTestCase):
+	def setUp(self):
+		frappe.set_user("Administrator")
+		self.addCleanup(frappe.db.rollback)
+		patcher = patch("ury.ury.doctype.ury_print_job.ury_print_job.publish")
+		self.publish = patcher.start()
+		self.addCleanup(patcher.stop)
+
+		if not frappe.db.exists("Branch", TEST_BRANCH):
+			frappe.get_doc({"doctype": "Branch", "branch": TEST_BRANCH}).insert()
+
+	def make_job(self, station=None):
+		# any existing document will do as the reference, the branch is at hand
+		job, created = create_print_job("Branch", TEST_BRANCH, None, TEST_BRANCH, station)
+		self.assertTrue(created)
+		return job
+
+	def get_job(self, job):
+		return frappe.db.get_value(
+			"URY Print Job", job.name, ["status", "attempts", "claimed_by"], as_dict=True
+		)
+
+	def test_outstanding_job_is_returned_instead_of_a_second_print(self):
+		job = self.make_job()
+
+		duplicate, created = create_print_job("Branch", TEST_BRANCH, None, TEST_BRANCH)
+
+		self.assertFalse(created)
+		self.assertEqual(duplicate.name, job.name)
+		self.assertEqual(self.publish.call_count, 1)
+
+	def test_concurrent_request_holding_the_key_gets_no_job(self):
+		dedupe_key = frappe.cache().make_key(
+			"{0}:{1}:{2}:{3}".format(PRINT_JOB_DEDUPE_CACHE_KEY, "Branch", TEST_BRANCH, None)
+		)
+		frappe.cache().set(dedupe_key, 1, ex=30)
+		self.addCleanup(frappe.cache().delete, dedupe_key)
+
+		self.assertEqual(create_print_job("Branch", TEST_BRANCH, None, TEST_BRANCH), (None, False))
+		self.assertFalse(frappe.db.exists("URY Print Job", {"reference_name": TEST_BRANCH}))
+
+	def test_only_one_station_claims_a_job(self):
+		job = self.make_job()
+
+		claimed = claim_print_job(job.name, "Counter")
+
+		self.assertEqual(claimed.name, job.name)
+		self.assertIsNone(claim_print_job(job.name, "Kitchen"))
+		self.assertEqual(self.get_job(job), {"status": "Printing", "attempts": 1, "claimed_by": "Counter"})
+
+	def test_job_for_a_station_is_not_claimed_by_another(self):
+		job = self.make_job(station="Counter")
+
+		self.assertIsNone(claim_print_job(job.name, "Kitchen"))
+		self.assertEqual(self.get_job(job).status, "Queued")
+
+	def test_acknowledge_by_another_station_is_ignored(self):
+		job = self.make_job()
+		claim_print_job(job.name, "Counter")
+
+		self.assertEqual(acknowledge_print_job(job.name, "Kitchen"), "Printing")
+		self.assertEqual(acknowledge_print_job(job.name, "Counter"), "Printed")
+
+	@patch("ury.ury.api.ury_print.mark_invoice_printed")
+	def test_acknowledged_bill_marks_the_invoice_printed_once(self, mark_invoice_printed):
+		job = self.make_job()
+		frappe.db.set_value(
+			"URY Print Job", job.name, {"reference_doctype": "POS Invoice", "reference_name": "_Test Bill"}
+		)
+		claim_print_job(job.name, "Counter")
+
+		acknowledge_print_job(job.name, "Kitchen")
+		acknowledge_print_job(job.name, "Counter")
+		acknowledge_print_job(job.name, "Counter")
+
+		mark_invoice_printed.assert_called_once_with("POS Invoice", "_Test Bill")
+
+	def test_quiet_station_puts_the_job_back_in_the_queue(self):
+		job = self.make_job()
+		claim_print_job(job.name, "Counter")
+		frappe.db.set_value(
+			"URY Print Job",
+			job.name,
+			"claimed_at",
+			add_to_date(now_datetime(), minutes=-CLAIM_TIMEOUT_MINUTES - 1),
+		)
+
+		redeliver_print_jobs()
+
+		self.assertEqual(self.get_job(job).status, "Queued")
+		self.assertEqual(claim_print_job(job.name, "Kitchen").name, job.name)
+
+	def test_job_fails_after_the_last_attempt(self):
+		job = self.make_job()
+		claim_print_job(job.name, "Counter")
+		frappe.db.set_value(
+			"URY Print Job",
+			job.name,
+			{
+				"attempts": MAX_PRINT_ATTEMPTS,
+				"claimed_at": add_to_date(now_datetime(), minutes=-CLAIM_TIMEOUT_MINUTES - 1),
+			},
+		)
+
+		redeliver_print_jobs()
+
+		self.assertEqual(self.get_job(job).status, "Failed")
+
+	def test_unclaimed_job_expires(self):
+		job = self.make_job(station="Counter")
+		redeliver_print_jobs()
+		self.assertEqual(self.get_job(job).status, "Queued")
+
+		frappe.db.set_value(
+			"URY Print Job",
+			job.name,
+			"creation",
+			add_to_date(now_datetime(), minutes=-QUEUED_TIMEOUT_MINUTES - 1),
+		)
+		redeliver_print_jobs()
+
+		self.assertEqual(self.get_job(job).status, "Failed")
@@ -0,0 +1,232 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, now, now_datetime
+
+from ury.realtime import publish
+
+
+PRINT_JOB_DEDUPE_CACHE_KEY = "ury_print_job_dedupe"
+# a second request for the same print inside this window is a double click or a retry
+DEDUPE_SECONDS = 30
+# a station that claimed a job and did not acknowledge it in time is assumed gone
+CLAIM_TIMEOUT_MINUTES = 2
+MAX_PRINT_ATTEMPTS = 5
+# a job no station picked up in this long is given up on instead of being announced again
+QUEUED_TIMEOUT_MINUTES = 30
+
+
+class URYPrintJob(Document):
+	pass
+
+
+def on_doctype_update():
+	frappe.db.add_index("URY Print Job", ["branch", "status"])
+	frappe.db.add_index("URY Print Job", ["reference_doctype", "reference_name"])
+
+
+def create_print_job(doctype, name, print_format, branch, station=None):
+	"""queue a print for the stations of a branch, returns the job and whether it is new
+
+	requests for a document that is still queued, printing or was just printed
+	get the existing job back instead of a second print, the job is None while a
+	concurrent request is still creating it
+	"""
+	existing = get_outstanding_print_job(doctype, name, print_format)
+	if existing:
+		return existing, False
+
+	dedupe_key = frappe.cache().make_key(
+		"{0}:{1}:{2}:{3}".format(PRINT_JOB_DEDUPE_CACHE_KEY, doctype, name, print_format)
+	)
+	if not frappe.cache().set(dedupe_key, 1, nx=True, ex=DEDUPE_SECONDS):
+		# a concurrent request is creating this job right now
+		return None, False
+
+	# the key only covers the insert, once it commits or fails the jobs table decides,
+	# so a failed print can be sent again at once
+	def release_dedupe_key():
+		frappe.cache().delete(dedupe_key)
+
+	frappe.db.after_commit.add(release_dedupe_key)
+	frappe.db.after_rollback.add(release_dedupe_key)
+
+	job = frappe.get_doc(
+		{
+			"doctype": "URY Print Job",
+			"reference_doctype": doctype,
+			"reference_name": name,
+			"print_format": print_format,
+			"branch": branch,
+			"station": station,
+		}
+	).insert(ignore_permissions=True)
+
+	publish_print_job(job)
+	return job, True
+
+
+def get_outstanding_print_job(doctype, name, print_format):
+	jobs = frappe.db.sql(
+		"""
+		SELECT name
+		FROM `tabURY Print Job`
+		WHERE reference_doctype = %(doctype)s AND reference_name = %(name)s
+			AND IFNULL(print_format, '') = %(print_format)s
+			AND (status IN ('Queued', 'Printing') OR (status = 'Printed' AND printed_at > %(since)s))
+		ORDER BY creation desc
+		LIMIT 1
+		""",
+		{
+			"doctype": doctype,
+			"name": name,
+			"print_format": print_format or "",
+			"since": add_to_date(now_datetime(), seconds=-DEDUPE_SECONDS),
+		},
+	)
+	if jobs:
+		return frappe.get_doc("URY Print Job", jobs[0][0])
+
+
+def publish_print_job(job):
+	# `data` keeps the shape older print pages read
+	publish(
+		"print_{0}".format(job.branch),
+		{
+			"job": job.name,
+			"station": job.station,
+			"data": {
+				"doctype": job.reference_doctype,
+				"name": job.reference_name,
+				"print_format": job.print_format,
+			},
+		},
+		branch=job.branch,
+	)
+
+
+@frappe.whitelist()
+def claim_print_job(job, station):
+	"""let one station take a queued job, returns the job details or None if another
+	station already has it"""
+	frappe.has_permission("URY Print Job", "write", throw=True)
+
+	# the row lock makes the check and the claim one step for concurrent stations
+	claimable = frappe.db.sql(
+		"""
+		SELECT name
+		FROM `tabURY Print Job`
+		WHERE name = %(job)s AND status = 'Queued'
+			AND (IFNULL(station, '') = '' OR station = %(station)s)
+		FOR UPDATE
+		""",
+		{"job": job, "station": station},
+	)
+	if not claimable:
+		return None
+
+	frappe.db.sql(
+		"""
+		UPDATE `tabURY Print Job`
+		SET status = 'Printing', claimed_by = %(station)s, claimed_at = %(now)s,
+			attempts = attempts + 1, modified = %(now)s
+		WHERE name = %(job)s
+		""",
+		{"job": job, "station": station, "now": now()},
+	)
+
+	return frappe.db.get_value(
+		"URY Print Job",
+		job,
+		["name", "reference_doctype", "reference_name", "print_format"],
+		as_dict=True,
+	)
+
+
+@frappe.whitelist()
+def acknowledge_print_job(job, station):
+	"""mark a job printed by the station that claimed it, a printed bill marks its
+	invoice printed and frees the table"""
+	from ury.ury.api.ury_print import mark_invoice_printed
+
+	frappe.has_permission("URY Print Job", "write", throw=True)
+
+	# the row lock keeps a repeated acknowledge from running the follow up twice
+	printing = frappe.db.sql(
+		"""
+		SELECT reference_doctype, reference_name
+		FROM `tabURY Print Job`
+		WHERE name = %(job)s AND status = 'Printing' AND claimed_by = %(station)s
+		FOR UPDATE
+		""",
+		{"job": job, "station": station},
+		as_dict=True,
+	)
+	if printing:
+		frappe.db.sql(
+			"""
+			UPDATE `tabURY Print Job`
+			SET status = 'Printed', printed_at = %(now)s, modified = %(now)s
+			WHERE name = %(job)s
+			""",
+			{"job": job, "now": now()},
+		)
+		if printing[0].reference_doctype == "POS Invoice":
+			mark_invoice_printed(printing[0].reference_doctype, printing[0].reference_name)
+
+	return frappe.db.get_value("URY Print Job", job, "status")
+
+
+@frappe.whitelist()
+def get_pending_print_jobs(branch, station):
+	"""queued jobs a station may print, for stations that were offline or missed an event"""
+	frappe.has_permission("URY Print Job", "read", throw=True)
+
+	return frappe.db.sql(
+		"""
+		SELECT name AS job, station, reference_doctype, reference_name, print_format
+		FROM `tabURY Print Job`
+		WHERE branch = %(branch)s AND status = 'Queued'
+			AND (IFNULL(station, '') = '' OR station = %(station)s)
+		ORDER BY creation
+		LIMIT 20
+		""",
+		{"branch": branch, "station": station},
+		as_dict=True,
+	)
+
+
+def redeliver_print_jobs():
+	"""put jobs claimed by a station that went quiet back in the queue, give up on the
+	ones nobody picked up and announce the rest again"""
+	frappe.db.sql(
+		"""
+		UPDATE `tabURY Print Job`
+		SET status = IF(attempts >= %(max_attempts)s, 'Failed', 'Queued'), modified = %(now)s
+		WHERE status = 'Printing' AND claimed_at < %(timeout)s
+		""",
+		{
+			"max_attempts": MAX_PRINT_ATTEMPTS,
+			"now": now(),
+			"timeout": add_to_date(now_datetime(), minutes=-CLAIM_TIMEOUT_MINUTES),
+		},
+	)
+
+	frappe.db.sql(
+		"""
+		UPDATE `tabURY Print Job`
+		SET status = 'Failed', modified = %(now)s
+		WHERE status = 'Queued' AND creation < %(expired)s
+		""",
+		{"now": now(), "expired": add_to_date(now_datetime(), minutes=-QUEUED_TIMEOUT_MINUTES)},
+	)
+
+	for job in frappe.get_all(
+		"URY Print Job",
+		filters={"status": "Queued", "creation": ["<", add_to_date(now_datetime(), seconds=-DEDUPE_SECONDS)]},
+		fields=["name", "branch", "station", "reference_doctype", "reference_name", "print_format"],
+		order_by="creation",
+	):
+		publish_print_job(job)
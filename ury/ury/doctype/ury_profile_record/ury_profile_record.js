@@ -0,0 +1,96 @@
+// Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+// For license information, please see license.txt
+
+frappe.ui.form.on("URY Profile Record", {
+	refresh: function (frm) {
+		frm.events.render_flame_graph(frm);
+
+		if (frm.doc.collapsed_stacks) {
+			frm.add_custom_button(__("Download Collapsed Stacks"), () => {
+				const blob = new Blob([frm.doc.collapsed_stacks], { type: "text/plain" });
+				const link = document.createElement("a");
+				link.href = URL.createObjectURL(blob);
+				link.download = `${frm.doc.name}.collapsed.txt`;
+				link.click();
+				URL.revokeObjectURL(link.href);
+			});
+		}
+	},
+
+	render_flame_graph: function (frm) {
+		const $wrapper = frm.get_field("flame_graph").$wrapper;
+		$wrapper.empty();
+
+		// build a tree of frames from lines of "outer;inner;leaf count"
+		const root = { name: __("all"), value: 0, children: {} };
+		(frm.doc.collapsed_stacks || "").split("\n").forEach((line) => {
+			const split = line.lastIndexOf(" ");
+			const count = parseInt(line.slice(split + 1));
+			if (split < 1 || !count) {
+				return;
+			}
+
+			root.value += count;
+			let node = root;
+			line.slice(0, split).split(";").forEach((name) => {
+				node.children[name] = node.children[name] || { name: name, value: 0, children: {} };
+				node = node.children[name];
+				node.value += count;
+			});
+		});
+
+		if (!root.value) {
+			$wrapper.html(`<p class="text-muted">${__("No samples were taken")}</p>`);
+			return;
+		}
+
+		// one row per depth, the root on top, each frame as wide as its share of samples
+		const row_height = 18;
+		const rows = [];
+		const layout = (node, depth, offset) => {
+			rows.push({ node: node, depth: depth, offset: offset });
+			let child_offset = offset;
+			Object.values(node.children)
+				.sort((a, b) => b.value - a.value)
+				.forEach((child) => {
+					layout(child, depth + 1, child_offset);
+					child_offset += child.value;
+				});
+		};
+		layout(root, 0, 0);
+
+		const depth = Math.max(...rows.map((row) => row.depth)) + 1;
+		const $graph = $(
+			`<div class="ury-flame-graph" style="position: relative; height: ${depth * row_height}px; font-size: 11px;"></div>`
+		).appendTo($wrapper);
+
+		rows.forEach((row) => {
+			const width = (100 * row.node.value) / root.value;
+			if (width < 0.1) {
+				return;
+			}
+
+			const share = ((100 * row.node.value) / root.value).toFixed(1);
+			// warm colours, deeper frames slightly lighter
+			const lightness = 55 + Math.min(row.depth * 2, 30);
+			$(`<div></div>`)
+				.attr("title", `${row.node.name} (${row.node.value} ${__("samples")}, ${share}%)`)
+				.text(row.node.name)
+				.css({
+					position: "absolute",
+					left: `${(100 * row.offset) / root.value}%`,
+					width: `${width}%`,
+					top: `${row.depth * row_height}px`,
+					height: `${row_height - 1}px`,
+					overflow: "hidden",
+					"white-space": "nowrap",
+					"text-overflow": "ellipsis",
+					padding: "0 2px",
+					background: `hsl(${20 + ((row.depth * 7) % 30)}, 90%, ${lightness}%)`,
+					border: "1px solid var(--bg-color)",
+					cursor: "default",
+				})
+				.appendTo($graph);
+		});
+	},
+});
@@ -0,0 +1,20 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_days, cint, now_datetime
+
+
+class URYProfileRecord(Document):
+	pass
+
+
+def save_profile_record(record):
+	"""store a profiled call, runs in a background job so the request never waits on it"""
+	frappe.get_doc(dict(record, doctype="URY Profile Record")).insert(ignore_permissions=True)
+
+
+def delete_old_profile_records():
+	days = cint(frappe.db.get_single_value("URY Profiler Settings", "keep_records_days")) or 7
+	frappe.db.delete("URY Profile Record", {"creation": ("<", add_days(now_datetime(), -days))})
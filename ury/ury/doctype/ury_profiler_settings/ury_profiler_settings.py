@@ -0,0 +1,29 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import add_to_date, cint, flt, get_datetime, now_datetime
+
+
+# the longest a profiling window may stay open
+MAX_WINDOW_HOURS = 24
+
+
+class URYProfilerSettings(Document):
+	def validate(self):
+		if not 0 <= flt(self.sample_rate) <= 100:
+			frappe.throw(_("Sample Rate must be between 0 and 100"))
+
+		if cint(self.sample_interval_ms) < 1:
+			self.sample_interval_ms = 5
+
+		if not self.enabled:
+			return
+
+		if not self.enabled_until:
+			self.enabled_until = add_to_date(now_datetime(), hours=1)
+
+		if get_datetime(self.enabled_until) > add_to_date(now_datetime(), hours=MAX_WINDOW_HOURS):
+			frappe.throw(_("Profiling can be enabled for at most {0} hours").format(MAX_WINDOW_HOURS))
@@ -1,9 +1,50 @@
 # Copyright (c) 2023, Tridz Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from ury.ury.doctype.ury_restaurant.ury_restaurant import build_restaurant_route
+
 
 class TestURYRestaurant(FrappeTestCase):
-    pass
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def make_menu(self, name):
+        menu = frappe.get_doc({"doctype": "URY Menu", "name": name, "branch": "_Test Branch"})
+        menu.flags.ignore_links = True
+        menu.flags.ignore_mandatory = True
+        return menu.insert()
+
+    def make_restaurant(self, name, menu):
+        restaurant = frappe.get_doc(
+            {
+                "doctype": "URY Restaurant",
+                "name": name,
+                "branch": "_Test Branch",
+                "active_menu": menu,
+            }
+        )
+        restaurant.flags.ignore_links = True
+        restaurant.flags.ignore_mandatory = True
+        return restaurant.insert()
+
+    def test_route_uses_the_menus_own_price_list(self):
+        menu = self.make_menu("_Test URY Route Menu")
+        # a newer aggregator list on the same menu must not take over the route
+        frappe.get_doc(
+            {
+                "doctype": "Price List",
+                "price_list_name": "_Test URY Route Aggregator",
+                "restaurant_menu": menu.name,
+                "currency": frappe.db.get_value("Price List", menu.price_list, "currency"),
+                "selling": 1,
+                "enabled": 1,
+            }
+        ).insert()
+        restaurant = self.make_restaurant("_Test URY Route Restaurant", menu.name)
+
+        route = build_restaurant_route(restaurant.name)
+
+        self.assertEqual(route.price_lists, {menu.name: menu.price_list})
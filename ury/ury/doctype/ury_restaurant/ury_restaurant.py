@@ -1,9 +1,97 @@
 # Copyright (c) 2023, Tridz Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from ury.ury_pos.api import clear_terminal_bootstrap
+
+
+RESTAURANT_ROUTES_CACHE_KEY = "ury_restaurant_routes"
+
 
 class URYRestaurant(Document):
-    pass
+    def on_update(self):
+        clear_terminal_bootstrap()
+        clear_routes()
+
+    def on_trash(self):
+        clear_terminal_bootstrap()
+        clear_routes()
+
+
+def get_restaurant_route(restaurant):
+    """returns the menus, price lists, tax template and series prefixes of a restaurant
+    from the shared cache"""
+    if not restaurant:
+        return None
+
+    return frappe.cache().hget(
+        RESTAURANT_ROUTES_CACHE_KEY,
+        restaurant,
+        generator=lambda: build_restaurant_route(restaurant),
+    )
+
+
+def build_restaurant_route(restaurant):
+    route = frappe.db.get_value(
+        "URY Restaurant",
+        restaurant,
+        [
+            "name",
+            "branch",
+            "company",
+            "active_menu",
+            "room_wise_menu",
+            "default_tax_template",
+            "invoice_series_prefix",
+            "aggregator_series_prefix",
+        ],
+        as_dict=True,
+    )
+    if not route:
+        return None
+
+    route.room_menus = dict(
+        frappe.db.sql(
+            """
+            SELECT room, menu
+            FROM `tabMenu for Room`
+            WHERE parent = %s AND parenttype = 'URY Restaurant'
+            """,
+            restaurant,
+        )
+    )
+
+    route.price_lists = {}
+    menus = {route.active_menu, *route.room_menus.values()} - {None}
+    if menus:
+        # the menu's own price list, aggregator lists can point at the same menu
+        route.price_lists = dict(
+            frappe.db.sql(
+                """
+                SELECT m.name, m.price_list
+                FROM `tabURY Menu` AS m
+                INNER JOIN `tabPrice List` AS pl ON pl.name = m.price_list
+                WHERE m.name IN %s AND pl.enabled = 1
+                """,
+                [tuple(menus)],
+            )
+        )
+
+    return route
+
+
+def get_room_menu(route, room):
+    """the menu a room orders from, the restaurant's active menu unless menus are room wise"""
+    if route.room_wise_menu:
+        return route.room_menus.get(room)
+    return route.active_menu
+
+
+def clear_routes():
+    """drop every cached restaurant and table route"""
+    from ury.ury.doctype.ury_table.ury_table import clear_table_routes
+
+    frappe.cache().delete_key(RESTAURANT_ROUTES_CACHE_KEY)
+    clear_table_routes()
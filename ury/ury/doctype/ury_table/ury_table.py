@@ -1,11 +1,206 @@
 # Copyright (c) 2023, Tridz Technologies Pvt. Ltd. and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
+from ury.realtime import publish
+
+
+TABLE_ROUTES_CACHE_KEY = "ury_table_routes"
+
 
 class URYTable(Document):
     def autoname(self):
         prefix = re.sub("-+", "-", self.restaurant.replace(" ", "-"))
         self.name = make_autoname(prefix + "-.##")
+
+    def on_update(self):
+        clear_table_routes(self.name)
+
+    def on_trash(self):
+        clear_table_routes(self.name)
+
+
+def get_table_route(table):
+    """returns where orders on a table go: branch, restaurant, room, menu, price list,
+    tax template and series prefixes, from the shared cache"""
+    return frappe.cache().hget(
+        TABLE_ROUTES_CACHE_KEY, table, generator=lambda: build_table_route(table)
+    )
+
+
+def build_table_route(table):
+    from ury.ury.doctype.ury_restaurant.ury_restaurant import get_restaurant_route, get_room_menu
+
+    table_doc = frappe.db.get_value(
+        "URY Table",
+        table,
+        ["restaurant", "branch", "restaurant_room", "is_take_away"],
+        as_dict=True,
+    )
+    if not table_doc:
+        return None
+
+    restaurant = get_restaurant_route(table_doc.restaurant) or frappe._dict(
+        room_menus={}, price_lists={}
+    )
+    menu = get_room_menu(restaurant, table_doc.restaurant_room)
+
+    return frappe._dict(
+        table=table,
+        branch=table_doc.branch,
+        restaurant=table_doc.restaurant,
+        room=table_doc.restaurant_room,
+        is_take_away=table_doc.is_take_away,
+        menu=menu,
+        price_list=restaurant.price_lists.get(menu),
+        tax_template=restaurant.default_tax_template,
+        invoice_series_prefix=restaurant.invoice_series_prefix,
+        aggregator_series_prefix=restaurant.aggregator_series_prefix,
+    )
+
+
+def clear_table_routes(table=None):
+    """drop the cached route of a table, or of every table if none is given"""
+    if table:
+        frappe.cache().hdel(TABLE_ROUTES_CACHE_KEY, table)
+    else:
+        frappe.cache().delete_key(TABLE_ROUTES_CACHE_KEY)
+
+
+def claim_table(table, invoice, invoice_time=None):
+    """Occupy `table` for `invoice` with a single conditional UPDATE.
+
+    The claim only succeeds while the table is free or already held by the
+    same invoice; concurrent claims are serialized on the table row and the
+    loser gets a Conflict result.
+    """
+    return update_table_state(
+        table,
+        "occupied = 1, current_invoice = %(invoice)s, latest_invoice_time = %(invoice_time)s",
+        "(occupied = 0 OR current_invoice = %(invoice)s OR IFNULL(current_invoice, '') = '')",
+        {"invoice": invoice, "invoice_time": invoice_time},
+    )
+
+
+def release_table(table, invoice=None):
+    """Free `table`, only if it is held by `invoice` when one is given."""
+    conditions = "1 = 1"
+    if invoice:
+        conditions = "(current_invoice = %(invoice)s OR IFNULL(current_invoice, '') = '')"
+
+    return update_table_state(
+        table,
+        "occupied = 0, current_invoice = NULL, latest_invoice_time = NULL",
+        conditions,
+        {"invoice": invoice},
+    )
+
+
+def transfer_table(table, new_table, invoice, invoice_time=None):
+    """Move `invoice` from `table` to `new_table`, claiming the new table first."""
+    result = claim_table(new_table, invoice, invoice_time)
+    if result.status == "Success":
+        release_table(table, invoice)
+
+    return result
+
+
+def update_table_state(table, changes, conditions, values):
+    # lock the row so the version read before and after belongs to this UPDATE alone
+    version = frappe.db.sql(
+        "SELECT state_version FROM `tabURY Table` WHERE name = %s FOR UPDATE", table
+    )
+    if not version:
+        return frappe._dict(status="Conflict", table=table)
+
+    frappe.db.sql(
+        """
+        UPDATE `tabURY Table`
+        SET {changes}, state_version = state_version + 1, modified = %(modified)s
+        WHERE name = %(table)s AND {conditions}
+        """.format(changes=changes, conditions=conditions),
+        dict(values, table=table, modified=frappe.utils.now()),
+    )
+
+    state = frappe.db.get_value(
+        "URY Table", table, ["occupied", "current_invoice", "state_version"], as_dict=True
+    )
+    if state.state_version != version[0][0]:
+        return frappe._dict(status="Success", table=table)
+
+    return frappe._dict(status="Conflict", table=table, **state)
+
+
+def get_board_tables(filters, values):
+    """returns tables with their active invoice in one query"""
+    tables = frappe.db.sql(
+        """
+        SELECT
+            t.name, t.occupied, t.latest_invoice_time, t.is_take_away,
+            t.restaurant_room, t.branch, t.current_invoice, t.state_version,
+            inv.name AS table_invoice,
+            COALESCE(inv.custom_is_confirmed, 0) AS custom_is_confirmed
+        FROM `tabURY Table` AS t
+        LEFT JOIN `tabPOS Invoice` AS inv
+            ON inv.restaurant_table = t.name
+            AND inv.docstatus = 0
+            AND inv.invoice_printed = 0
+        WHERE {filters}
+        ORDER BY t.name
+        """.format(filters=filters),
+        values,
+        as_dict=True,
+    )
+
+    # a table should hold a single active invoice, keep the first one if not
+    board = {}
+    for table in tables:
+        board.setdefault(table.name, table)
+
+    return list(board.values())
+
+
+def get_room_board(branch, room):
+    """returns the tables of a room along with the current board version"""
+    tables = get_board_tables(
+        "t.branch = %(branch)s AND t.restaurant_room = %(room)s",
+        {"branch": branch, "room": room},
+    )
+    return {"room": room, "version": get_board_version(room), "tables": tables}
+
+
+def get_board_version(room):
+    version = frappe.cache().get(board_version_key(room))
+    return int(version) if version else 0
+
+
+def bump_board_version(room):
+    return frappe.cache().incr(board_version_key(room))
+
+
+def board_version_key(room):
+    return frappe.cache().make_key("ury_board_version:{}".format(room))
+
+
+def publish_table_update(*tables):
+    """push the current state of the given tables to their room's channel"""
+    tables = [table for table in tables if table]
+    if not tables:
+        return
+
+    rows = get_board_tables("t.name IN %(tables)s", {"tables": tables})
+
+    rooms = {}
+    for row in rows:
+        rooms.setdefault((row.branch, row.restaurant_room), []).append(row)
+
+    for (branch, room), room_rows in rooms.items():
+        board_channel = "{}_{}_{}".format("table_update", branch, room)
+        publish(
+            board_channel,
+            {"room": room, "version": bump_board_version(room), "tables": room_rows},
+            merge=True,
+            branch=branch,
+        )
@@ -0,0 +1,14 @@
+from ury.ury_pos.api import clear_branch_users, clear_terminal_bootstrap, clear_user_context
+
+
+# URY User rows live in Branch, any change can move users between branches
+def on_update(doc, method):
+    clear_user_context()
+    clear_terminal_bootstrap()
+    clear_branch_users(doc.name)
+
+
+def on_trash(doc, method):
+    clear_user_context()
+    clear_terminal_bootstrap()
+    clear_branch_users(doc.name)
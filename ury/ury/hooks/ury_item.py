@@ -1,11 +1,94 @@
 import frappe
+from ury.ury.doctype.ury_menu.ury_menu import clear_menu_snapshot
+
+
+ITEM_NAME_SYNC_QUEUE_CACHE_KEY = "ury_item_name_sync_queue"
+ITEM_NAME_SYNC_SCHEDULED_CACHE_KEY = "ury_item_name_sync_scheduled"
 
 
 def validate(doc,method):
     update_menu_item(doc,method)
-    
-    
+
+
 def update_menu_item(doc, event):
-    menu_items = frappe.get_all('URY Menu Item', filters={'item': doc.item_code})
-    for menu_item in menu_items:
-        frappe.db.set_value('URY Menu Item', menu_item.name, 'item_name', doc.item_name)
\ No newline at end of file
+    if doc.is_new():
+        return
+
+    name_changed = doc.has_value_changed("item_name")
+    # name and image are part of the compiled menu snapshot
+    if not name_changed and not doc.has_value_changed("image"):
+        return
+
+    if frappe.flags.in_import:
+        # a data import saves items one by one, let one job catch up with all of them
+        queue_menu_item_sync(doc.item_code)
+        return
+
+    if name_changed:
+        frappe.db.sql(
+            """
+            UPDATE `tabURY Menu Item`
+            SET item_name = %s
+            WHERE item = %s AND parenttype = 'URY Menu'
+            """,
+            (doc.item_name, doc.item_code),
+        )
+
+    clear_item_menus([doc.item_code])
+
+
+def queue_menu_item_sync(item_code):
+    cache = frappe.cache()
+    cache.rpush(ITEM_NAME_SYNC_QUEUE_CACHE_KEY, item_code)
+
+    # one job per burst, it drains whatever was queued until it runs
+    if cache.set(cache.make_key(ITEM_NAME_SYNC_SCHEDULED_CACHE_KEY), 1, nx=True, ex=10 * 60):
+        frappe.enqueue(
+            "ury.ury.hooks.ury_item.sync_menu_item_names",
+            queue="long",
+            enqueue_after_commit=True,
+        )
+
+
+def sync_menu_item_names():
+    """copy the names of queued items into the menus, in one UPDATE per batch"""
+    cache = frappe.cache()
+    # items queued from here on schedule their own job
+    cache.delete_value(ITEM_NAME_SYNC_SCHEDULED_CACHE_KEY)
+
+    while True:
+        items = set()
+        while len(items) < 500:
+            item = cache.lpop(ITEM_NAME_SYNC_QUEUE_CACHE_KEY)
+            if not item:
+                break
+            items.add(frappe.safe_decode(item))
+
+        if not items:
+            break
+
+        frappe.db.sql(
+            """
+            UPDATE `tabURY Menu Item` AS mi
+            JOIN `tabItem` AS i ON i.name = mi.item
+            SET mi.item_name = i.item_name
+            WHERE mi.item IN %s AND mi.parenttype = 'URY Menu'
+                AND mi.item_name != i.item_name
+            """,
+            [tuple(items)],
+        )
+        frappe.db.commit()
+
+        clear_item_menus(items)
+
+
+def clear_item_menus(items):
+    for menu in frappe.db.sql_list(
+        """
+        SELECT DISTINCT parent
+        FROM `tabURY Menu Item`
+        WHERE item IN %s AND parenttype = 'URY Menu'
+        """,
+        [tuple(items)],
+    ):
+        clear_menu_snapshot(menu)
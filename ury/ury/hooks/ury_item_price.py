@@ -0,0 +1,14 @@
+from ury.ury.doctype.ury_menu.ury_menu import clear_price_list_rates_after_commit
+
+
+def on_update(doc, method):
+    clear_price_list_rates_after_commit(doc.price_list)
+
+    # the row may have been moved to another price list
+    previous = doc.get_doc_before_save()
+    if previous and previous.price_list != doc.price_list:
+        clear_price_list_rates_after_commit(previous.price_list)
+
+
+def on_trash(doc, method):
+    clear_price_list_rates_after_commit(doc.price_list)
@@ -1,26 +1,48 @@
 import frappe
 from datetime import datetime
 from frappe.utils import now_datetime, get_time,now
+from ury.ury.doctype.ury_customer_favourite_item.ury_customer_favourite_item import (
+    update_customer_favourites,
+)
+from ury.ury.doctype.ury_restaurant.ury_restaurant import get_restaurant_route
+from ury.ury.doctype.ury_table.ury_table import publish_table_update, release_table
+from ury.instrumentation import instrumented
+from ury.realtime import publish
 
 
+@instrumented
 def before_insert(doc, method):
     pos_invoice_naming(doc, method)
     order_type_update(doc, method)
     restrict_existing_order(doc, method)
 
 
+@instrumented
 def validate(doc, method):
     validate_invoice(doc, method)
     validate_customer(doc, method)
     validate_price_list(doc, method)
 
 
+@instrumented
 def before_submit(doc, method):
     calculate_and_set_times(doc, method)
     validate_invoice_print(doc, method)
     ro_reload_submit(doc, method)
 
 
+@instrumented
+def on_submit(doc, method):
+    update_customer_favourites(doc)
+
+
+@instrumented
+def on_cancel(doc, method):
+    table_status_delete(doc, method)
+    update_customer_favourites(doc, cancel=True)
+
+
+@instrumented
 def on_trash(doc, method):
     table_status_delete(doc, method)
 
@@ -69,26 +91,19 @@ def validate_invoice_print(doc, method):
 
 def table_status_delete(doc, method):
     if doc.restaurant_table:
-        frappe.db.set_value(
-            "URY Table",
-            doc.restaurant_table,
-            {"occupied": 0, "latest_invoice_time": None},
-        )
+        release_table(doc.restaurant_table, doc.name)
+        publish_table_update(doc.restaurant_table)
 
 
 def pos_invoice_naming(doc, method):
-    pos_profile = frappe.get_doc("POS Profile", doc.pos_profile)
-    restaurant = pos_profile.restaurant
-
     if not doc.restaurant_table:
-        doc.naming_series = frappe.db.get_value(
-            "URY Restaurant", restaurant, "invoice_series_prefix"
-        )
+        restaurant = frappe.db.get_value("POS Profile", doc.pos_profile, "restaurant")
+        route = get_restaurant_route(restaurant) or frappe._dict()
+
+        doc.naming_series = route.invoice_series_prefix
         
         if doc.order_type == "Aggregators":
-            doc.naming_series = frappe.db.get_value(
-                "URY Restaurant", restaurant, "aggregator_series_prefix"
-            )
+            doc.naming_series = route.aggregator_series_prefix
     
 
 
@@ -106,31 +121,14 @@ def order_type_update(doc, method):
     
 
 
-# reload restaurant order page if submitted invoice is open there
+# reload restaurant order page if submitted invoice is open there, only the pages
+# subscribed to the invoice's room receive it
 def ro_reload_submit(doc, method):
-    frappe.publish_realtime("reload_ro", {"name": doc.name})
+    publish("reload_ro", {"name": doc.name}, doctype=doc.doctype, docname=doc.name)
 
 
 def validate_price_list(doc, method):
-        
     if doc.restaurant:
-        
-        if doc.restaurant_table:
-            room = frappe.db.get_value("URY Table", doc.restaurant_table, "restaurant_room")
-            menu_name = (
-                frappe.db.get_value("URY Restaurant", doc.restaurant, "active_menu")
-                if not frappe.db.get_value(
-                    "URY Restaurant", doc.restaurant, "room_wise_menu"
-                )
-                else frappe.db.get_value(
-                    "Menu for Room", {"parent": doc.restaurant, "room": room}, "menu"
-                )
-            )
-
-            doc.selling_price_list = frappe.db.get_value(
-                "Price List", dict(restaurant_menu=menu_name, enabled=1)
-            )
-        
         if doc.order_type == "Aggregators":
             price_list = frappe.db.get_value("Aggregator Settings",
                 {"customer": doc.customer, "parent": doc.branch, "parenttype": "Branch"},
@@ -143,11 +141,9 @@ def validate_price_list(doc, method):
             doc.selling_price_list = price_list
             
         else:
-            menu_name = frappe.db.get_value("URY Restaurant", doc.restaurant, "active_menu") 
-
-            doc.selling_price_list = frappe.db.get_value(
-                "Price List", dict(restaurant_menu=menu_name, enabled=1)
-            )
+            # orders are priced from the restaurant's active menu, table or not
+            route = get_restaurant_route(doc.restaurant) or frappe._dict(price_lists={})
+            doc.selling_price_list = route.price_lists.get(route.active_menu)
             
 
 def restrict_existing_order(doc, event):
@@ -1,5 +1,7 @@
 import frappe
 from frappe import _, msgprint
+from ury.ury.api.escpos import clear_receipt_logos
+from ury.ury_pos.api import clear_terminal_bootstrap, clear_user_context
 
 
 def validate(doc, method):
@@ -7,6 +9,17 @@ def validate(doc, method):
     validate_cost_center(doc, method)
 
 
+def on_update(doc, method):
+    clear_user_context()
+    clear_terminal_bootstrap()
+    clear_receipt_logos()
+
+
+def on_trash(doc, method):
+    clear_user_context()
+    clear_terminal_bootstrap()
+
+
 def validate_bill_check(doc, method):
     for row in doc.printer_settings:
         if not row.bill or not row.printer:
@@ -0,0 +1,10 @@
+from ury.ury.doctype.ury_restaurant.ury_restaurant import clear_routes
+
+
+# restaurant and table routes carry the price list of each menu
+def on_update(doc, method):
+    clear_routes()
+
+
+def on_trash(doc, method):
+    clear_routes()
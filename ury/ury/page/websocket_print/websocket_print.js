@@ -1,3 +1,5 @@
+const PRINT_JOB_API = 'ury.ury.doctype.ury_print_job.ury_print_job';
+
 frappe.pages['websocket-print'].on_page_load = function (wrapper) {
 	var page = frappe.ui.make_app_page({
 		parent: wrapper,
@@ -8,13 +10,31 @@ frappe.pages['websocket-print'].on_page_load = function (wrapper) {
 		method: 'ury.ury_pos.api.getBranch',
 		callback: function (r) {
 			const branch = r.message;
+			const station = get_station(branch);
 			const print_channel = `print_${branch}`;
+
+			page.set_title(__('Websocket Print') + ` - ${station}`);
+			page.set_secondary_action(__('Set Station'), () => {
+				frappe.prompt(
+					{ fieldname: 'station', fieldtype: 'Data', label: __('Station'), default: station, reqd: 1 },
+					(values) => {
+						localStorage.setItem('ury_print_station', values.station);
+						window.location.reload();
+					}
+				);
+			});
+
 			frappe.realtime.on(print_channel, (data) => {
-				if (!(data.data.name in localStorage)) {
-					get_print_html(set_preview, wrapper, data.data.doctype, data.data.name, data.data.print_format)
-					localStorage.setItem(data.data.name, '')
+				if (data.job) {
+					print_job(wrapper, station, data.job, data.station);
 				}
-			})
+			});
+
+			// pick up jobs queued while this station was offline or missed an event
+			const fetch_pending = () => fetch_pending_jobs(wrapper, branch, station);
+			fetch_pending();
+			frappe.realtime.socket && frappe.realtime.socket.on('connect', fetch_pending);
+			setInterval(fetch_pending, 30000);
 		}
 	})
 
@@ -23,7 +43,44 @@ frappe.pages['websocket-print'].on_page_load = function (wrapper) {
 frappe.pages['websocket-print'].refresh = function (wrapper) {
 }
 
-let get_print_html = function (set_preview, wrapper, doc, name, print_format) {
+let get_station = function (branch) {
+	return localStorage.getItem('ury_print_station') || branch;
+};
+
+let fetch_pending_jobs = function (wrapper, branch, station) {
+	frappe.call({
+		method: `${PRINT_JOB_API}.get_pending_print_jobs`,
+		args: { branch: branch, station: station },
+		callback: function (r) {
+			(r.message || []).forEach(job => print_job(wrapper, station, job.job, job.station));
+		}
+	});
+};
+
+let print_job = function (wrapper, station, job, target_station) {
+	if (target_station && target_station != station) {
+		return;
+	}
+	// only the station that claims the job prints it
+	frappe.call({
+		method: `${PRINT_JOB_API}.claim_print_job`,
+		args: { job: job, station: station },
+		callback: function (r) {
+			if (!r.message) {
+				return;
+			}
+			const claimed = r.message;
+			get_print_html(set_preview, wrapper, claimed.reference_doctype, claimed.reference_name, claimed.print_format, () => {
+				frappe.call({
+					method: `${PRINT_JOB_API}.acknowledge_print_job`,
+					args: { job: job, station: station }
+				});
+			});
+		}
+	});
+};
+
+let get_print_html = function (set_preview, wrapper, doc, name, print_format, after_print) {
 	this._req = frappe.call({
 		method: "frappe.www.printview.get_html_and_style",
 		args: {
@@ -34,6 +91,7 @@ let get_print_html = function (set_preview, wrapper, doc, name, print_format) {
 		},
 		callback: function (r) {
 			set_preview(r, wrapper);
+			after_print && after_print();
 		},
 	});
 };
@@ -52,7 +110,6 @@ const set_preview = function (val = null, wrapper) {
 	iframe.contentWindow.document.close()
 
 	// print_wrapper.html(iframe)
-	console.log(val.message.html)
 	iframe.contentWindow.print();
 	iframe.parentNode.removeChild(iframe);
-}
\ No newline at end of file
+}
@@ -0,0 +1,26 @@
+// Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["URY Endpoint Performance"] = {
+	filters: [
+		{
+			fieldname: "branch",
+			label: __("Branch"),
+			fieldtype: "Link",
+			options: "Branch",
+		},
+		{
+			fieldname: "method",
+			label: __("Method"),
+			fieldtype: "Data",
+		},
+	],
+
+	onload: function (report) {
+		report.page.add_inner_button(__("Reset"), function () {
+			frappe.confirm(__("Clear all collected metrics?"), function () {
+				frappe.call("ury.instrumentation.reset_metrics").then(() => report.refresh());
+			});
+		});
+	},
+};
@@ -0,0 +1,64 @@
+# Copyright (c) 2026, Tridz Technologies Pvt. Ltd and contributors
+# For license information, please see license.txt
+
+from frappe import _
+from frappe.utils import flt
+
+from ury.instrumentation import (
+	DURATION_BUCKETS_MS,
+	QUERY_BUCKETS,
+	get_percentile,
+	get_series_stats,
+)
+
+
+def execute(filters=None):
+	filters = filters or {}
+	return get_columns(), get_data(filters)
+
+
+def get_columns():
+	return [
+		{"fieldname": "method", "label": _("Method"), "fieldtype": "Data", "width": 360},
+		{"fieldname": "branch", "label": _("Branch"), "fieldtype": "Link", "options": "Branch", "width": 140},
+		{"fieldname": "calls", "label": _("Calls"), "fieldtype": "Int", "width": 90},
+		{"fieldname": "avg_ms", "label": _("Avg (ms)"), "fieldtype": "Float", "precision": 1, "width": 100},
+		{"fieldname": "p50_ms", "label": _("p50 (ms)"), "fieldtype": "Float", "precision": 1, "width": 100},
+		{"fieldname": "p95_ms", "label": _("p95 (ms)"), "fieldtype": "Float", "precision": 1, "width": 100},
+		{"fieldname": "p99_ms", "label": _("p99 (ms)"), "fieldtype": "Float", "precision": 1, "width": 100},
+		{"fieldname": "avg_queries", "label": _("Avg Queries"), "fieldtype": "Float", "precision": 1, "width": 110},
+		{"fieldname": "p95_queries", "label": _("p95 Queries"), "fieldtype": "Float", "precision": 1, "width": 110},
+		{"fieldname": "avg_sql_ms", "label": _("Avg SQL (ms)"), "fieldtype": "Float", "precision": 1, "width": 110},
+		{"fieldname": "cache_hit_ratio", "label": _("Cache Hit %"), "fieldtype": "Percent", "width": 110},
+	]
+
+
+def get_data(filters):
+	data = []
+	for row in get_series_stats():
+		if filters.get("branch") and row.branch != filters.get("branch"):
+			continue
+		if filters.get("method") and filters.get("method") not in row.method:
+			continue
+		if not row.calls:
+			continue
+
+		data.append(
+			{
+				"method": row.method,
+				"branch": row.branch,
+				"calls": row.calls,
+				"avg_ms": row.wall_us / row.calls / 1000,
+				"p50_ms": get_percentile(row.wall_buckets, DURATION_BUCKETS_MS, 0.5),
+				"p95_ms": get_percentile(row.wall_buckets, DURATION_BUCKETS_MS, 0.95),
+				"p99_ms": get_percentile(row.wall_buckets, DURATION_BUCKETS_MS, 0.99),
+				"avg_queries": flt(row.sql_count) / row.calls,
+				"p95_queries": get_percentile(row.sql_buckets, QUERY_BUCKETS, 0.95),
+				"avg_sql_ms": row.sql_us / row.calls / 1000,
+				"cache_hit_ratio": (
+					100 * (row.cache_calls - row.cache_misses) / row.cache_calls if row.cache_calls else None
+				),
+			}
+		)
+
+	return sorted(data, key=lambda row: row["p95_ms"], reverse=True)
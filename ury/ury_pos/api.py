@@ -1,7 +1,20 @@
+import hashlib
+
 import frappe
 from frappe import _
-from datetime import date, datetime, timedelta
-from frappe.utils import now_datetime
+from datetime import date, timedelta
+from frappe.utils import get_datetime, now_datetime
+from ury.utils import is_not_modified
+from ury.ury.doctype.ury_customer_favourite_item.ury_customer_favourite_item import (
+    get_customer_favourites,
+)
+from ury.ury.doctype.ury_menu.ury_menu import get_menu_snapshot
+from ury.ury.doctype.ury_table.ury_table import get_room_board
+
+
+USER_CONTEXT_CACHE_KEY = "ury_user_context"
+TERMINAL_BOOTSTRAP_CACHE_KEY = "ury_terminal_bootstrap"
+BRANCH_USERS_CACHE_KEY = "ury_branch_users"
 
 
 @frappe.whitelist()
@@ -33,22 +46,15 @@ def get_table_invoice(table):
 @frappe.whitelist()
 def getTable(room):
     branch_name = getBranch()   
-    tables = frappe.get_all(
-        "URY Table",
-        fields=["name", "occupied", "latest_invoice_time", "is_take_away", "restaurant_room"],
-        filters={"branch": branch_name,"restaurant_room":room,}
-    )
+    return get_room_board(branch_name, room)["tables"]
 
-    for table in tables:
-        table_invoice = get_table_invoice(table.name)
-        if table_invoice:
-            table.table_invoice = table_invoice[0]
-            table.custom_is_confirmed = table_invoice[1]
-        else:
-            table.table_invoice = None
-            table.custom_is_confirmed = 0
 
-    return tables
+@frappe.whitelist()
+def getRoomBoard(room):
+    """returns the room's tables with their active invoice and the board version,
+    later changes are pushed on the `table_update_{branch}_{room}` channel"""
+    branch_name = getBranch()
+    return get_room_board(branch_name, room)
 
 
 #########################################################################################
@@ -57,88 +63,146 @@ def get_order_status(table, invoice):
     if not table or not invoice:
         frappe.throw("Both 'table' and 'invoice' parameters are required.")
 
-    orders = frappe.get_all(
-        "URY KOT",
-        filters={"restaurant_table": table, "invoice": invoice},
-        fields=[
-            "name",
-            "order_status",
-            "restaurant_table",
-            "invoice",
-            "preparation_time",
-            "start_time_prep",
-            "date",
-            "type"
-        ]
-    )
+    result = get_kot_status(
+        "k.restaurant_table = %(table)s AND k.invoice = %(invoice)s",
+        {"table": table, "invoice": invoice},
+    )["orders"]
 
-    if not orders:
+    if not result:
         return {"error": "No matching orders found"}
 
-    result = []
-    for order in orders:
-        start_time_prep = order.get("start_time_prep")
-        elapsed_time = 0
-        remaining_time = 0
-
-        if start_time_prep:
-            full_start_time = f"{order.get('date')} {start_time_prep}"
-            try:
-                start_time_prep = frappe.utils.get_datetime(full_start_time)
-            except Exception as e:
-                frappe.log_error(f"Error parsing datetime: {e}")
-                start_time_prep = None
-
-            if isinstance(start_time_prep, datetime):
-                now = frappe.utils.now_datetime()
-                delta = now - start_time_prep
-                elapsed_time = delta.total_seconds() / 60
-                remaining_time = max(order.get("preparation_time", 0) - elapsed_time, 0)
-
-        kot_items = frappe.get_all(
-            "URY KOT Items",
-            filters={"parent": order["name"]},
-            fields=["item_name", "quantity", "preparation_time", "striked"]
-        )
+    return result
+
+
+@frappe.whitelist()
+def get_order_status_feed(invoice=None, room=None, since=None):
+    """returns the KOT status of an invoice, or of every open table in a room of the
+    user's branch; with `since` only KOTs changed after that cursor are returned"""
+    if invoice:
+        conditions = "k.invoice = %(invoice)s"
+    elif room:
+        conditions = """k.invoice IN (
+            SELECT inv.name
+            FROM `tabPOS Invoice` AS inv
+            INNER JOIN `tabURY Table` AS t ON t.name = inv.restaurant_table
+            WHERE inv.docstatus = 0 AND t.branch = %(branch)s AND t.restaurant_room = %(room)s
+        )"""
+    else:
+        frappe.throw("Either 'invoice' or 'room' parameter is required.")
+
+    return get_kot_status(
+        conditions,
+        {"invoice": invoice, "room": room, "branch": getBranch() if room else None},
+        since,
+    )
+
+
+def get_kot_status(conditions, values, since=None):
+    """fetches the matching KOTs and their items in one query"""
+    since = since and get_datetime(since)
+    values = dict(values, since=since)
+    if since:
+        # striking an item only touches the child row
+        conditions += """ AND (k.modified > %(since)s OR EXISTS (
+            SELECT 1 FROM `tabURY KOT Items` AS changed
+            WHERE changed.parent = k.name AND changed.modified > %(since)s
+        ))"""
+
+    rows = frappe.db.sql(
+        """
+        SELECT
+            k.name, k.order_status, k.restaurant_table, k.invoice, k.preparation_time,
+            TIMESTAMP(k.date, k.start_time_prep) AS start_time_prep, k.type,
+            k.modified, ki.name AS item_row, ki.item_name, ki.quantity,
+            ki.preparation_time AS item_preparation_time, ki.striked,
+            ki.modified AS item_modified
+        FROM `tabURY KOT` AS k
+        LEFT JOIN `tabURY KOT Items` AS ki ON ki.parent = k.name
+        WHERE {conditions}
+        ORDER BY k.creation, ki.idx
+        """.format(conditions=conditions),
+        values,
+        as_dict=True,
+    )
 
-        all_items_ready = True
-        items_details = []
-
-        for item in kot_items:
-            is_ready = item.get("striked", 0) == 1
-            if not is_ready:
-                all_items_ready = False
-            items_details.append({
-                "item_name": item.get("item_name"),
-                "quantity": item.get("quantity"),
-                "preparation_time": item.get("preparation_time"),
-                "is_ready": is_ready,
+    now = now_datetime()
+    cursor = since
+    orders = {}
+
+    for row in rows:
+        for modified in (row.modified, row.item_modified):
+            if modified and (not cursor or modified > cursor):
+                cursor = modified
+
+        order = orders.get(row.name)
+        if not order:
+            elapsed_time = 0
+            remaining_time = 0
+
+            if row.start_time_prep:
+                elapsed_time = (now - row.start_time_prep).total_seconds() / 60
+                remaining_time = max((row.preparation_time or 0) - elapsed_time, 0)
+
+            order = orders[row.name] = {
+                "order_id": row.name,
+                "table": row.restaurant_table,
+                "invoice": row.invoice,
+                "elapsed_time": round(elapsed_time, 2),
+                "remaining_time": round(remaining_time, 2),
+                "order_status": row.order_status,
+                "items": [],
+                "type": row.type,
+                "isCollapsed": True,
+            }
+
+        if row.item_row:
+            order["items"].append({
+                "item_name": row.item_name,
+                "quantity": row.quantity,
+                "preparation_time": row.item_preparation_time,
+                "is_ready": row.striked == 1,
             })
 
+    for order in orders.values():
+        all_items_ready = all(item["is_ready"] for item in order["items"])
         # overall_status = "Served" if all_items_ready else order.get("order_status")
-        overall_status = "Ready for Serving" if (all_items_ready and order.get("order_status") != "Served") else order.get("order_status")
-
-        result.append({
-            "order_id": order["name"],
-            "table": order["restaurant_table"],
-            "invoice": order["invoice"],
-            "elapsed_time": round(elapsed_time, 2),
-            "remaining_time": round(remaining_time, 2),
-            "order_status": overall_status,
-            "items": items_details,
-            "type": order["type"],
-            "isCollapsed": True,
-        })
+        if all_items_ready and order["order_status"] != "Served":
+            order["order_status"] = "Ready for Serving"
 
-    return result
+    return {"cursor": cursor, "orders": list(orders.values())}
 #########################################################################################
 
 
 @frappe.whitelist()
 def getRestaurantMenu(pos_profile, table=None):
-    menu_items = []
-    menu_items_with_image = []
+    menu = get_restaurant_menu_name(pos_profile, table)
+    if not menu:
+        return []
+
+    return get_menu_snapshot(menu)["items"]
+
+
+@frappe.whitelist()
+def getMenuSnapshot(pos_profile, table=None, aggregator=None):
+    """returns the versioned menu snapshot, or an empty 304 when the client's ETag is current"""
+    if aggregator:
+        menu = get_aggregator_menu_name(aggregator, pos_profile)
+    else:
+        menu = get_restaurant_menu_name(pos_profile, table)
+
+    if not menu:
+        return {"menu": None, "version": None, "items": []}
+
+    snapshot = get_menu_snapshot(menu)
+    if is_not_modified(snapshot["version"]):
+        return
+
+    return snapshot
+
 
+def get_restaurant_menu_name(pos_profile, table=None):
+    """returns the menu served to billing users of the branch, or to the given table"""
+    menu = None
     user_role = frappe.get_roles()
 
     pos_profile = frappe.get_doc("POS Profile", pos_profile)
@@ -153,33 +217,7 @@ def getRestaurantMenu(pos_profile, table=None):
             "URY Restaurant", {"branch": branch_name}, "active_menu"
         )
 
-        if menu:
-            menu_items = frappe.get_all(
-                "URY Menu Item",
-                filters={"parent": menu},
-                fields=["item", "item_name", "rate", "special_dish", "disabled","course", "preparation_time", "parallel_preparation"],
-                order_by="item_name asc",
-            )
-
-            menu_items_with_image = [
-                {
-                    "item": item.item,
-                    "item_name": item.item_name,
-                    "rate": item.rate,
-                    "special_dish": item.special_dish,
-                    "disabled": item.disabled,
-                    "item_imgae": frappe.db.get_value("Item", item.item, "image"),
-                    "course":item.course,
-                    "preparation_time": item.preparation_time,
-                    "parallel_preparation": item.parallel_preparation,
-                }
-                for item in menu_items
-            ]
-
     elif table:
-        if not table:
-            frappe.throw(_("Please select a table"))
-
         restaurant, branch, room = frappe.get_value(
             "URY Table",
             table,
@@ -207,62 +245,27 @@ def getRestaurantMenu(pos_profile, table=None):
                 _("Please set an active menu for Restaurant {0}").format(restaurant)
             )
 
-        else:
-            menu_items = frappe.get_all(
-                "URY Menu Item",
-                filters={"parent": menu},
-                fields=["item", "item_name", "rate", "special_dish", "disabled", "course", "preparation_time", "parallel_preparation"],
-                order_by="item_name asc",
-            )
-            menu_items_with_image = [
-                {
-                    "item": item.item,
-                    "item_name": item.item_name,
-                    "rate": item.rate,
-                    "special_dish": item.special_dish,
-                    "disabled": item.disabled,
-                    "item_imgae": frappe.db.get_value("Item", item.item, "image"),
-                    "course":item.course,
-                    "preparation_time": item.preparation_time,
-                    "parallel_preparation": item.parallel_preparation,
-                }
-                for item in menu_items
-            ]
-    return menu_items_with_image
+    return menu
 
 
 @frappe.whitelist()
 def getBranch():
     user = frappe.session.user
     if user != "Administrator":
-        sql_query = """
-            SELECT b.branch
-            FROM `tabURY User` AS a
-            INNER JOIN `tabBranch` AS b ON a.parent = b.name
-            WHERE a.user = %s
-        """
-        branch_array = frappe.db.sql(sql_query, user, as_dict=True)
-        if not branch_array:
+        branch_name = get_user_context(user).branch
+        if not branch_name:
             frappe.throw("User is not Associated with any Branch.Please refresh Page")
 
-        branch_name = branch_array[0].get("branch")
-
         return branch_name
 
 @frappe.whitelist()
 def getBranchRoom():
     user = frappe.session.user
     if user != "Administrator":
-        sql_query = """
-            SELECT b.branch , a.room
-            FROM `tabURY User` AS a
-            INNER JOIN `tabBranch` AS b ON a.parent = b.name
-            WHERE a.user = %s
-        """
-        branch_array = frappe.db.sql(sql_query, user, as_dict=True)
+        user_context = get_user_context(user)
         
-        branch_name = branch_array[0].get("branch")
-        room_name = branch_array[0].get("room")
+        branch_name = user_context.branch
+        room_name = user_context.room
     
         if not branch_name:
             frappe.throw("Branch information is missing for the user. Please contact your administrator.")
@@ -273,12 +276,94 @@ def getBranchRoom():
         return branch_name,room_name
 
 
+def get_user_context(user=None):
+    """returns the branch, room, POS Profile and restaurant of the user from the shared cache"""
+    user = user or frappe.session.user
+    return frappe._dict(
+        frappe.cache().hget(
+            USER_CONTEXT_CACHE_KEY, user, generator=lambda: build_user_context(user)
+        )
+    )
+
+
+def build_user_context(user):
+    user_context = {"branch": None, "room": None, "pos_profile": None, "restaurant": None}
+
+    branch_array = frappe.db.sql(
+        """
+        SELECT b.branch, a.room
+        FROM `tabURY User` AS a
+        INNER JOIN `tabBranch` AS b ON a.parent = b.name
+        WHERE a.user = %s
+        """,
+        user,
+        as_dict=True,
+    )
+    if not branch_array:
+        return user_context
+
+    user_context["branch"] = branch_array[0].get("branch")
+    user_context["room"] = branch_array[0].get("room")
+
+    pos_profile = frappe.db.get_value(
+        "POS Profile", {"branch": user_context["branch"]}, ["name", "restaurant"], as_dict=True
+    )
+    if pos_profile:
+        user_context["pos_profile"] = pos_profile.name
+        user_context["restaurant"] = pos_profile.restaurant
+
+    return user_context
+
+
+def clear_user_context(user=None):
+    """drop the cached context of a user, or of every user if none is given"""
+    if user:
+        frappe.cache().hdel(USER_CONTEXT_CACHE_KEY, user)
+    else:
+        frappe.cache().delete_key(USER_CONTEXT_CACHE_KEY)
+
+
+def get_branch_users(branch):
+    """returns the users assigned to a branch, from the shared cache"""
+    return frappe.cache().hget(
+        BRANCH_USERS_CACHE_KEY,
+        branch,
+        generator=lambda: frappe.db.sql_list(
+            """
+            SELECT DISTINCT user
+            FROM `tabURY User`
+            WHERE parent = %s AND parenttype = 'Branch'
+            """,
+            branch,
+        ),
+    )
+
+
+def clear_branch_users(branch=None):
+    """drop the cached users of a branch, or of every branch if none is given"""
+    if branch:
+        frappe.cache().hdel(BRANCH_USERS_CACHE_KEY, branch)
+    else:
+        frappe.cache().delete_key(BRANCH_USERS_CACHE_KEY)
+
+
+def clear_terminal_bootstrap(user=None):
+    """drop the cached terminal bootstrap of a user, or of every user if none is given"""
+    if user:
+        frappe.cache().hdel(TERMINAL_BOOTSTRAP_CACHE_KEY, user)
+    else:
+        frappe.cache().delete_key(TERMINAL_BOOTSTRAP_CACHE_KEY)
+
+
 @frappe.whitelist()
 def getModeOfPayment():
-    posDetails = getPosProfile()
-    posProfile = posDetails["pos_profile"]
-    posProfiles = frappe.get_doc("POS Profile", posProfile)
-    mode_of_payments = posProfiles.payments
+    getBranch()  # raises for users without a branch
+    mode_of_payments = frappe.get_all(
+        "POS Payment Method",
+        filters={"parent": get_user_context().pos_profile, "parenttype": "POS Profile"},
+        fields=["mode_of_payment"],
+        order_by="idx",
+    )
     modeOfPayments = []
     for mop in mode_of_payments:
         modeOfPayments.append(
@@ -287,111 +372,85 @@ def getModeOfPayment():
     return modeOfPayments
 
 
+INVOICE_LIST_FIELDS = """
+    name, invoice_printed, custom_is_confirmed, grand_total, restaurant_table,
+    cashier, waiter, net_total, posting_time,
+    total_taxes_and_charges, customer, status,
+    posting_date, rounded_total, order_type, modified
+"""
+
+# list bucket -> (invoice status, extra conditions)
+INVOICE_LIST_BUCKETS = {
+    "Draft": (
+        "Draft",
+        "(invoice_printed = 1 OR (invoice_printed = 0 AND COALESCE(restaurant_table, '') = ''))",
+    ),
+    "Unconfirmed": (
+        "Draft",
+        "(invoice_printed = 0 AND restaurant_table IS NOT NULL AND custom_is_confirmed = 0)",
+    ),
+    "Unbilled": (
+        "Draft",
+        "(invoice_printed = 0 AND restaurant_table IS NOT NULL AND custom_is_confirmed = 1)",
+    ),
+    "Recently Paid": ("Paid", None),
+}
+
+
 @frappe.whitelist()
-def getPosInvoice(status, limit, limit_start):
+def getPosInvoice(status, limit, limit_start=0, cursor=None):
+    """returns a page of invoices for a list bucket
+
+    pass back `next_cursor` as `cursor` to fetch the next page; `limit_start`
+    is still honoured for clients that page by offset
+    """
     branch = getBranch()
-    updatedlist = []
-    limit = int(limit)+1
-    limit_start = int(limit_start)
-    if status == "Draft":
-        invoices = frappe.db.sql(
-            """
-            SELECT 
-                name, invoice_printed, grand_total, restaurant_table, 
-                cashier, waiter, net_total, posting_time, 
-                total_taxes_and_charges, customer, status, 
-                posting_date, rounded_total, order_type 
-            FROM `tabPOS Invoice` 
-            WHERE branch = %s AND status = %s 
-            AND (invoice_printed = 1 OR (invoice_printed = 0 AND COALESCE(restaurant_table, '') = ''))
-            ORDER BY modified desc
-            LIMIT %s OFFSET %s
-            """,
-            (branch, status, limit,limit_start),
-            as_dict=True,
-        )
-        updatedlist.extend(invoices)
-    elif status == "Unconfirmed":
-        docstatus = "Draft"
-        invoices = frappe.db.sql(
-            """
-            SELECT 
-                name, invoice_printed, custom_is_confirmed, grand_total, restaurant_table, 
-                cashier, waiter, net_total, posting_time, 
-                total_taxes_and_charges, customer, status, 
-                posting_date, rounded_total, order_type 
-            FROM `tabPOS Invoice` 
-            WHERE branch = %s AND status = %s 
-            AND (invoice_printed = 0 AND restaurant_table IS NOT NULL AND custom_is_confirmed = 0)
-            ORDER BY modified desc
-            LIMIT %s OFFSET %s
-            """,
-            (branch, docstatus, limit, limit_start),
-            as_dict=True,
-        )
-        updatedlist.extend(invoices)
-    elif status == "Unbilled":
-        docstatus = "Draft"
-        invoices = frappe.db.sql(
-            """
-            SELECT 
-                name, invoice_printed, custom_is_confirmed, grand_total, restaurant_table, 
-                cashier, waiter, net_total, posting_time, 
-                total_taxes_and_charges, customer, status, 
-                posting_date, rounded_total, order_type 
-            FROM `tabPOS Invoice` 
-            WHERE branch = %s AND status = %s 
-            AND (invoice_printed = 0 AND restaurant_table IS NOT NULL AND custom_is_confirmed = 1)
-            ORDER BY modified desc
-            LIMIT %s OFFSET %s
-            """,
-            (branch, docstatus, limit, limit_start),
-            as_dict=True,
-        )
-        updatedlist.extend(invoices)
-    elif status == "Recently Paid":
-        docstatus = "Paid"
-        invoices = frappe.db.sql(
-            """
-            SELECT 
-                name, invoice_printed, grand_total, restaurant_table, 
-                cashier, waiter, net_total, posting_time, 
-                total_taxes_and_charges, customer, status, 
-                posting_date, rounded_total, order_type 
-            FROM `tabPOS Invoice` 
-            WHERE branch = %s AND status = %s 
-            ORDER BY modified desc
-            LIMIT %s OFFSET %s
-            """,
-            (branch, docstatus, limit, limit_start),
-            as_dict=True,
+    limit = int(limit)
+    cursor = frappe.parse_json(cursor) if cursor else None
+
+    invoice_status, bucket_conditions = INVOICE_LIST_BUCKETS.get(status, (status, None))
+    conditions = ["branch = %(branch)s", "status = %(status)s"]
+    values = {"branch": branch, "status": invoice_status, "limit": limit + 1}
+
+    if bucket_conditions:
+        conditions.append(bucket_conditions)
+
+    if cursor:
+        # keyset on (modified, name) walks the branch/status/modified index
+        conditions.append(
+            "(modified < %(cursor_modified)s OR (modified = %(cursor_modified)s AND name < %(cursor_name)s))"
         )
-        updatedlist.extend(invoices)    
+        values.update(cursor_modified=cursor.get("modified"), cursor_name=cursor.get("name"))
+        offset = ""
     else:
-        
-        invoices = frappe.db.sql(
-            """
-            SELECT 
-                name, invoice_printed, grand_total, restaurant_table, 
-                cashier, waiter, net_total, posting_time, 
-                total_taxes_and_charges, customer, status, 
-                posting_date, rounded_total, order_type 
-            FROM `tabPOS Invoice` 
-            WHERE branch = %s AND status = %s 
-            ORDER BY modified desc
-            LIMIT %s OFFSET %s
-            """,
-            (branch, status, limit, limit_start),
-            as_dict=True,
-        )
+        values["limit_start"] = int(limit_start or 0)
+        offset = "OFFSET %(limit_start)s"
 
-        updatedlist.extend(invoices)
-    if len(updatedlist) == limit and status != "Recently Paid":
-            next = True
-            updatedlist.pop()
-    else:
-            next = False   
-    return  { "data":updatedlist,"next":next}
+    updatedlist = frappe.db.sql(
+        """
+        SELECT {fields}
+        FROM `tabPOS Invoice`
+        WHERE {conditions}
+        ORDER BY modified desc, name desc
+        LIMIT %(limit)s {offset}
+        """.format(fields=INVOICE_LIST_FIELDS, conditions=" AND ".join(conditions), offset=offset),
+        values,
+        as_dict=True,
+    )
+
+    has_more = len(updatedlist) > limit
+    if has_more:
+        updatedlist.pop()
+
+    next_cursor = None
+    if has_more:
+        last = updatedlist[-1]
+        next_cursor = {"modified": str(last.modified), "name": last.name}
+
+    # offset clients never paged past the first page of paid invoices
+    next = has_more and (bool(cursor) or status != "Recently Paid")
+
+    return {"data": updatedlist, "next": next, "next_cursor": next_cursor}
 
 
 @frappe.whitelist()
@@ -442,32 +501,14 @@ def getDefaultTableForOrderType(type):
 
 
 @frappe.whitelist()
-def fav_items(customer):
-    pos_invoices = frappe.get_all(
-        "POS Invoice", filters={"customer": customer}, fields=["name"]
-    )
-    item_qty = {}
-
-    for invoice in pos_invoices:
-        pos_invoice = frappe.get_doc("POS Invoice", invoice.name)
-        for item in pos_invoice.items:
-            item_name = item.item_name
-            qty = item.qty
-            if item_name not in item_qty:
-                item_qty[item_name] = 0
-            item_qty[item_name] += qty
-
-    favorite_items = [
-        {"item_name": item_name, "qty": qty} for item_name, qty in item_qty.items()
-    ]
-    return favorite_items
+def fav_items(customer, limit=None):
+    return get_customer_favourites(customer, limit=limit)
 
 
 @frappe.whitelist()
 def getRestaurantName():
-    branchName = getBranch()
-    posProfile = frappe.db.exists("POS Profile", {"branch": branchName})
-    pos_profile_restaurant_name = frappe.db.get_value("POS Profile", posProfile, "restaurant")
+    getBranch()  # raises for users without a branch
+    pos_profile_restaurant_name = get_user_context().restaurant
     pos_profile_restaurant_image = frappe.db.get_value("URY Restaurant", pos_profile_restaurant_name, "image")
 
     return {"name": pos_profile_restaurant_name, "image": pos_profile_restaurant_image}
@@ -475,9 +516,8 @@ def getRestaurantName():
 
 @frappe.whitelist()
 def getDefaultCustomer():
-    branchName = getBranch()
-    posProfile = frappe.db.exists("POS Profile", {"branch": branchName})
-    pos_profile_customer = frappe.db.get_value("POS Profile", posProfile, "customer")
+    getBranch()  # raises for users without a branch
+    pos_profile_customer = frappe.db.get_value("POS Profile", get_user_context().pos_profile, "customer")
 
     return {'default_customer': pos_profile_customer}
 
@@ -574,8 +614,53 @@ def get_ury_kot_by_invoice_number(invoice_number, type=None):
     return {'ury_kots': ury_kots, 'kitchen_controller_roles': kitchen_controller_roles}
 
 
+@frappe.whitelist()
+def getTerminalBootstrap():
+    """returns everything the order page loads on start in one payload, or an empty
+    304 when the client's ETag is current"""
+    from ury.ury.doctype.ury_order.ury_order import pos_opening_check
+
+    bootstrap = frappe.cache().hget(
+        TERMINAL_BOOTSTRAP_CACHE_KEY, frappe.session.user, generator=build_terminal_bootstrap
+    )
+    # opening entries change through the day, they are never cached
+    bootstrap = dict(bootstrap, pos_opening=pos_opening_check())
+
+    version = hashlib.md5(frappe.as_json(bootstrap).encode("utf-8")).hexdigest()
+    if is_not_modified(version):
+        return
+
+    bootstrap["version"] = version
+    return bootstrap
+
+
+def build_terminal_bootstrap():
+    getBranch()  # raises for users without a branch
+    pos_profile = frappe.get_doc("POS Profile", get_user_context().pos_profile)
+
+    return {
+        "pos_profile": get_pos_profile_details(pos_profile),
+        "mode_of_payments": [
+            {"mode_of_payment": mop.mode_of_payment, "opening_amount": float(0)}
+            for mop in pos_profile.payments
+        ],
+        "order_types": get_select_field_options(),
+        "system_settings": getRestaurantSystemSettings(),
+        "restaurant": getRestaurantName(),
+        "default_customer": getDefaultCustomer(),
+    }
+
+
 @frappe.whitelist()
 def getPosProfile():
+    getBranch()  # raises for users without a branch
+    posProfile = get_user_context().pos_profile
+    pos_profiles = frappe.get_doc("POS Profile", posProfile)
+
+    return get_pos_profile_details(pos_profiles)
+
+
+def get_pos_profile_details(pos_profiles):
     branchName = getBranch()
     waiter = frappe.session.user
     bill_present = False
@@ -584,8 +669,6 @@ def getPosProfile():
     cashier_silent_print_format = None
     cashier_silent_print_type = None
     printer = None
-    posProfile = frappe.db.exists("POS Profile", {"branch": branchName})
-    pos_profiles = frappe.get_doc("POS Profile", posProfile)
 
     if pos_profiles.branch == branchName:
         pos_profile_name = pos_profiles.name
@@ -593,7 +676,6 @@ def getPosProfile():
         branch = pos_profiles.branch
         company = pos_profiles.company
         tableAttention = pos_profiles.table_attention_time
-        get_cashier = frappe.get_doc("POS Profile", pos_profile_name)
         print_format = pos_profiles.print_format
         paid_limit=pos_profiles.paid_limit
         # cashier = get_cashier.applicable_for_users[0].user
@@ -616,8 +698,8 @@ def getPosProfile():
         if silent_print == 1:
             print_type = "silent"
 
-            cashier_silent_print_data = get_cashier_silent_print_format_from_pos_profile(pos_profile_name)
-            if cashier_silent_print_data['custom_silent_print_format']:
+            cashier_silent_print_data = get_cashier_print_settings(pos_profiles)
+            if cashier_silent_print_data.get('custom_silent_print_format'):
                 cashier_silent_print_format = cashier_silent_print_data['custom_silent_print_format']
                 # cashier_silent_print_type = frappe.db.get_value("Silent Print Format", cashier_silent_print_format, "default_print_type")
                 cashier_silent_print_type = cashier_silent_print_data['custom_silent_print_type']
@@ -625,10 +707,10 @@ def getPosProfile():
         elif qz_print == 1:
             print_type = "qz"
 
-            cashier_qz_data = get_cashier_printer_name_from_pos_profile(pos_profile_name)
-            if cashier_qz_data['custom_cashier_printer_name']:
+            cashier_qz_data = get_cashier_print_settings(pos_profiles)
+            if cashier_qz_data.get('custom_cashier_printer_name'):
                 cashier_printer_name = cashier_qz_data['custom_cashier_printer_name']
-            if cashier_qz_data['custom_cashier_qz_host']:
+            if cashier_qz_data.get('custom_cashier_qz_host'):
                 qz_host = cashier_qz_data['custom_cashier_qz_host']
             else:
                 qz_host = pos_profiles.qz_host
@@ -658,11 +740,25 @@ def getPosProfile():
         "printer": printer,
         "print_type": print_type,
         "tableAttention": tableAttention,
-        "paid_limit":paid_limit
+        "paid_limit":paid_limit,
+        "receipt_renderer": pos_profiles.get("custom_receipt_renderer") or "PDF",
     }
     return invoice_details
 
 
+def get_cashier_print_settings(pos_profile):
+    """returns the session user's printer settings from an already loaded POS Profile"""
+    user = frappe.session.user
+    if user == "Administrator":
+        return {}
+
+    for row in pos_profile.applicable_for_users:
+        if row.user == user:
+            return row.as_dict()
+
+    frappe.throw("User is not associated with any printer in the specified POS Profile.")
+
+
 @frappe.whitelist()
 def getPosInvoiceItems(invoice):
     itemDetails = []
@@ -726,9 +822,15 @@ def getAggregator():
 
 @frappe.whitelist()
 def getAggregatorItem(aggregator, pos_profile):
-    menu_items = []
-    menu_items_with_image = []
+    menu = get_aggregator_menu_name(aggregator, pos_profile)
+    if not menu:
+        return []
+
+    return get_menu_snapshot(menu)["items"]
 
+
+def get_aggregator_menu_name(aggregator, pos_profile):
+    """returns the menu linked to the aggregator's price list for billing users"""
     user_role = frappe.get_roles()
 
     pos_profile = frappe.get_doc("POS Profile", pos_profile)
@@ -737,48 +839,28 @@ def getAggregatorItem(aggregator, pos_profile):
         role.role in user_role for role in pos_profile.role_allowed_for_billing
     )
 
-    if cashier:
-        branch_name = getBranch()
+    if not cashier:
+        return None
 
-        priceList = frappe.db.get_value(
-            "Aggregator Settings",
-            {"customer": aggregator, "parent": branch_name, "parenttype": "Branch"},
-            "price_list",
-        )
+    branch_name = getBranch()
 
-        if not priceList:
-            frappe.throw(f"There is no Default Price List for aggregator {aggregator}, please select a default price list for aggregator.")
+    priceList = frappe.db.get_value(
+        "Aggregator Settings",
+        {"customer": aggregator, "parent": branch_name, "parenttype": "Branch"},
+        "price_list",
+    )
 
-        menu = frappe.db.get_value(
-            "Price List", {"name": priceList}, "restaurant_menu"
-        )
+    if not priceList:
+        frappe.throw(f"There is no Default Price List for aggregator {aggregator}, please select a default price list for aggregator.")
 
-        if not menu:
-            frappe.throw(f"There is no Restaurant Menu for aggregator {aggregator} and price list {priceList}")
-
-        if menu:
-            menu_items = frappe.get_all(
-                "URY Menu Item",
-                filters={"parent": menu},
-                fields=["item", "item_name", "rate", "special_dish", "disabled","course", "preparation_time", "parallel_preparation"],
-                order_by="item_name asc",
-            )
+    menu = frappe.db.get_value(
+        "Price List", {"name": priceList}, "restaurant_menu"
+    )
+
+    if not menu:
+        frappe.throw(f"There is no Restaurant Menu for aggregator {aggregator} and price list {priceList}")
 
-            menu_items_with_image = [
-                {
-                    "item": item.item,
-                    "item_name": item.item_name,
-                    "rate": item.rate,
-                    "special_dish": item.special_dish,
-                    "disabled": item.disabled,
-                    "item_imgae": frappe.db.get_value("Item", item.item, "image"),
-                    "course":item.course,
-                    "preparation_time": item.preparation_time,
-                    "parallel_preparation": item.parallel_preparation,
-                }
-                for item in menu_items
-            ]
-    return menu_items_with_image
+    return menu
 
 
 # @frappe.whitelist()
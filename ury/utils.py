@@ -0,0 +1,19 @@
+import frappe
+
+
+def is_not_modified(version):
+    """Tag the response with `version` as its ETag and answer 304 when the
+    client already holds it (sent back through If-None-Match)."""
+    etag = '"{}"'.format(version)
+
+    response_headers = getattr(frappe.local, "response_headers", None)
+    if response_headers is not None:
+        response_headers["ETag"] = etag
+
+    if_none_match = frappe.get_request_header("If-None-Match") or ""
+    client_etags = [tag.strip() for tag in if_none_match.split(",")]
+    if etag in client_etags or "W/" + etag in client_etags:
+        frappe.local.response["http_status_code"] = 304
+        return True
+
+    return False